@@ -453,3 +453,319 @@ DF_MULTIMEDIA = {
 (0x5F, 0x3B, 0x4F, 0x47) : 'EF_MML',
 (0x5F, 0x3B, 0x4F, 0x48) : 'EF_MMDF',
 }
+
+# Short File Identifiers (SFI) of EF supporting it,
+# (file_address relative to the MF or ADF) : SFI
+# see ETSI TS 102.221 for the MF, TS 31.102 for the USIM application
+MF_SFI = {
+(0x2F, 0xE2) : 0x02,
+(0x2F, 0x05) : 0x05,
+(0x2F, 0x06) : 0x06,
+(0x2F, 0x08) : 0x08,
+(0x2F, 0x00) : 0x1E,
+}
+
+USIM_app_SFI = {
+(0x6F, 0xB7) : 0x01,
+(0x6F, 0x05) : 0x02,
+(0x6F, 0xAD) : 0x03,
+(0x6F, 0x38) : 0x04,
+(0x6F, 0x56) : 0x05,
+(0x6F, 0x78) : 0x06,
+(0x6F, 0x07) : 0x07,
+(0x6F, 0x08) : 0x08,
+(0x6F, 0x09) : 0x09,
+(0x6F, 0x60) : 0x0A,
+(0x6F, 0x7E) : 0x0B,
+(0x6F, 0x73) : 0x0C,
+(0x6F, 0x7B) : 0x0D,
+(0x6F, 0x48) : 0x0E,
+(0x6F, 0x5B) : 0x0F,
+(0x6F, 0x5C) : 0x10,
+(0x6F, 0x61) : 0x11,
+(0x6F, 0x31) : 0x12,
+(0x6F, 0x62) : 0x13,
+(0x6F, 0x80) : 0x14,
+(0x6F, 0x81) : 0x15,
+(0x6F, 0x4F) : 0x16,
+(0x6F, 0x06) : 0x17,
+(0x6F, 0xC5) : 0x19,
+(0x6F, 0xC6) : 0x1A,
+(0x6F, 0xCD) : 0x1B,
+(0x6F, 0xD9) : 0x1D,
+}
+
+# expected structure of EF, see TS 51.011 for the SIM, TS 31.102 for the USIM
+# and TS 102.221 for the MF; 'file_name' : 'structure'
+EF_structure = {
+'EF_DIR' : 'linear fixed',
+'EF_PL' : 'transparent',
+'EF_ARR' : 'linear fixed',
+'EF_ICCID' : 'transparent',
+'EF_ADN' : 'linear fixed',
+'EF_FDN' : 'linear fixed',
+'EF_SMS' : 'linear fixed',
+'EF_CCP' : 'linear fixed',
+'EF_MSISDN' : 'linear fixed',
+'EF_SMSP' : 'linear fixed',
+'EF_SMSS' : 'transparent',
+'EF_LND' : 'cyclic',
+'EF_SMSR' : 'linear fixed',
+'EF_SDN' : 'linear fixed',
+'EF_EXT1' : 'linear fixed',
+'EF_EXT2' : 'linear fixed',
+'EF_EXT3' : 'linear fixed',
+'EF_EXT4' : 'linear fixed',
+'EF_EXT5' : 'linear fixed',
+'EF_BDN' : 'linear fixed',
+'EF_CMI' : 'linear fixed',
+'EF_IMG' : 'linear fixed',
+'EF_PBR' : 'linear fixed',
+'EF_PSC' : 'transparent',
+'EF_CC' : 'transparent',
+'EF_PUID' : 'transparent',
+'EF_LP' : 'transparent',
+'EF_ELP' : 'transparent',
+'EF_IMSI' : 'transparent',
+'EF_Kc' : 'transparent',
+'EF_KcGPRS' : 'transparent',
+'EF_Keys' : 'transparent',
+'EF_KeysPS' : 'transparent',
+'EF_PLMNsel' : 'transparent',
+'EF_HPLMN' : 'transparent',
+'EF_ACMmax' : 'transparent',
+'EF_SST' : 'transparent',
+'EF_UST' : 'transparent',
+'EF_EST' : 'transparent',
+'EF_ACM' : 'cyclic',
+'EF_GID1' : 'transparent',
+'EF_GID2' : 'transparent',
+'EF_SPN' : 'transparent',
+'EF_PUCT' : 'transparent',
+'EF_CBMI' : 'transparent',
+'EF_CBMID' : 'transparent',
+'EF_CBMIR' : 'transparent',
+'EF_BCCH' : 'transparent',
+'EF_ACC' : 'transparent',
+'EF_FPLMN' : 'transparent',
+'EF_LOCI' : 'transparent',
+'EF_LOCIGPRS' : 'transparent',
+'EF_PSLOCI' : 'transparent',
+'EF_AD' : 'transparent',
+'EF_PHASE' : 'transparent',
+'EF_ECC' : 'transparent',
+'EF_PLMNwAcT' : 'transparent',
+'EF_OPLMNwAcT' : 'transparent',
+'EF_HPLMNwAcT' : 'transparent',
+'EF_START-HFN' : 'transparent',
+'EF_THRESHOLD' : 'transparent',
+'EF_NETPAR' : 'transparent',
+'EF_PNN' : 'linear fixed',
+'EF_OPL' : 'linear fixed',
+'EF_MBDN' : 'linear fixed',
+'EF_MBI' : 'linear fixed',
+'EF_MWIS' : 'linear fixed',
+'EF_CFIS' : 'linear fixed',
+'EF_SPDI' : 'transparent',
+'EF_EHPLMN' : 'transparent',
+'EF_ICI' : 'cyclic',
+'EF_OCI' : 'cyclic',
+'EF_ICT' : 'cyclic',
+'EF_OCT' : 'cyclic',
+'EF_LI' : 'transparent',
+'EF_GBAP' : 'transparent',
+'EF_ACL' : 'transparent',
+'EF_DCK' : 'transparent',
+'EF_CNL' : 'transparent',
+}
+
+# USIM EF whose structure differs from the SIM one
+USIM_app_EF_structure = {
+'EF_ECC' : 'linear fixed',
+}
+
+
+#################################
+# Indexed catalogue of the      #
+# file-system dictionnaries     #
+#################################
+
+class FS_node(object):
+    """
+    node of a FS_catalogue, for a file path
+    """
+    __slots__ = ('path', 'name', 'parent', 'children')
+
+    def __init__(self, path, name=None, parent=None):
+        self.path = path
+        self.name = name
+        self.parent = parent
+        # {file id: FS_node}
+        self.children = {}
+
+    def __repr__(self):
+        return 'FS_node(%s, %s)' % (self.name, 
+                                    ''.join(['%.2X' % b for b in self.path]))
+
+
+class FS_catalogue(object):
+    """
+    index of the file-system dictionnaries: tree of the file paths (tuples 
+    of bytes, relative to the MF or ADF), with parent / children links, and 
+    reverse indexes of the names and file identifiers, e.g.:
+        cat = catalogue('USIM')
+        cat.name((0x5F, 0x3A, 0x4F, 0x30)) -> 'EF_PBR'
+        cat.path('EF_IMSI') -> (0x6F, 0x07)
+        cat.candidates((0x6F, 0x3A)) -> [(0x5F, 0x3A, 0x6F, 0x3A), ...]
+        cat.children((0x5F, 0x3A)) -> [(0x4F, 0x22), (0x4F, 0x23), ...]
+    
+    intermediate DF missing from the tables are in the tree, without name
+    """
+
+    def __init__(self, tables=[], floating=[], under=[()], structures={}):
+        """
+        builds the catalogue of the file paths of the FS `tables` (see above),
+        and of the `floating` tables (e.g. DF_PHONEBOOK), put under each DF 
+        path in `under`, without overriding the names of the 1st ones
+        `structures` overrides the expected EF structures of EF_structure
+        """
+        self.root = FS_node(())
+        # {path: FS_node}
+        self.nodes = {(): self.root}
+        # {name: [path, ...]}
+        self.names = {}
+        # {file id: [path, ...]}
+        self.fids = {}
+        self.structures = dict(EF_structure)
+        self.structures.update(structures)
+        for tab in tables:
+            for (addr, name) in sorted(tab.items()):
+                self.add(addr, name)
+        for df in under:
+            for tab in floating:
+                for (addr, name) in sorted(tab.items()):
+                    self.add(tuple(df) + addr, name, override=False)
+
+    def add(self, path, name=None, override=True):
+        """
+        adds the file path (tuple of bytes) with its name, and the missing 
+        parent DF; odd length paths (unknown file ids) and the MF are ignored
+        """
+        path = tuple(path)
+        if len(path) % 2 or path == (0x3F, 0x00):
+            return
+        node = self.nodes.get(path)
+        if node is None:
+            parent = self.nodes.get(path[:-2])
+            if parent is None:
+                parent = self.add(path[:-2])
+            node = FS_node(path, None, parent)
+            parent.children[path[-2:]] = node
+            self.nodes[path] = node
+            self.fids.setdefault(path[-2:], []).append(path)
+        if name is not None and (override or node.name is None):
+            if node.name is not None:
+                self.names[node.name].remove(path)
+            node.name = name
+            self.names.setdefault(name, []).append(path)
+        return node
+
+    def name(self, path):
+        """
+        returns the name of the file at the path, or None
+        """
+        node = self.nodes.get(tuple(path))
+        if node is not None:
+            return node.name
+
+    def paths(self, name):
+        """
+        returns the list of the paths of the files with the name
+        """
+        return list(self.names.get(name, []))
+
+    def path(self, name):
+        """
+        returns the shortest path of the file with the name, or None
+        """
+        paths = self.names.get(name)
+        if paths:
+            return min(paths, key=lambda p: (len(p), p))
+
+    def candidates(self, fid):
+        """
+        returns the list of the paths of the files with the file identifier 
+        (2 bytes)
+        """
+        return list(self.fids.get(tuple(fid), []))
+
+    def parent(self, path):
+        """
+        returns the path of the parent DF of the file at the path, or None
+        """
+        node = self.nodes.get(tuple(path))
+        if node is not None and node.parent is not None:
+            return node.parent.path
+
+    def children(self, path=()):
+        """
+        returns the sorted list of the file identifiers of the files known 
+        under the DF path
+        """
+        node = self.nodes.get(tuple(path))
+        if node is None:
+            return []
+        return sorted(node.children.keys())
+
+    def structure(self, path):
+        """
+        returns the expected structure of the file at the path: 'DF', the 
+        EF structure (e.g. 'transparent', 'linear fixed', 'cyclic'), or None
+        if unknown
+        """
+        node = self.nodes.get(tuple(path))
+        if node is None:
+            return None
+        if node.children or (node.name and node.name[:3] in ('DF_', 'ADF')):
+            return 'DF'
+        return self.structures.get(node.name)
+
+    def known_paths(self, depth=None):
+        """
+        returns the sorted list of the file paths (lists of bytes), up to 
+        `depth` DF levels (all if None), the current ADF (7FFF) excepted
+        """
+        return [list(p) for p in sorted(self.nodes.keys()) if p \
+                and p != (0x7F, 0xFF) and (depth is None or len(p) <= 2*depth)]
+
+    def __len__(self):
+        return len(self.nodes) - 1
+
+    def __repr__(self):
+        return 'FS_catalogue(files=%i, names=%i)' % (len(self), len(self.names))
+
+
+# catalogues of catalogue(), built on the 1st call
+_catalogues = {}
+# DF_PHONEBOOK, DF_GRAPHICS and DF_MULTIMEDIA can be under the MF, DF_TELECOM
+# or the USIM ADF
+catalogue_tables = {
+    'MF': ((MF_FS, ), ((), (0x7F, 0x10)), {}),
+    'USIM': ((USIM_app_FS, ), ((), ), USIM_app_EF_structure),
+    'DF': ((), ((), ), {}),
+    }
+
+def catalogue(name='MF'):
+    """
+    catalogue(name='MF') -> FS_catalogue
+    
+    returns the catalogue of the files under the MF ('MF'), under the USIM 
+    ADF ('USIM'), or of DF_PHONEBOOK, DF_GRAPHICS and DF_MULTIMEDIA only 
+    ('DF'), see catalogue_tables
+    """
+    if name not in _catalogues:
+        tables, under, structures = catalogue_tables[name]
+        _catalogues[name] = FS_catalogue(tables, 
+                                        (DF_PHONEBOOK, DF_GRAPHICS, DF_MULTIMEDIA),
+                                        under, structures)
+    return _catalogues[name]
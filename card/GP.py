@@ -175,9 +175,19 @@ class GP(UICC):
                         data = ret[3]
     
     def scan_p1p2(self):
+        """
+        self.scan_p1p2() -> dict
+        
+        tries GET DATA with all P1 P2 not already in self.Infos, and returns
+        a dict {(P1, P2): data} of the ones responding with data
+        (partial when self.budget is exhausted)
+        """
+        found = {}
         for p1 in range(0, 256):
             for p2 in range(0, 256):
                 if (p1, p2) not in self.Infos:
+                    if self._budget_over('scan_p1p2', '%.2X.%.2X' % (p1, p2)):
+                        return found
                     ret = self.GET_DATA(P1=p1, P2=p2, Le=0)
                     self.coms.push(ret)
                     if ret[2][0] == 0x6C:
@@ -190,9 +200,11 @@ class GP(UICC):
                                 data = BERTLV_extract(ret[3])
                             except:
                                 data = 'raw: %s' % hexlify(byteToString(ret[3]))
+                            found[(p1, p2)] = data
                             if self.dbg:
                                 log(3, '(scan_p1p2) found %.2X.%.2X:\n%r'\
                                     % (p1, p2, data))
+        return found
     
     def interpret_infos(self):
         """
@@ -32,14 +32,11 @@ with this program; if not, write to the Free Software Foundation, Inc.,
 # classic python modules
 import os
 import re
+import time
+import hashlib
 
-# smartcard python modules from pyscard
-from smartcard.CardType import AnyCardType
-from smartcard.CardRequest import CardRequest
-from smartcard.CardConnection import CardConnection
-from smartcard.ATR import ATR
-from smartcard.Exceptions import CardConnectionException
-from smartcard.util import toHexString
+# smartcard python modules from pyscard are imported when connecting to a
+# reader: the parsing methods (and card.emul) can be used without pyscard
 
 from card.utils import *
         
@@ -59,6 +56,56 @@ class ISO7816(object):
     
     dbg = 1
     
+    # card used when no reader is given to __init__(), e.g. a 
+    # card.emul.virtual_card, for code creating its own instances
+    default_reader = None
+    
+    # session cache for EF content, see enable_cache()
+    cache = None
+    
+    # maximum number of data bytes transferred by a single READ BINARY or 
+    # UPDATE BINARY command, see read_binary() and update_binary()
+    # (UPDATE BINARY being limited to 255 bytes with short APDU)
+    chunk_size = 0xFF
+    
+    # try the READ RECORD "all records from P1" mode first in read_records(),
+    # set to False on the instance when the card does not support it
+    bulk_records = True
+    # status words meaning the "all records from P1" mode is not supported
+    bulk_unsupported = ((0x6A, 0x86), (0x6B, 0x00), (0x6D, 0x00), (0x6E, 0x00))
+    
+    # minimum number of records of an EF for read_EF() to use SEARCH RECORD 
+    # to find and read only the non-empty records (0 to disable), 
+    # see read_records_sparse()
+    sparse_records = 0
+    
+    # keep the raw response of the selection (FCP, or file parameters for 
+    # SIM) in the "Raw" key of the file dictionnary, and the empty records 
+    # of record EF in its "Data", so that records keep their number, 
+    # see select() and read_EF(); used for card images
+    keep_raw = False
+    empty_records = False
+    
+    # APDU and time budget (card.utils.apdu_budget) pacing sr_apdu() and 
+    # bounding brute force methods, which return their partial result 
+    # when it is exhausted
+    budget = None
+    
+    # logical channel of the APDU sent by sr_apdu(), see use_channel()
+    channel = 0
+    
+    # file parameters compared by redump() to tell if an EF changed since 
+    # the previous dump, before reading its content again
+    redump_keys = ('Type', 'Structure', 'File Descriptor', 'Size', 
+                   'Record Length', 'Life Cycle Status', 'Status')
+    
+    # access conditions the card holder can fulfill, see is_writable():
+    # SIM access conditions, and UICC key references of the PIN (PIN Appl 
+    # 1 to 8, Universal PIN, second PIN Appl 1 to 8, see ETSI TS 102.221)
+    holder_conditions = ('ALW', 'CHV1', 'CHV2')
+    holder_keys = tuple(range(0x01, 0x09)) + (0x11, ) \
+                + tuple(range(0x81, 0x89))
+    
     INS_dic = {
         0x04 : 'DEACTIVATE FILE',
         0x0C : 'ERASE RECORD(S)',
@@ -144,23 +191,43 @@ class ISO7816(object):
     def __init__(self, CLA=0x00, reader=''):
         """
         connect smartcard and defines class CLA code for communication
-        uses "pyscard" library services
+        uses "pyscard" library services, or the card given as `reader` when
+        it has a pyscard like connection (e.g. card.emul.virtual_card)
         
         creates self.CLA attribute with CLA code
         and self.coms attribute with associated "apdu_stack" instance
+        and self._sel attribute tracking the file currently selected
+        and self._channels attribute tracking the logical channels open
         """
-        cardtype = AnyCardType()
-        if reader:
-            cardrequest = CardRequest(timeout=1, cardType=cardtype, readers=[reader])
+        if not reader and self.default_reader is not None:
+            reader = self.default_reader
+        if hasattr(reader, 'connection'):
+            self.cardservice = reader
         else:
-            cardrequest = CardRequest(timeout=1, cardType=cardtype)
-        self.cardservice = cardrequest.waitforcard()
+            try:
+                from smartcard.CardType import AnyCardType
+                from smartcard.CardRequest import CardRequest
+            except ImportError:
+                log(1, '(ISO7816.__init__) pyscard library not found')
+                raise
+            cardtype = AnyCardType()
+            if reader:
+                cardrequest = CardRequest(timeout=1, cardType=cardtype, readers=[reader])
+            else:
+                cardrequest = CardRequest(timeout=1, cardType=cardtype)
+            self.cardservice = cardrequest.waitforcard()
         self.cardservice.connection.connect()
         self.reader = self.cardservice.connection.getReader()
         self.ATR = self.cardservice.connection.getATR()
         #
         self.CLA = CLA
         self.coms = apdu_stack()
+        self._sel = None
+        # supplementary logical channels open: {channel: AID number or None}
+        # and file selected on the channels not in use: {channel: self._sel}
+        self._channels = {}
+        self._chan_sel = {}
+        self.channel = 0
     
     def disconnect(self):
         """
@@ -184,6 +251,7 @@ class ISO7816(object):
         if pcsc_scan is installed,
         use the signature file passed as argument for guessing the card
         """
+        from smartcard.ATR import ATR
         print('\nsmartcard reader: %s' % self.reader)
         if self.ATR != None:
             print('\nsmart card ATR is: %s' % toHexString(self.ATR))
@@ -329,7 +397,17 @@ class ISO7816(object):
         generic function to send apdu, receive and interpret response
         force: force card reconnection if pyscard transmission fails
         """
+        if self.channel:
+            apdu = [self.channel_CLA(apdu[0], self.channel)] + apdu[1:]
+        if self.budget is not None:
+            self.budget.wait()
+            t0 = time.time()
         if force:
+            try:
+                from smartcard.Exceptions import CardConnectionException
+            except ImportError:
+                # card emulated without pyscard: nothing to reconnect
+                CardConnectionException = ()
             try: 
                 data, sw1, sw2 = self.cardservice.connection.transmit(apdu)
             except CardConnectionException:
@@ -337,6 +415,8 @@ class ISO7816(object):
                 data, sw1, sw2 = self.cardservice.connection.transmit(apdu)
         else:
             data, sw1, sw2 = self.cardservice.connection.transmit(apdu)
+        if self.budget is not None:
+            self.budget.record(time.time() - t0, (sw1, sw2), apdu[1])
         # replaces INS code by strings when available
         if apdu[1] in self.INS_dic.keys(): 
             apdu_name =  self.INS_dic[apdu[1]] + ' '
@@ -357,6 +437,7 @@ class ISO7816(object):
         tries all classes CLA codes to check the possibly supported ones
         prints CLA suspected to be supported
         returns the list of those CLA codes
+        (partial when self.budget is exhausted)
         
         WARNING: 
         can block the card definitively
@@ -364,6 +445,8 @@ class ISO7816(object):
         """
         clist = []
         for i in range(start, 256):
+            if self._budget_over('bf_cla', i):
+                break
             ret = self.sr_apdu([i] + param)
             if ret[2] != (0x6E, 0x00):
                 # DBG log
@@ -379,6 +462,7 @@ class ISO7816(object):
         tries all instructions INS codes to check the supported ones
         prints INS suspected to be supported
         returns the list of those INS codes
+        (partial when self.budget is exhausted)
         
         WARNING: 
         can block the card definitively
@@ -386,6 +470,8 @@ class ISO7816(object):
         """
         ilist = []
         for i in range(start, 256):
+            if self._budget_over('bf_ins', i):
+                break
             if self.dbg:
                 log(3, '(bf_ins) testing %d for INS code with %d CLA code'\
                     % (i, self.CLA))
@@ -396,18 +482,34 @@ class ISO7816(object):
                 ilist.append(i)
         return ilist
     
+    def _budget_over(self, op, cur):
+        """
+        returns True when self.budget is exhausted, logging where the 
+        operation `op` stopped (`cur` being the next value to be tested)
+        """
+        if self.budget is None or not self.budget.exhausted():
+            return False
+        if self.dbg:
+            log(2, '(%s) budget exhausted, stopping before %s: %s' \
+                % (op, cur, self.budget))
+        return True
+    
     ###
     # Below is defined a list of standard commands to be used with (U)SIM cards
     # They are mainly defined and described in 
     # ISO 7816 and described further in ETSI 101.221
     ###
-    def READ_BINARY(self, P1=0x00, P2=0x00, Le=0x01):
+    def READ_BINARY(self, P1=0x00, P2=0x00, Le=0x01, SFI=None):
         """
         APDU command to read the content of EF file with transparent structure
         Le: length of data bytes to be read
+        SFI: Short File Identifier of the EF to read within the current DF,
+             instead of the current EF; P2 is then the offset (0 to 255)
         
         call sr_apdu method
         """
+        if SFI is not None:
+            P1 = 0x80 | (SFI & 0x1F)
         READ_BINARY = [self.CLA, 0xB0, P1, P2, Le]
         return self.sr_apdu(READ_BINARY)
     
@@ -419,7 +521,10 @@ class ISO7816(object):
         call sr_apdu method
         """
         WRITE_BINARY = [self.CLA, 0xD0, P1, P2, len(Data)] + Data
-        return self.sr_apdu(WRITE_BINARY)
+        ret = self.sr_apdu(WRITE_BINARY)
+        if self.cache is not None:
+            self._cache_write(0xD0, P1, P2, Data, ret[2])
+        return ret
     
     def UPDATE_BINARY(self, P1=0x00, P2=0x00, Data=[]):
         """
@@ -429,7 +534,10 @@ class ISO7816(object):
         call sr_apdu method
         """
         UPDATE_BINARY = [self.CLA, 0xD6, P1, P2, len(Data)] + Data
-        return self.sr_apdu(UPDATE_BINARY)
+        ret = self.sr_apdu(UPDATE_BINARY)
+        if self.cache is not None:
+            self._cache_write(0xD6, P1, P2, Data, ret[2])
+        return ret
     
     def ERASE_BINARY(self, P1=0x00, P2=0x00, Lc=None, Data=[]):
         """
@@ -443,17 +551,24 @@ class ISO7816(object):
             ERASE_BINARY = [self.CLA, 0x0E, P1, P2]
         else: 
             ERASE_BINARY = [self.CLA, 0x0E, P1, P2, 0x02] + Data
-        return self.sr_apdu(ERASE_BINARY)        
+        ret = self.sr_apdu(ERASE_BINARY)
+        if self.cache is not None:
+            self._cache_write(0x0E, P1, P2, Data, ret[2])
+        return ret
     
-    def READ_RECORD(self, P1=0x00, P2=0x00, Le=0x00):
+    def READ_RECORD(self, P1=0x00, P2=0x00, Le=0x00, SFI=None):
         """
         APDU command to read the content of EF file with record structure
         
         P1: record number
         P2: reference control
         Le: length of data bytes to be read
+        SFI: Short File Identifier of the EF to read within the current DF,
+             instead of the current EF; set in the 5 MSB of P2
         call sr_apdu method
         """
+        if SFI is not None:
+            P2 = ((SFI & 0x1F) << 3) | (P2 & 0x07)
         READ_RECORD = [self.CLA, 0xB2, P1, P2, Le]
         return self.sr_apdu(READ_RECORD)
     
@@ -467,7 +582,10 @@ class ISO7816(object):
         call sr_apdu method
         """
         WRITE_RECORD = [self.CLA, 0xD2, P1, P2, len(Data)] + Data
-        return self.sr_apdu(WRITE_RECORD)
+        ret = self.sr_apdu(WRITE_RECORD)
+        if self.cache is not None:
+            self._cache_write(0xD2, P1, P2, Data, ret[2])
+        return ret
     
     def APPEND_RECORD(self, P2=0x00, Data=[]):
         """
@@ -478,7 +596,10 @@ class ISO7816(object):
         call sr_apdu method
         """
         APPEND_RECORD = [self.CLA, 0xE2, 0x00, P2, len(Data)] + Data
-        return self.sr_apdu(APPEND_RECORD)
+        ret = self.sr_apdu(APPEND_RECORD)
+        if self.cache is not None:
+            self._cache_write(0xE2, 0x00, P2, Data, ret[2])
+        return ret
     
     def UPDATE_RECORD(self, P1=0x00, P2=0x00, Data=[]):
         """
@@ -490,7 +611,10 @@ class ISO7816(object):
         call sr_apdu method
         """
         APPEND_RECORD = [self.CLA, 0xDC, P1, P2, len(Data)] + Data
-        return self.sr_apdu(APPEND_RECORD)
+        ret = self.sr_apdu(APPEND_RECORD)
+        if self.cache is not None:
+            self._cache_write(0xDC, P1, P2, Data, ret[2])
+        return ret
     
     def GET_DATA(self, P1=0x00, P2=0x00, Le=0x01):
         """
@@ -532,6 +656,8 @@ class ISO7816(object):
         if with_length:
             Data = [min(len(Data), 255)] + Data
         SELECT_FILE = [self.CLA, 0xA4, P1, P2] + Data
+        # the file selected is not tracked anymore, see select()
+        self._sel = None
         return self.sr_apdu(SELECT_FILE)
     
     def VERIFY(self, P2=0x00, Data=[]):
@@ -738,7 +864,7 @@ class ISO7816(object):
             return fil
         
         # for other control structure, DIY
-        fil = {}
+        fil = file_record()
         if ber[0][0][2] == 0x4: 
             fil['Control'] = 'FMD'
             if self.dbg >= 2:
@@ -763,7 +889,7 @@ class ISO7816(object):
         interprets the content of some informative bytes for file structure and 
         decoding method...
         """
-        fil = {}
+        fil = file_record()
         # loop on the Data bytes to parse TLV'style attributes
         toProcess = Data
         while len(toProcess) > 0:
@@ -1057,7 +1183,7 @@ class ISO7816(object):
         interprets the content of some informative bytes 
         for file structure and parsing method...
         """
-        fil = {}
+        fil = file_record()
         # loop on the Data bytes to parse TLV'style attributes
         toProcess = Data
         while len(toProcess) > 0:
@@ -1128,51 +1254,406 @@ class ISO7816(object):
         return fil
     
     
-    def read_EF(self, fil):
+    def enable_cache(self):
+        """
+        self.enable_cache() -> EF_cache
+        
+        enables the session cache of EF content:
+        content read with read_EF() is kept in memory and returned again 
+        when the same EF is read later on, without sending READ commands
+        the cache is kept consistent by the writing commands (UPDATE / WRITE /
+        ERASE BINARY, UPDATE / WRITE / APPEND RECORD)
+        
+        hits and misses are available with self.cache.stats()
+        """
+        if self.cache is None:
+            self.cache = EF_cache()
+        return self.cache
+    
+    def disable_cache(self):
+        """
+        disables the session cache of EF content, and drops its content
+        """
+        self.cache = None
+    
+    def _EF_key(self):
+        # returns the location of the EF currently selected, if known
+        if self._sel is not None and self._sel[2] is not None:
+            return self._sel
+        return None
+    
+    def _cache_write(self, ins, P1, P2, Data, sw):
+        """
+        keeps the EF content cache consistent after a writing command
+        """
+        if sw != (0x90, 0x00):
+            if sw[0] in (0x63, 0x65):
+                # non-volatile memory changed, without knowing how
+                self.cache.invalidate(self._EF_key())
+            return
+        # with SFI referencing, another EF than the current one is written
+        if ins in (0xD0, 0xD6, 0x0E) and P1 & 0x80 \
+        or ins in (0xD2, 0xDC, 0xE2) and P2 >> 3:
+            key = None
+        else:
+            key = self._EF_key()
+        if key is None:
+            # do not know which EF has been written: drop all of the cache
+            self.cache.invalidate()
+        elif ins == 0xD6:
+            self.cache.update_binary(key, (P1<<8) + P2, Data)
+        elif ins == 0xDC and P2 == 0x04:
+            self.cache.update_record(key, P1, Data)
+        else:
+            self.cache.invalidate(key)
+    
+    def read_binary(self, size, offset=0, SFI=None):
+        """
+        self.read_binary(size=int, offset=int, SFI=None) 
+            -> list of bytes, or None on error
+        
+        reads `size` bytes from the current EF with transparent structure, 
+        starting at `offset`, with as many READ_BINARY commands as required,
+        each reading at most self.chunk_size bytes at the corresponding
+        offset (P1-P2); less bytes are returned when the end of the file is
+        reached before (6282, or 6Cxx with fewer bytes than requested)
+        
+        if SFI is set, the first READ_BINARY command references the EF with 
+        its Short File Identifier (which makes it the current EF), so that 
+        the EF does not need to be selected first; `offset` must then be 
+        lower than 256
+        """
+        if SFI is not None and offset > 0xFF:
+            if self.dbg:
+                log(1, '(read_binary) offset over 0xFF not supported with SFI')
+            return None
+        data = []
+        while len(data) < size:
+            off = offset + len(data)
+            if off > 0x7FFF:
+                if self.dbg:
+                    log(1, '(read_binary) offset over 0x7FFF not supported')
+                return None
+            Le = min(self.chunk_size, size-len(data), 0x100)
+            self.coms.push( self.READ_BINARY(P1=off>>8, P2=off&0xFF, \
+                                             Le=Le&0xFF, SFI=SFI) )
+            end = False
+            if self.coms()[2][0] == 0x6C and self.coms()[2][1]:
+                # wrong Le, the exact number of bytes available is given
+                end = self.coms()[2][1] < Le
+                self.coms.push( self.READ_BINARY(P1=off>>8, P2=off&0xFF, \
+                                                 Le=self.coms()[2][1], \
+                                                 SFI=SFI) )
+            if self.coms()[2] not in ((0x90, 0x00), (0x62, 0x82)):
+                if self.dbg >= 2:
+                    log(3, '(read_binary) %s' % self.coms())
+                return None
+            data.extend( self.coms()[3] )
+            # the EF is now the current one
+            SFI = None
+            if end or self.coms()[2] == (0x62, 0x82) or not self.coms()[3]:
+                # end of file reached
+                break
+        return data
+    
+    def read_records(self, fil, first=1, last=None, SFI=None, read=None):
+        """
+        self.read_records(fil=dict(file), first=int, last=None, SFI=None,
+                          read=None) 
+            -> list of records (list of bytes), or None on error
+        
+        reads the records `first` to `last` (by default, the last record of 
+        the file) from the current EF with linear fixed or cyclic structure,
+        whose parameters (Record Length, Size) are given in the file 
+        dictionnary `fil`; empty records are returned too
+        
+        if self.bulk_records is set, the READ_RECORD "all records from P1" 
+        mode is used to get as many records as fit in a single response; 
+        if the card does not support it (see self.bulk_unsupported), 
+        self.bulk_records is unset and the records are read one by one
+        when the 1st bulk reading of the EF fails with another status word,
+        the records are read one by one, and self.bulk_records is unset if 
+        this succeeds (the mode is not defined in TS 102.221, and cards 
+        reject it in various ways)
+        the reading stops early when the card indicates the end of the file
+        
+        if SFI is set, the EF is referenced with its Short File Identifier in
+        the current DF, instead of being the current EF
+        
+        if `read` is a list, the records are appended to it as they are read,
+        so that those read before an error are kept
+        """
+        reclen = fil['Record Length']
+        if not reclen:
+            return []
+        num = fil['Size'] // reclen
+        if last is None or last > num:
+            last = num
+        records = read if read is not None else []
+        i, probe = first, False
+        # bulk reading: as many complete records as fit in 256 bytes
+        while self.bulk_records and i <= last and reclen <= 0x100:
+            Le = min(last-i+1, 0x100 // reclen) * reclen
+            self.coms.push( self.READ_RECORD(P1=i, P2=0x05, Le=Le&0xFF, \
+                                             SFI=SFI) )
+            if self.coms()[2][0] == 0x6C and self.coms()[2][1] >= reclen:
+                # wrong Le, the exact number of bytes available is given
+                Le = self.coms()[2][1] - self.coms()[2][1] % reclen
+                self.coms.push( self.READ_RECORD(P1=i, P2=0x05, Le=Le, \
+                                                 SFI=SFI) )
+            data = self.coms()[3]
+            if self.coms()[2] in ((0x90, 0x00), (0x62, 0x82)) \
+            and len(data) >= reclen:
+                for j in range(0, len(data) - len(data) % reclen, reclen):
+                    records.append( data[j:j+reclen] )
+                i = first + len(records)
+                if self.coms()[2] == (0x62, 0x82) or len(data) < Le:
+                    # end of file reached
+                    return records[:last-first+1]
+            elif self.coms()[2] in ((0x6A, 0x83), (0x94, 0x02)) and records:
+                # record not found: end of file reached
+                return records
+            elif self.coms()[2] in self.bulk_unsupported:
+                # bulk mode not supported, read the remaining records 
+                # one by one
+                if self.dbg >= 2:
+                    log(3, '(read_records) bulk mode not supported: %s' \
+                        % self.coms())
+                self.bulk_records = False
+            elif i == first:
+                # the bulk mode may not be supported: retry with the single
+                # record mode, which tells
+                if self.dbg >= 2:
+                    log(3, '(read_records) bulk mode failed: %s' \
+                        % self.coms())
+                probe = True
+                break
+            else:
+                # e.g. security status not satisfied for this EF
+                if self.dbg:
+                    log(2, '(read_records) error in reading the records ' \
+                        'from record %s\n%s' % (i, self.coms()))
+                return None
+        # single record reading
+        while i <= last:
+            self.coms.push( self.READ_RECORD(P1=i, P2=0x04, Le=reclen, \
+                                             SFI=SFI) )
+            if self.coms()[2] in ((0x6A, 0x83), (0x94, 0x02)) and i > first:
+                # record not found: end of file reached
+                break
+            elif self.coms()[2] != (0x90, 0x00):
+                # should mean there is an issue 
+                # somewhere in the file parsing process
+                if self.dbg:
+                    log(2, '(read_records) error in iterating the RECORD ' \
+                        'parsing at record %s\n%s' % (i, self.coms()))
+                return None
+            records.append( self.coms()[3] )
+            if probe:
+                # single record mode supported where the bulk one failed
+                if self.dbg >= 2:
+                    log(3, '(read_records) bulk mode not supported')
+                self.bulk_records, probe = False, False
+            i += 1
+        return records[:last-first+1]
+    
+    def search_record(self, pattern=[], offset=None, first=1, SFI=None):
+        """
+        self.search_record(pattern=[0x.., ...], offset=None, first=1, SFI=None)
+            -> list of record numbers, or None on error
+        
+        searches the records of the current EF with linear fixed or cyclic 
+        structure containing the list of bytes `pattern`, starting at record
+        `first` and forward:
+        - anywhere in the record, if offset is None (simple search)
+        - at the given offset in the record (enhanced search)
+        
+        if SFI is set, the EF is referenced with its Short File Identifier in
+        the current DF, instead of being the current EF
+        """
+        if offset is None:
+            P2, Data = 0x04, pattern
+        else:
+            # search indication: forward search from P1, at a given offset
+            P2, Data = 0x06, [0x04, offset] + pattern
+        if SFI is not None:
+            P2 |= (SFI & 0x1F) << 3
+        self.coms.push( self.SEARCH_RECORD(P1=first, P2=P2, Data=Data) )
+        if self.coms()[2][0] in (0x61, 0x9F):
+            self.coms.push( self.GET_RESPONSE(Le=self.coms()[2][1]) )
+        if self.coms()[2] not in ((0x90, 0x00), (0x62, 0x82)):
+            if self.dbg >= 2:
+                log(3, '(search_record) %s' % self.coms())
+            return None
+        # 6282: no record found
+        return list(self.coms()[3])
+    
+    def read_records_sparse(self, fil, pattern=None, offset=None, SFI=None):
+        """
+        self.read_records_sparse(fil=dict(file), pattern=None, offset=None, 
+                                 SFI=None)
+            -> list of 2-tuples (record number, record), or None on error
+        
+        reads only the non-empty records (if pattern is None), or the records
+        matching `pattern` at `offset` (see search_record()), from the current
+        EF with linear fixed or cyclic structure, whose parameters are given 
+        in the file dictionnary `fil`
+        
+        the record numbers are found first with SEARCH RECORD: for non-empty
+        records, by looking for empty ones (padding only, after the 1st byte)
+        then the consecutive records are read with read_records()
+        falls back to read all records and filter them, if the card does not
+        support the search
+        """
+        reclen = fil['Record Length']
+        if not reclen:
+            return []
+        num = fil['Size'] // reclen
+        nums = None
+        if pattern is None and reclen > 1:
+            empty = self.search_record((reclen-1) * [0xFF], 1, SFI=SFI)
+            if empty is not None:
+                empty = set(empty)
+                nums = [i for i in range(1, num+1) if i not in empty]
+        elif pattern is not None:
+            nums = self.search_record(pattern, offset, SFI=SFI)
+        #
+        if nums is None:
+            # search not supported, filter the records client-side
+            records = self.read_records(fil, SFI=SFI)
+            if records is None:
+                return None
+            if pattern is None:
+                return [(i+1, rec) for (i, rec) in enumerate(records) \
+                        if rec[1:] != len(rec[1:]) * [255]]
+            elif offset is None:
+                return [(i+1, rec) for (i, rec) in enumerate(records) \
+                        if byteToString(pattern) in byteToString(rec)]
+            else:
+                return [(i+1, rec) for (i, rec) in enumerate(records) \
+                        if rec[offset:offset+len(pattern)] == pattern]
+        #
+        # read the runs of consecutive records found
+        ret = []
+        nums = sorted([i for i in set(nums) if 1 <= i <= num])
+        while nums:
+            last = 0
+            while last+1 < len(nums) and nums[last+1] == nums[last]+1:
+                last += 1
+            records = self.read_records(fil, nums[0], nums[last], SFI=SFI)
+            if records is None:
+                return None
+            ret.extend( zip(nums[:last+1], records) )
+            nums = nums[last+1:]
+        return ret
+    
+    def update_binary(self, data, offset=0):
+        """
+        self.update_binary(data=[0x.., ...], offset=int) -> list (APDU response)
+        
+        writes the list of bytes `data` in the current EF with transparent 
+        structure, starting at `offset`, with as many UPDATE_BINARY commands 
+        as required, each writing at most self.chunk_size bytes at the 
+        corresponding offset (P1-P2)
+        returns the response of the last UPDATE_BINARY command sent (which
+        is the one failing, in case of error)
+        """
+        size = min(self.chunk_size, 0xFF)
+        for i in range(0, max(len(data), 1), size):
+            off = offset + i
+            if off > 0x7FFF:
+                if self.dbg:
+                    log(1, '(update_binary) offset over 0x7FFF not supported')
+                return self.coms()
+            self.coms.push( self.UPDATE_BINARY(P1=off>>8, P2=off&0xFF, \
+                                               Data=data[i:i+size]) )
+            if self.coms()[2] != (0x90, 0x00):
+                if self.dbg >= 2:
+                    log(3, '(update_binary) %s' % self.coms())
+                break
+        return self.coms()
+    
+    def read_EF(self, fil, SFI=None):
         """
         interprets the content of file parameters (Structure, Size, Length...)
         and enriches the file dictionnary passed as argument
         with "Data" key and corresponding 
         - list of bytes for EF transparent
         - list of list of bytes for cyclic or linear EF
+        
+        if SFI is set, the EF is read by referencing its Short File Identifier
+        in the current DF, without being selected first
+        
+        if the session cache is enabled (see enable_cache()), the content
+        is taken from it when available
+        
+        if self.sparse_records is set, only the non-empty records of large
+        record EF are read, see read_records_sparse()
         """
+        key = self._EF_key() if self.cache is not None else None
+        if key is not None:
+            content = self.cache.get(key, fil)
+            if content is not None:
+                if fil['Structure'] == 'transparent':
+                    fil['Data'] = content[:]
+                elif self.empty_records:
+                    fil['Data'] = [rec[:] for rec in content]
+                else:
+                    fil['Data'] = [rec[:] for rec in content \
+                                   if rec[1:] != len(rec[1:]) * [255]]
+                return fil
+        
         # read EF transparent data
         if fil['Structure'] == 'transparent':
-            self.coms.push( self.READ_BINARY(Le=fil['Size']) )
-            if self.coms()[2] != (0x90, 0x00):
+            data = self.read_binary(fil['Size'], SFI=SFI)
+            if data is None:
                 if self.dbg >= 2: 
                     log(3,  '(read_EF) %s' % self.coms())
                 return fil
-            fil['Data'] = self.coms()[3]
+            fil['Data'] = data
+            if key is not None:
+                self.cache.put(key, fil, fil['Data'][:])
+        
+        # read EF cyclic / linear non-empty records data only, for large EF
+        elif self.sparse_records and fil.get('Record Length') \
+        and fil['Size'] // fil['Record Length'] >= self.sparse_records:
+            records = self.read_records_sparse(fil, SFI=SFI)
+            if records is None:
+                return fil
+            # empty records are not known, so the content is not cached
+            if self.empty_records:
+                nums = dict(records)
+                fil['Data'] = [nums.get(i, fil['Record Length'] * [0xFF]) \
+                               for i in range(1, fil['Size'] // \
+                                                 fil['Record Length'] + 1)]
+            else:
+                fil['Data'] = [rec for (i, rec) in records]
         
         # read EF cyclic / linear all records data
         elif fil['Structure'] != 'transparent':
-            fil['Data'] = []
-            # for record data: need to check the number of recordings
-            # stored in the file, and iterate for each
-            for i in range( (fil['Size'] // fil['Record Length']) ):
-                self.coms.push( self.READ_RECORD(P1=i+1, P2=0x04, \
-                    Le=fil['Record Length']) )
-                if self.coms()[2] != (0x90, 0x00):
-                    # should mean there is an issue 
-                    # somewhere in the file parsing process
-                    if self.dbg:
-                        log(2, '(read_EF) error in iterating the RECORD ' \
-                            'parsing at iteration %s\n%s' % (i, self.coms()))
-                    return fil
-                if self.coms()[3][1:] == len(self.coms()[3][1:]) * [255]:
-                    # record is empty, contains padding only
-                    pass
-                else: 
-                    fil['Data'].append(self.coms()[3])
+            read = []
+            records = self.read_records(fil, SFI=SFI, read=read)
+            if records is None:
+                # keep the records read before the error
+                records, key = read, None
+            # do not return empty records, containing padding only
+            if self.empty_records:
+                fil['Data'] = [rec[:] for rec in records]
+            else:
+                fil['Data'] = [rec for rec in records \
+                               if rec[1:] != len(rec[1:]) * [255]]
+            if key is not None:
+                self.cache.put(key, fil, [rec[:] for rec in records])
         
         # return the [Data] for transparent or 
         # [[Record1],[Record2]...] for cyclic / linear
         return fil
     
-    def select(self, addr=[0x3F, 0x00], type="fid", with_length=True):
+    def select(self, addr=[0x3F, 0x00], type="fid", with_length=True, 
+               with_content=True):
         """
-        self.select(addr=[0x.., 0x..], type="fid", with_length=True) 
+        self.select(addr=[0x.., 0x..], type="fid", with_length=True, 
+                    with_content=True) 
             -> dict() on success, None on error
         
         selects the file at the given address
@@ -1196,6 +1677,8 @@ class ISO7816(object):
         
         with_length: correspond to the Lc byte preprended to the address
                      in the SELECT_FILE APDU
+        with_content: if False, the content of EF is not read, only the file
+                      parameters are returned
         
         APDUs exchanged available thanks to the attribute `self`.coms
         """
@@ -1223,6 +1706,7 @@ class ISO7816(object):
         
         # select file and check SW; if error, returns None, 
         # else get response
+        sel = self._sel
         self.coms.push(self.SELECT_FILE(P1=P1, P2=P2, Data=addr, \
             with_length=with_length))
         
@@ -1231,6 +1715,8 @@ class ISO7816(object):
         or not is_UICC and self.coms()[2][0] != 0x9F:
             if self.dbg >= 2: 
                 log(3, '(select) %s' % self.coms())
+            # selection failed, the current file is unchanged
+            self._sel = sel
             return None
             
         # get response and check SW: 
@@ -1245,17 +1731,219 @@ class ISO7816(object):
         # take the parse_file() method from the instance:
         # ISO7816, UICC (for USIM) or SIM
         file = self.parse_file(data)
-        if 'Type' in file.keys() and file['Type'][0:2] == 'EF':
+        if self.keep_raw:
+            file['Raw'] = data[:]
+        self._sel = self._select_context(sel, addr, type, file)
+        if self.cache is not None and self._sel is not None:
+            self.cache.put_FCP(self._sel, file)
+        if with_content and 'Type' in file.keys() and file['Type'][0:2] == 'EF':
             file = self.read_EF(file)
         
         # finally returns the whole file dictionnary, 
         # containing the ['Data'] key for EF file content
         return file
     
+    def _select_context(self, sel, addr, type, file):
+        """
+        returns the location (AID, DF path, EF file id) of the file selected
+        with select(), knowing the location before the selection `sel`
+        returns None when the location cannot be known
+        a DF selected by file id is a child of the current DF, unless it is 
+        the current DF, its parent, or a DF known under the parent (the MF 
+        for an ADF) and not under the current DF (sibling DF, see 
+        _known_DF())
+        """
+        addr = tuple(addr)
+        is_DF = 'Type' in file.keys() and file['Type'] in ('MF', 'DF')
+        if type == "aid":
+            return (addr, (), None)
+        elif type == "pmf":
+            # MF file id is optional in the path
+            if addr[:2] == (0x3F, 0x00):
+                addr = addr[2:]
+            if is_DF:
+                return (None, addr, None)
+            return (None, addr[:-2], addr[-2:])
+        elif addr == (0x3F, 0x00):
+            return (None, (), None)
+        elif sel is None:
+            return None
+        aid, df = sel[0], sel[1]
+        if type == "pdf":
+            df = df + addr
+            if is_DF:
+                return (aid, df, None)
+            return (aid, df[:-2], df[-2:])
+        # selection by "fid"
+        if not is_DF:
+            return (aid, df, addr)
+        elif aid is not None and addr == (0x7F, 0xFF):
+            return (aid, (), None)
+        elif df[-4:-2] == addr:
+            # parent DF
+            return (aid, df[:-2], None)
+        elif df[-2:] == addr:
+            # current DF
+            return (aid, df, None)
+        elif df and addr not in self._known_DF(aid, df) \
+        and addr in self._known_DF(aid, df[:-2]):
+            # sibling DF
+            return (aid, df[:-2] + addr, None)
+        elif not df and aid is not None \
+        and addr not in self._known_DF(aid, df) \
+        and addr in self._known_DF(None, ()):
+            # DF under the MF, sibling of the ADF
+            return (None, addr, None)
+        return (aid, df + addr, None)
+    
+    def _known_DF(self, aid, df):
+        """
+        returns the set of the file ids of the DF known under the DF path 
+        `df` of the MF (`aid` None) or of the AID `aid`, from the directory 
+        structure set when scanning and from the FS catalogue
+        """
+        from card.FS import catalogue
+        if aid is None:
+            struct, cat = getattr(self, '_MF_struct', {}), catalogue('MF')
+        else:
+            struct, cat = {}, None
+            AID = getattr(self, 'AID', [])
+            if list(aid) in AID:
+                struct = getattr(self, '_AID%i_struct' \
+                                 % (AID.index(list(aid)) + 1), {})
+            if aid[0:5] == (0xA0, 0x00, 0x00, 0x00, 0x87) \
+            and aid[5:7] == (0x10, 0x02):
+                cat = catalogue('USIM')
+        known = set([tuple(c) for c in struct.get(tuple(df), [])])
+        if cat is not None:
+            known.update([fid for fid in cat.children(df) \
+                          if cat.structure(tuple(df) + fid) == 'DF'])
+        return known
+    
+    @staticmethod
+    def get_SFI(fil):
+        """
+        returns the Short File Identifier of the EF described by the file 
+        dictionnary `fil` (as returned by select()), or None if the EF does
+        not support it
+        """
+        if 'Type' not in fil.keys() or fil['Type'][0:2] != 'EF':
+            return None
+        if 'Short File Identifier' in fil.keys():
+            # empty SFI data object: SFI not supported
+            if not fil['Short File Identifier']:
+                return None
+            SFI = fil['Short File Identifier'][0] >> 3
+        elif fil.get('Control') == 'FCP' and 'File Identifier' in fil.keys():
+            # no SFI data object: SFI is the 5 LSB of the file identifier
+            SFI = fil['File Identifier'][1] & 0x1F
+        else:
+            return None
+        if SFI == 0:
+            return None
+        return SFI
+    
     ###############
     # The following may need some improvements
     ###############
     
+    @staticmethod
+    def channel_CLA(CLA=0x00, channel=0):
+        """
+        channel_CLA(CLA=int, channel=int) -> int
+        
+        returns the class byte CLA with the logical channel number encoded as 
+        in ISO7816-4: in the 2 LSB of the first interindustry class for 
+        channels 0 to 3, in the 4 LSB of the further interindustry class 
+        (0x40) for channels 4 to 19
+        the secure messaging indication of CLA is kept: bits 4-3 of the first
+        interindustry class, bit 6 of the further one (which can not tell 
+        whether the command header is authenticated)
+        other classes (e.g. 0xA0 for SIM) are kept, with the channel number 
+        in their 2 LSB, and raise ValueError for channels 4 to 19
+        """
+        if CLA & 0x60 == 0x20:
+            if channel >= 4:
+                raise ValueError('channel %i not encodable in class 0x%.2X' \
+                                 % (channel, CLA))
+            return (CLA & 0xFC) | channel
+        if CLA & 0x40:
+            SM = 0x08 if CLA & 0x20 else 0x00
+        else:
+            SM = CLA & 0x0C
+        if channel < 4:
+            return (CLA & 0x90) | SM | channel
+        return (CLA & 0x90) | 0x40 | (0x20 if SM else 0x00) | (channel - 4)
+    
+    def open_channel(self):
+        """
+        self.open_channel() -> int or None
+        
+        opens a supplementary logical channel with MANAGE CHANNEL on the 
+        basic channel, the card assigning its number
+        returns the channel number, or None on error
+        the MF is selected on the new channel; APDU are still sent on the 
+        current channel, see use_channel()
+        """
+        cur, self.channel = self.channel, 0
+        self.coms.push(self.MANAGE_CHANNEL(0x00, 0x00))
+        self.channel = cur
+        if self.coms()[2] != (0x90, 0x00) or len(self.coms()[3]) != 1:
+            if self.dbg:
+                log(2, '(open_channel) %s' % self.coms())
+            return None
+        channel = self.coms()[3][0]
+        self._channels[channel] = None
+        self._chan_sel[channel] = (None, (), None)
+        return channel
+    
+    def close_channel(self, channel=1):
+        """
+        self.close_channel(channel=int) -> bool
+        
+        closes the supplementary logical channel with MANAGE CHANNEL on the 
+        basic channel, and goes back to the basic channel if it was in use
+        returns True on success
+        """
+        if channel == self.channel:
+            self.use_channel(0)
+        self.coms.push(self.MANAGE_CHANNEL(0x80, channel))
+        if channel in self._channels:
+            del self._channels[channel]
+        if channel in self._chan_sel:
+            del self._chan_sel[channel]
+        return self.coms()[2] == (0x90, 0x00)
+    
+    def close_channels(self):
+        """
+        closes all the supplementary logical channels opened with 
+        open_channel(), and goes back to the basic channel
+        """
+        for channel in sorted(self._channels.keys()):
+            self.close_channel(channel)
+    
+    def use_channel(self, channel=0):
+        """
+        self.use_channel(channel=int) -> None
+        
+        sends the following APDU on the given logical channel, 0 being the
+        basic channel; the file selected is tracked for each channel
+        """
+        if channel == self.channel:
+            return
+        self._chan_sel[self.channel] = self._sel
+        self.channel = channel
+        self._sel = self._chan_sel.pop(channel, None)
+    
+    def _AID_channel(self, under_AID=None):
+        # returns the logical channel where the AID is kept selected, or None
+        if under_AID is None:
+            return None
+        for (channel, num) in self._channels.items():
+            if num == under_AID:
+                return channel
+        return None
+    
     def go_to_path(self, path=[], under_AID=None):
         """
         self.go_to_path(path=[0x.., 0x.., 0x.., 0x.., ..], under_AID=None)
@@ -1264,16 +1952,31 @@ class ISO7816(object):
         selects all DF addresses successively from the path given
         uses the .select() method with "fid" as selection type 
         works with AID number too
+        
+        when the AID is kept selected on its own logical channel (see 
+        UICC.open_AID_channels()), switches to this channel and starts from
+        the current ADF, without selecting the AID again; otherwise, works on
+        the basic channel, or on the current channel if it is not bound to 
+        an AID
         """
         # check path length
         if len(path) % 2:
             log(1, '(go_to_path) path length not correct: %s' % path)
             return
-        # init under MF
-        self.select([0x3F, 0x00])
-        # init under AID if needed
-        if isinstance(self, UICC) and under_AID is not None:
-            self.select_by_aid(under_AID)
+        channel = self._AID_channel(under_AID)
+        if channel is not None:
+            # init under the ADF of the channel
+            self.use_channel(channel)
+            self.select([0x7F, 0xFF])
+        else:
+            if self._channels.get(self.channel) is not None:
+                # keep the AID selected on its channel
+                self.use_channel(0)
+            # init under MF
+            self.select([0x3F, 0x00])
+            # init under AID if needed
+            if isinstance(self, UICC) and under_AID is not None:
+                self.select_by_aid(under_AID)
         # select over the whole path
         [self.select(addr, 'fid') for addr in \
             [path[i:i+2] for i in range(0,len(path),2)]]
@@ -1296,14 +1999,21 @@ class ISO7816(object):
         
         check dictionnaries describing MF or AID directory structure
         and return DF not to select when scanning for file ID under a DF
+        
+        when the directory structure has not been explored yet, the DF 
+        known under the parent DF in the FS catalogue (see card.FS.catalogue)
+        are returned instead
         """
         # IC card Master File, never reselect it...
         MF = [0x3F, 0x00]
         # you should also avoid to reselect it
         # looks like an alias of the MF
         pseudo_MF = [0x3F, 0xFF]
-        # init BlackList with MF and current DF
-        BL = [ MF, pseudo_MF ]
+        # current ADF for UICC, selectable from anywhere: an alias of the
+        # ADF, or of a DF under the MF
+        current_ADF = [0x7F, 0xFF]
+        # init BlackList with MF, current ADF and current DF
+        BL = [ MF, pseudo_MF, current_ADF ]
         #
         # check if current DF is root: returns directly
         current_DF = DF_path[-2:]
@@ -1313,16 +2023,14 @@ class ISO7816(object):
                 if self.dbg:
                     log(2, '(make_blacklist)  AID%i directory structure not' \
                            ' found' % under_AID)
-                if current_DF: BL.append(current_DF) 
-                return BL
+                return self._catalogue_blacklist(BL, DF_path, 'USIM')
             dir_struct = getattr(self, '_AID%i_struct' % under_AID)
         # else, select MF directory structure to use
         else:
             if not hasattr(self, '_MF_struct'):
                 if self.dbg:
                     log(2, '(make_blacklist) MF directory structure not found')
-                if current_DF: BL.append(current_DF)
-                return BL
+                return self._catalogue_blacklist(BL, DF_path, 'MF')
             dir_struct = self._MF_struct
         #
         # if parent_DF is root (MF or AID), add only childs of root
@@ -1341,8 +2049,72 @@ class ISO7816(object):
             if current_DF: BL.append(current_DF) 
             return BL
     
+    def _catalogue_blacklist(self, BL, DF_path, cat_name):
+        # completes the blacklist BL with the current DF, its father DF, and
+        # the DF known under the father DF in the FS catalogue `cat_name`,
+        # but those which can also be under the current DF
+        from card.FS import catalogue
+        current_DF = DF_path[-2:]
+        if current_DF: 
+            BL.append(current_DF)
+        if len(DF_path) >= 4:
+            BL.append( DF_path[-4:-2] )
+        if len(DF_path) >= 2:
+            cat = catalogue(cat_name)
+            parent = tuple(DF_path[:-2])
+            children = set(cat.children(DF_path))
+            children.update( catalogue('DF').children(()) )
+            for fid in cat.children(parent):
+                if fid not in children and list(fid) not in BL \
+                and cat.structure(parent + fid) == 'DF':
+                    BL.append( list(fid) )
+        return BL
+    
+    # 8 MSB of file addresses where files are usually found, 
+    # tried first by scan_candidates()
+    scan_likely_hi = (0x6F, 0x4F, 0x5F, 0x7F, 0x2F)
+    
+    def scan_candidates(self, dir_path=[], under_AID=None, \
+                        hi_addr=(0, 0xff), lo_addr=(0, 0xff), early_exit=False):
+        """
+        self.scan_candidates(dir_path=[0x.., 0x.., 0x.., 0x..], under_AID=None)
+            -> generator of file addresses [0x.., 0x..]
+        
+        yields the file addresses to try under a given DF path, within the 
+        hi_addr and lo_addr ranges, the most likely first:
+        1) addresses of files known under this DF, from the FS catalogues 
+           (see card.FS.catalogue(): 'MF' or 'USIM', and 'DF')
+        2) all addresses in the usual ranges (see self.scan_likely_hi)
+        3) all other addresses, in numeric order, if early_exit is False
+        each address is yielded once
+        """
+        from card.FS import catalogue
+        path = tuple(dir_path)
+        known = set(catalogue('USIM' if under_AID else 'MF').children(path))
+        # those DF can be under any DF
+        known.update( catalogue('DF').children(()) )
+        known.update( catalogue('DF').children(path[-2:]) )
+        #
+        done = set()
+        for addr in sorted(known):
+            if hi_addr[0] <= addr[0] <= hi_addr[1] \
+            and lo_addr[0] <= addr[1] <= lo_addr[1]:
+                done.add(addr)
+                yield list(addr)
+        #
+        his = [i for i in self.scan_likely_hi if hi_addr[0] <= i <= hi_addr[1]]
+        if not early_exit:
+            his.extend( [i for i in range(hi_addr[0], hi_addr[1]+1) \
+                         if i not in self.scan_likely_hi] )
+        for i in his:
+            for j in range(lo_addr[0], lo_addr[1]+1):
+                if (i, j) not in done:
+                    yield [i, j]
+    
     def scan_DF(self, dir_path=[], under_AID=None, \
-                hi_addr=(0, 0xff), lo_addr=(0, 0xff)):
+                hi_addr=(0, 0xff), lo_addr=(0, 0xff), \
+                ordered=False, early_exit=False, with_content=True, \
+                checkpoint=None, resume=None):
         """
         self.scan_DF(dir_path=[0x.., 0x.., 0x.., 0x..], under_AID=None)
             -> list(filesystem), list(child_DF)
@@ -1350,101 +2122,907 @@ class ISO7816(object):
         try to select all file addresses under a given DF path
             hi_addr: 8 MSB of the file address to brute force
             lo_addr: 8 LSB of the file address to brute force
+            ordered: try the known and likely file addresses first, 
+                     see scan_candidates()
+            early_exit: stop after the known and likely file addresses
+                        (implies ordered)
+            with_content: if False, only the file parameters are returned, 
+                          EF content is not read (see fetch_content()), and 
+                          the DF is selected back from a child DF by its file 
+                          id instead of the whole path from the MF
+            checkpoint: scan_checkpoint instance, to record the progress of
+                        the scan, see explore_DF()
+            resume: 3-tuple (file address, list(filesystem), list(child_DF)),
+                    to restart an interrupted scan after the given file 
+                    address, with the files and child DF already found
         avoid selecting blacklisted files (MF, parent_DF, brother_DF, current_DF)
         return list of all found files (EF, DF) and list of child DF
         """
+        # init variables to return
+        if resume is not None:
+            FS, child_DF = resume[1][:], resume[2][:]
+        else:
+            FS, child_DF = [], []
+        #
+        for (addr, file, child) in self._scan_addrs(dir_path, under_AID, 
+                                        hi_addr, lo_addr, ordered, early_exit, 
+                                        with_content, 
+                                        resume[0] if resume else None,
+                                        resume[1] if resume else []):
+            if file is not None:
+                # add result to grow the filesystem
+                FS.append(file)
+                # now fill in child_DF to potentially 
+                # grow the directory structure
+                if child:
+                    child_DF.append(addr)
+            if checkpoint is not None:
+                checkpoint.scanned(dir_path, addr, FS, child_DF)
+        return FS, child_DF
+    
+    def _scan_addrs(self, dir_path, under_AID, hi_addr, lo_addr, ordered, 
+                    early_exit, with_content, after=None, found=[]):
+        """
+        tries to select the file addresses under a given DF path, see scan_DF()
+        yields a 3-tuple (file address, dict(file) or None, child DF 
+        indicator) for each address tried, after the address `after` if set,
+        the files already `found` before it being those of an interrupted 
+        scan
+        ends at the MF
+        """
         # build blacklist of addresses from the current directory structure
         # and selected path, in order to select only child file ID:
-        BL = self.make_blacklist(dir_path, under_AID)
+        BL = set([tuple(addr) for addr in self.make_blacklist(dir_path, 
+                                                              under_AID)])
         if self.dbg >= 2:
             log(3, '(scan_DF) blacklist: %s' % BL)
-        # init variables to return
-        FS, child_DF = [], []
+        # fingerprints (and content hashes) of the files found, to detect 
+        # DF aliases
+        children = dict([(tuple(fil['Absolut Path'][-2:]), 
+                          (self._fingerprint(fil), self._content_hash(fil))) \
+                         for fil in found])
+        if not hasattr(self, '_DF_fp'):
+            self._DF_fp, self._DF_children, self._DF_aliases = {}, {}, {}
         #
         # init to path
         self.go_to_path(dir_path, under_AID)
         # bruteforce child file addresses
-        i, j = 0, 0
-        for i in range(hi_addr[0], hi_addr[1]+1):
+        if ordered or early_exit:
+            addrs = self.scan_candidates(dir_path, under_AID, hi_addr, lo_addr,
+                                         early_exit)
+        else:
+            addrs = ([i, j] for i in range(hi_addr[0], hi_addr[1]+1) \
+                            for j in range(lo_addr[0], lo_addr[1]+1))
+        skip = after is not None
+        complete = True
+        for addr in addrs:
+            # skip addresses already scanned
+            if skip:
+                skip = (addr != list(after))
+                continue
+            # stop on an exhausted budget, the scan being partial
+            if self._budget_over('scan_DF', dir_path + addr):
+                complete = False
+                break
             # just make it verbose...
-            if self.dbg and i%32 == 0:
-                log(3, '(scan_DF) addr: %s %s' % (dir_path, [i, j]))
-            for j in range(lo_addr[0], lo_addr[1]+1):
-                addr = [i, j]
-                # avoid selection of blacklisted addresses:
-                if addr in BL:
-                    pass
-                # select by direct file id
+            if self.dbg and addr[0]%32 == 0 and addr[1] == lo_addr[0]:
+                log(3, '(scan_DF) addr: %s %s' % (dir_path, addr))
+            # avoid selection of blacklisted addresses:
+            if tuple(addr) in BL:
+                yield (addr, None, False)
+                continue
+            # select by direct file id
+            file = self.select(addr, 'fid', with_content=with_content)
+            if not file:
+                yield (addr, None, False)
+                continue
+            if self.dbg:
+                log(3, '(scan_DF) found file at path: %s' % (dir_path + addr))
+            # keep track of absolute path
+            file['Absolut Path'] = dir_path + addr
+            fp = self._fingerprint(file)
+            children[tuple(addr)] = (fp, self._content_hash(file))
+            child = False
+            if 'Type' in file.keys() and file['Type'] == 'DF':
+                # for UICC, avoid reselecting AID DF
+                if under_AID and 'DF Name' in file.keys() \
+                and file['DF Name'] == self.AID[under_AID-1]:
+                    if self.dbg:
+                        log(3, '(scan_DF) USIM AID alias at %s: ' \
+                               'ignoring it' % addr)
+                    file['Alias of'] = []
+                # avoid rescanning a DF already scanned at another path
+                elif self.detect_aliases \
+                and self._DF_alias(dir_path + addr, file, fp, under_AID):
+                    file['Alias of'] = \
+                        list(self._DF_aliases[tuple(dir_path + addr)])
                 else:
-                    file = self.select(addr, 'fid')
-                    if file:
-                        if self.dbg:
-                            log(3, '(scan_DF) found file at path: %s' \
-                                  % (dir_path + addr))
-                        # keep track of absolute path
-                        file['Absolut Path'] = dir_path + addr
-                        # add result to grow the filesystem
-                        FS.append(file)
-                        # now fill in child_DF to potentially 
-                        # grow the directory structure
-                        if 'Type' in file.keys() and file['Type'] == 'DF':
-                            # for UICC, avoid reselecting AID DF
-                            if under_AID and 'DF Name' in file.keys() \
-                            and file['DF Name'] == self.AID[under_AID-1]:
-                                if self.dbg:
-                                    log(3, '(scan_DF) USIM AID alias at %s: ' \
-                                           'ignoring it' % addr)
-                            else:
-                                child_DF.append(addr)
-                            # replace selection to parent_path
-                            self.go_to_path(dir_path, under_AID)
+                    child = True
+                    paths = self._DF_fp.setdefault((under_AID, fp), [])
+                    if dir_path + addr not in paths:
+                        paths.append(dir_path + addr)
+                # replace selection to parent_path
+                if with_content \
+                or self._select_parent(dir_path, under_AID) is None:
+                    self.go_to_path(dir_path, under_AID)
+            yield (addr, file, child)
         #
-        # re-initialize at MF and return
-        self.select([0x3F, 0x00])
-        return FS, child_DF
+        # keep the fingerprints of the files found, for a complete scan only
+        if complete and not early_exit \
+        and hi_addr == (0, 0xff) and lo_addr == (0, 0xff):
+            self._DF_children[(under_AID, tuple(dir_path))] = children
+        # re-initialize at MF, or at the ADF of the logical channel
+        if self._channels.get(self.channel) is not None:
+            self.select([0x7F, 0xFF])
+        else:
+            self.select([0x3F, 0x00])
+    
+    # detect DF aliases when scanning, see _DF_alias(); this costs up to 
+    # a few thousands SELECT for each DF with the same parameters as a DF
+    # already scanned
+    detect_aliases = False
+    
+    def _fingerprint(self, fil):
+        """
+        returns a hash of the file parameters in the file dictionnary `fil`, 
+        without its content, path, raw response and parameters in 
+        self.layout_volatile
+        """
+        fp = [(k, fil[k]) for k in sorted(fil.keys(), key=str) \
+              if k not in ('Data', 'Absolut Path', 'Raw') \
+                        + self.layout_volatile]
+        return hashlib.sha1(repr(fp).encode()).hexdigest()
     
-    def explore_DF(self, DF_path=[], under_AID=None, recursive=True):
+    @staticmethod
+    def _content_hash(fil):
+        """
+        returns a hash of the content of the file dictionnary `fil`, or None
+        when its content was not read
+        """
+        if 'Data' not in fil.keys():
+            return None
+        return hashlib.sha1(repr(fil['Data']).encode()).hexdigest()
+    
+    # DF parameters identifying a DF beyond its file id: its name and its
+    # proprietary information (see parse_proprietary()), without the free 
+    # memory
+    DF_identity = ('DF Name', 'Proprietary no-BERTLV', 'UICC characteristics',
+                   'Application power consumption', 
+                   'Minimum application clock frequency', 'File details', 
+                   'Reserved file size', 'Maximum file size', 
+                   'Supported system commands', 
+                   'Specific UICC environmental conditions')
+    
+    def _DF_alias(self, path, fil, fp, under_AID=None):
+        """
+        checks if the DF `fil` just selected at the absolute `path`, with the
+        fingerprint `fp`, is an alias of a DF already scanned: a DF with the
+        same fingerprint, being one of its parents, or with the same children
+        (see _same_children()), the latter only when the DF has a name or 
+        proprietary information (see self.DF_identity) to compare; DF 
+        with the same file id and descriptor only are distinct DF
+        records the alias in self._DF_aliases and returns True, or returns 
+        False
+        """
+        identified = [k for k in self.DF_identity if k in fil.keys()]
+        for orig in self._DF_fp.get((under_AID, fp), []):
+            if list(orig) == list(path):
+                # same DF scanned again
+                continue
+            elif list(orig) == path[:len(orig)]:
+                # same DF as one of its parents: looping alias
+                same = True
+            elif not identified:
+                same = False
+            else:
+                same = self._same_children(path, orig, under_AID)
+            if same:
+                if self.dbg:
+                    log(3, '(scan_DF) DF alias at %s of %s: ignoring it' \
+                           % (path, orig))
+                self._DF_aliases[tuple(path)] = orig
+                return True
+        return False
+    
+    def iter_DF(self, DF_path=[], under_AID=None, recursive=True, \
+                ordered=False, early_exit=False, with_content=True, \
+                checkpoint=None, pending=None):
+        """
+        self.iter_DF(DF_path=[0x.., 0x.., 0x.., 0x..], under_AID=None, \
+                     recursive=True, ordered=False, early_exit=False, 
+                     with_content=True)
+            -> generator of dict(file)
+        
+        explores the DF path like explore_DF(), but yields each file as soon 
+        as it is found, with its "Absolut Path", file parameters and content
+        (if with_content), instead of filling in self.FS
+        the directory structure is still kept in self._MF_struct or 
+        self._AID`num`_struct
+        
+        checkpoint: scan_checkpoint instance whose state was initialized by 
+                    explore_DF(), to record the progress of the exploration
+        pending: list of the DF paths still to scan (by default, DF_path 
+                 only), updated in place, e.g. from a checkpoint
+        
+        the iteration can be stopped at any time; the card must not be used
+        by the consumer between 2 files, as the scan relies on the current DF
+        """
+        if pending is None:
+            pending = [list(DF_path)]
+        try:
+            while pending:
+                path = pending[0]
+                if self._budget_over('explore_DF', path):
+                    return
+                if len(path) > len(DF_path):
+                    print('recursive selection of path %s' % path)
+                # scan of this DF interrupted, to be resumed
+                resume = None
+                if checkpoint is not None and checkpoint.state['scan'] \
+                and checkpoint.state['scan'][0] == path:
+                    resume = checkpoint.state['scan'][1:]
+                if resume is not None:
+                    FS, child_DF = resume[1][:], resume[2][:]
+                else:
+                    FS, child_DF = [], []
+                for (addr, file, child) in self._scan_addrs(path, under_AID, 
+                                    (0, 0xff), (0, 0xff), ordered, early_exit,
+                                    with_content, 
+                                    resume[0] if resume else None, 
+                                    resume[1] if resume else []):
+                    if file is not None:
+                        FS.append(file)
+                        if child:
+                            child_DF.append(addr)
+                        yield file
+                    if checkpoint is not None:
+                        checkpoint.scanned(path, addr, FS, child_DF)
+                if self.budget is not None and self.budget.exhausted():
+                    # partial scan: the DF stays pending, to be resumed from 
+                    # the checkpoint
+                    if checkpoint is not None:
+                        checkpoint.state['fingerprints'] = (self._DF_fp, 
+                            self._DF_children, self._DF_aliases)
+                        checkpoint.save()
+                    return
+                del pending[0]
+                pending[0:0] = self._scanned_DF(path, FS, child_DF, under_AID,
+                                                recursive)
+                if checkpoint is not None:
+                    checkpoint.state['scan'] = None
+                    checkpoint.state['struct'] = self._dir_struct(under_AID)
+                    checkpoint.state['fingerprints'] = (self._DF_fp, 
+                        self._DF_children, self._DF_aliases)
+                    checkpoint.save()
+        except Exception:
+            # save what has been done until the error
+            if checkpoint is not None:
+                checkpoint.save()
+            raise
+    
+    def _scanned_DF(self, path, FS, child_DF, under_AID, recursive):
+        """
+        records the child DF found when scanning the DF at `path`, and the 
+        DF aliases in the files `FS` found (not to be scanned), in the 
+        directory structure, and returns the paths of the child DF to scan 
+        next, according to the maximum recursion level `recursive`
+        """
+        # init or extend self._MF_struct or self._AID`num`_struct for 
+        # blacklist management
+        self._dir_struct(under_AID)[tuple(path)] = child_DF + \
+            [f['Absolut Path'][-2:] for f in FS if 'Alias of' in f.keys()]
+        # manage maximum recursion level: do not scan children DF
+        # if absolut path is over recursion level
+        if recursive and not (type(recursive) == int \
+        and len(path)/2 >= recursive):
+            return list(map(path.__add__, child_DF))
+        return []
+    
+    def explore_DF(self, DF_path=[], under_AID=None, recursive=True, \
+                   ordered=False, early_exit=False, with_content=True, \
+                   checkpoint=None, layout=None, spot_check=0):
         """
         self.explore_DF(dir_path=[0x.., 0x.., 0x.., 0x..], under_AID=None, \
-                        recursive=True)
+                        recursive=True, ordered=False, early_exit=False, 
+                        with_content=True, checkpoint=None, layout=None, 
+                        spot_check=0)
             -> None
         
         try to select all file addresses under a given DF path recursively with
-        scan_DF() method, possibly recursively (can be an `int`, to stop after
+        iter_DF() method, possibly recursively (can be an `int`, to stop after
         a certain level)
+        ordered, early_exit and with_content are passed to iter_DF()
         fill in self.FS dictionnary with found DF and files
         and self._MF_struct or self._AID`num`_struct with directory structure
+        
+        checkpoint: file name (or scan_checkpoint instance) where the progress
+                    of the exploration is saved regularly, and on error; 
+                    the exploration can then be restarted from where it
+                    stopped with resume_explore()
+        layout: layout_cache instance; if the layout of this card model (see
+                layout_key()) is known, only the known files are selected, 
+                and `spot_check` likely file addresses (see scan_candidates())
+                are tried under each known DF to detect unknown files
+                otherwise (or if the card does not match the layout), the 
+                files are brute forced and the layout found is stored
+        
+        when self.budget is exhausted, the exploration stops with the files 
+        found so far in self.FS, and can be resumed from the checkpoint
         """
-        # init by scanning the given DF_path (MF or AID)
-        FS, child_DF = self.scan_DF(DF_path, under_AID)
-        # then init or extend self._MF_struct or 
-        # self._AID`num`_struct for blacklist management
+        if not hasattr(self, 'FS'):
+            self.init_FS()
+        if layout is not None:
+            key = self.layout_key()
+            scope = '%s [%s] %s' % ('AID %s' % toHexString(self.AID[under_AID-1])
+                                    if under_AID else 'MF', 
+                                    toHexString(DF_path), recursive)
+            known = layout.get(key, scope)
+            if known is not None \
+            and self._explore_known(known[0], known[1], under_AID, 
+                                    with_content, spot_check, known[2]):
+                return
+            # unknown card model or layout: brute force it and store it
+            FS_len = len(self.FS)
+            self.explore_DF(DF_path, under_AID, recursive, ordered, 
+                            early_exit, with_content, checkpoint)
+            if self.budget is not None and self.budget.exhausted():
+                # partial exploration, not to be stored
+                return
+            struct = self._dir_struct(under_AID)
+            layout.put(key, scope, 
+                       [f['Absolut Path'] for f in self.FS[FS_len:]],
+                       dict([(k, v) for (k, v) in struct.items() \
+                             if list(k[:len(DF_path)]) == list(DF_path)]),
+                       dict([(tuple(f['Absolut Path']), f['Alias of']) \
+                             for f in self.FS[FS_len:] \
+                             if 'Alias of' in f.keys()]))
+            layout.save()
+            return
+        pending = [list(DF_path)]
+        if checkpoint is not None:
+            if not isinstance(checkpoint, scan_checkpoint):
+                checkpoint = scan_checkpoint(checkpoint)
+            checkpoint.state = {
+                'args': (list(DF_path), under_AID, recursive, ordered, 
+                         early_exit, with_content),
+                'pending': pending,
+                'scan': None,
+                'FS': self.FS,
+                'struct': None,
+                'fingerprints': None}
+            checkpoint.save()
+        self._explore(pending, list(DF_path), under_AID, recursive, 
+                      ordered, early_exit, with_content, checkpoint)
+    
+    def _same_children(self, path, orig, under_AID=None):
+        """
+        checks if the DF just selected at `path` has the same children as the
+        DF at `orig`, whose scan was complete:
+        1) all the files found under `orig` are under `path`, with the same
+           fingerprints and the same content, when it can be read
+        2) none of the known and likely file addresses (see 
+           scan_candidates()) missing under `orig` is found under `path`
+        """
+        children = self._DF_children.get((under_AID, tuple(orig)))
+        if not children:
+            return False
+        # EF whose content was not read when scanning `orig`
+        unread = {}
+        for (addr, (fp, data)) in children.items():
+            fil = self.select(list(addr), 'fid')
+            if fil is None:
+                return False
+            if 'Type' in fil.keys() and fil['Type'] == 'DF':
+                # back to the selected DF
+                self.select(path[-2:], 'fid', with_content=False)
+            if self._fingerprint(fil) != fp:
+                return False
+            if data is None:
+                if self._content_hash(fil) is not None:
+                    unread[addr] = self._content_hash(fil)
+            elif self._content_hash(fil) != data:
+                return False
+        # MF, current ADF, selected DF, parent DF and its children (when the
+        # parent DF was scanned) are selectable from the selected DF too
+        BL = set([(0x3F, 0x00), (0x3F, 0xFF), (0x7F, 0xFF), tuple(path[-2:])])
+        if len(path) >= 4:
+            BL.add(tuple(path[-4:-2]))
+        BL.update([tuple(addr) for addr in \
+                   self._dir_struct(under_AID).get(tuple(path[:-2]), [])])
+        for addr in self.scan_candidates(path, under_AID, early_exit=True):
+            if tuple(addr) in children or tuple(addr) in BL:
+                continue
+            fil = self.select(addr, 'fid', with_content=False)
+            if fil is not None:
+                if self.dbg >= 2:
+                    log(3, '(_same_children) file %s under %s, not under %s' \
+                           % (addr, path, orig))
+                self.go_to_path(path, under_AID)
+                return False
+        if unread:
+            # compare with the content of the files under `orig`
+            self.go_to_path(list(orig), under_AID)
+            for (addr, data) in unread.items():
+                fil = self.select(list(addr), 'fid')
+                if fil is None or self._content_hash(fil) != data:
+                    self.go_to_path(path, under_AID)
+                    return False
+            self.go_to_path(path, under_AID)
+        return True
+    
+    # file parameters changing from a card to another of the same model,
+    # ignored in layout_key(): UICC free memory and PIN status, and SIM 
+    # CHV / unblock CHV status with their attempts counter
+    layout_volatile = ('Amount of available memory', 'PIN Status',
+                       'CHV1', 'unblock_CHV1', 'CHV2', 'unblock_CHV2')
+    
+    def layout_key(self):
+        """
+        self.layout_key() -> str
+        
+        returns a key identifying the card model, made of the ATR and a hash
+        of the MF file parameters (without those in self.layout_volatile), 
+        and for UICC, of the AID listed in EF_DIR
+        """
+        MF = self.select([0x3F, 0x00], with_content=False) or {}
+        fp = [self._fingerprint(MF)]
+        if isinstance(self, UICC):
+            if not self.AID:
+                self.get_AID()
+            fp.append( ('AID', self.AID) )
+        return '%s %s' % (toHexString(self.ATR).replace(' ', ''), 
+                          hashlib.sha1(repr(fp).encode()).hexdigest())
+    
+    def _explore_known(self, paths, struct, under_AID=None, with_content=True,
+                       spot_check=0, aliases={}):
+        """
+        selects the files at the known absolute `paths` and sets the 
+        directory `struct`, and tries `spot_check` unknown likely file 
+        addresses under each DF
+        the DF at the paths in `aliases` are marked as aliases of the DF at
+        the associated path, as done by scan_DF()
+        fill in self.FS with the files, and returns True, or returns False 
+        without changing self.FS if the card does not match
+        """
+        paths = set([tuple(p) for p in paths])
+        FS = self.select_paths(paths, under_AID, with_content)
+        if len(FS) != len(paths):
+            if self.dbg:
+                log(2, '(_explore_known) %i known files not found' \
+                       % (len(paths) - len(FS)))
+            return False
+        for fil in FS:
+            if tuple(fil['Absolut Path']) in aliases:
+                fil['Alias of'] = list(aliases[tuple(fil['Absolut Path'])])
+        #
+        name = '_AID%i_struct' % under_AID if under_AID else '_MF_struct'
+        prev = getattr(self, name, None)
+        setattr(self, name, struct)
+        for (df, children) in struct.items():
+            if not spot_check:
+                break
+            df = list(df)
+            # MF, current ADF, current DF, parent DF and its children, and 
+            # known children
+            BL = set([(0x3F, 0x00), (0x3F, 0xFF), (0x7F, 0xFF), 
+                      tuple(df[-2:]), tuple(df[-4:-2])] \
+                     + [tuple(c) for c in struct.get(tuple(df[:-2]), [])] \
+                     + [tuple(c) for c in children])
+            self.go_to_path(df, under_AID)
+            cnt = 0
+            for addr in self.scan_candidates(df, under_AID):
+                if tuple(addr) in BL or tuple(df + addr) in paths:
+                    continue
+                if self.select(addr, 'fid', with_content=False) is not None:
+                    if self.dbg:
+                        log(2, '(_explore_known) unknown file found: %s' \
+                               % (df + addr))
+                    if prev is None:
+                        delattr(self, name)
+                    else:
+                        setattr(self, name, prev)
+                    return False
+                cnt += 1
+                if cnt >= spot_check:
+                    break
+        self.FS.extend(FS)
+        return True
+    
+    def resume_explore(self, checkpoint):
+        """
+        self.resume_explore(checkpoint=str(file name)) -> None
+        
+        restarts an exploration started with explore_DF(..., checkpoint=...) 
+        and interrupted, from the last file address scanned, as saved in the 
+        checkpoint file
+        restores self.FS and the directory structure from the file first
+        """
+        if not isinstance(checkpoint, scan_checkpoint):
+            checkpoint = scan_checkpoint(checkpoint)
+        state = checkpoint.load()
+        DF_path, under_AID, recursive, ordered, early_exit, with_content = \
+            state['args']
+        self.FS = state['FS']
+        if state['struct'] is None:
+            pass
+        elif under_AID:
+            setattr(self, '_AID%i_struct' % under_AID, state['struct'])
+        else:
+            self._MF_struct = state['struct']
+        if state['fingerprints'] is not None:
+            self._DF_fp, self._DF_children, self._DF_aliases = \
+                state['fingerprints']
+        self._explore(state['pending'], DF_path, under_AID, recursive, 
+                      ordered, early_exit, with_content, checkpoint)
+    
+    def _dir_struct(self, under_AID=None):
+        # returns the MF or AID directory structure, initializing it if needed
         if under_AID:
             # if _AID`num`_struct not initialized (we are at AID root):
             if not hasattr(self, '_AID%i_struct' % under_AID):
                 setattr(self, '_AID%i_struct' % under_AID, {})
-            # then populate _AID`num`_struct with found child_DF
-            getattr(self, '_AID%i_struct' % under_AID)[tuple(DF_path)] = child_DF
+            return getattr(self, '_AID%i_struct' % under_AID)
         else:
             # if _MF_struct not initialized (we are at MF root):
             if not hasattr(self, '_MF_struct'):
                 self._MF_struct = {}
-            self._MF_struct[tuple(DF_path)] = child_DF
-        # populate the self.FS
+            return self._MF_struct
+    
+    def _explore(self, pending, DF_path, under_AID, recursive, ordered, 
+                 early_exit, with_content, checkpoint):
+        """
+        scans the DF paths in the `pending` list (depth-first, as long as 
+        children DF are found) with iter_DF(), the exploration starting at 
+        `DF_path`, and fills in self.FS with the files found
+        """
+        for fil in self.iter_DF(DF_path, under_AID, recursive, ordered, 
+                                early_exit, with_content, checkpoint, pending):
+            self.FS.append(fil)
+    
+    def scan_DF_parallel(self, sessions=[], dir_path=[], under_AID=None, \
+                         hi_addr=(0, 0xff), lo_addr=(0, 0xff), \
+                         ordered=False, early_exit=False, with_content=True):
+        """
+        self.scan_DF_parallel(sessions=[card, ...], dir_path=[0x.., 0x..], 
+                              under_AID=None)
+            -> list(filesystem), list(child_DF)
+        
+        same as scan_DF(), but the hi_addr range is split into contiguous 
+        shards, each one being scanned in its own thread by `self` or one of 
+        the `sessions`: instances of the same class connected to other 
+        readers, with identical cards in them
+        returns the merged list of files found and list of child DF
+        """
+        import threading
+        sessions = [self] + [sess for sess in sessions if sess is not self]
+        his = list(range(hi_addr[0], hi_addr[1]+1))
+        size = (len(his) + len(sessions) - 1) // len(sessions)
+        shards = [(his[i], his[min(i+size, len(his))-1]) \
+                  for i in range(0, len(his), size)]
+        results = [None] * len(shards)
+        #
+        def scan(k):
+            try:
+                results[k] = sessions[k].scan_DF(dir_path, under_AID, 
+                                                 shards[k], lo_addr, ordered, 
+                                                 early_exit, with_content)
+            except Exception as err:
+                results[k] = err
+        threads = [threading.Thread(target=scan, args=(k,)) \
+                   for k in range(len(shards))]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        #
+        FS, child_DF = [], []
+        for k in range(len(shards)):
+            if isinstance(results[k], Exception):
+                log(1, '(scan_DF_parallel) error on session %i, for hi_addr %s'\
+                       % (k, shards[k]))
+                raise results[k]
+            FS.extend(results[k][0])
+            child_DF.extend(results[k][1])
+        return FS, child_DF
+    
+    def explore_DF_parallel(self, sessions=[], DF_path=[], under_AID=None, \
+                            recursive=True, ordered=False, early_exit=False, \
+                            with_content=True):
+        """
+        self.explore_DF_parallel(sessions=[card, ...], DF_path=[0x.., 0x..], 
+                                 under_AID=None, recursive=True)
+            -> None
+        
+        same as explore_DF(), but each DF is scanned with scan_DF_parallel(),
+        by `self` together with the other `sessions`
+        DF are scanned level by level: the directory structure found at a 
+        level is shared with all sessions before scanning the next one, so 
+        that each of them can build its blacklist
+        fill in self.FS with found DF and files, in breadth-first order
+        """
         if not hasattr(self, 'FS'):
             self.init_FS()
-        self.FS.extend(FS)
+        if under_AID:
+            name = '_AID%i_struct' % under_AID
+        else:
+            name = '_MF_struct'
+        level = [list(DF_path)]
+        while level:
+            next_level = []
+            for path in level:
+                if len(path) > len(DF_path):
+                    print('recursive selection of path %s' % path)
+                FS, child_DF = self.scan_DF_parallel(sessions, path, under_AID,
+                                                     ordered=ordered, 
+                                                     early_exit=early_exit, 
+                                                     with_content=with_content)
+                self.FS.extend(FS)
+                next_level.extend( self._scanned_DF(path, FS, child_DF, 
+                                                    under_AID, recursive) )
+            # share the directory structure with all sessions
+            for sess in sessions:
+                setattr(sess, name, getattr(self, name))
+            level = next_level
+    
+    def select_paths(self, paths=[], under_AID=None, with_content=True):
+        """
+        self.select_paths(paths=[[0x.., 0x.., ...], ...], under_AID=None, 
+                          with_content=True)
+            -> list(filesystem)
+        
+        selects the files at the given absolute paths, under the MF or the 
+        AID, sorted so that the navigation between them is minimal (see 
+        _go_to_DF()), and returns those found, with their "Absolut Path"
+        files whose parent DF is not found are not tried
+        
+        with_content can also be a function, called with the dictionnary of
+        each EF found (without its content), which returns True when the 
+        content has to be read
+        """
+        FS, cur, missing = [], None, set()
+        for path in sorted(set([tuple(p) for p in paths])):
+            if [i for i in range(2, len(path), 2) if path[:i] in missing]:
+                continue
+            path = list(path)
+            if path[:-2] != cur:
+                cur = self._go_to_DF(cur, path[:-2], under_AID)
+                if cur is None:
+                    missing.add(tuple(path[:-2]))
+                    continue
+            fil = self.select(path[-2:], 'fid', with_content=with_content \
+                              and not callable(with_content))
+            if fil is None:
+                missing.add(tuple(path))
+                continue
+            if self.dbg >= 2:
+                log(3, '(select_paths) found file at path: %s' % path)
+            fil['Absolut Path'] = path
+            if callable(with_content) and 'Type' in fil.keys() \
+            and fil['Type'][0:2] == 'EF' and with_content(fil):
+                fil = self.read_EF(fil)
+            FS.append(fil)
+            if 'Type' in fil.keys() and fil['Type'] == 'DF':
+                cur = path
+        return FS
+    
+    def _go_to_DF(self, cur, target, under_AID=None):
+        """
+        selects the DF at the absolute path `target`, the current DF being 
+        at the absolute path `cur` (None if unknown), with the fewest 
+        selections: going up to the common parent DF by file id and down, 
+        or from the MF / AID with go_to_path()
+        returns `target`, or None on error
+        """
+        c = 0
+        if cur is not None:
+            while c < min(len(cur), len(target)) \
+            and cur[c:c+2] == target[c:c+2]:
+                c += 2
+        if cur is None or len(cur) + len(target) - 2*c \
+        > len(target) + (4 if under_AID else 2):
+            self.go_to_path(target, under_AID)
+            return target
+        while len(cur) > c:
+            cur = cur[:-2]
+            if self._select_parent(cur, under_AID) is None:
+                # the current DF was not the expected one (e.g. after 
+                # selecting a DF alias): starting again from the MF / AID
+                self.go_to_path(target, under_AID)
+                return target
+        for i in range(c, len(target), 2):
+            if self.select(target[i:i+2], 'fid', with_content=False) is None:
+                return None
+        return target
+    
+    def _select_parent(self, dir_path=[], under_AID=None):
+        """
+        selects back the DF at `dir_path` from one of its child DF, 
+        by its file id (or the MF / current ADF file id at the root)
+        returns None on error
+        """
+        if dir_path:
+            return self.select(dir_path[-2:], 'fid', with_content=False)
+        elif under_AID:
+            return self.select([0x7F, 0xFF], 'fid', with_content=False)
+        else:
+            return self.select([0x3F, 0x00], 'fid', with_content=False)
+    
+    def redump(self, files=[], under_AID=None):
+        """
+        self.redump(files=[dict(file), ...], under_AID=None) 
+            -> list(filesystem)
+        
+        selects again the files of a previous dump of the card, under the MF
+        or the AID (e.g. self.FS of a previous session, or the files of a card
+        image), at their "Absolut Path", instead of brute forcing addresses
+        the content of an EF is read again only when one of its parameters in
+        `redump_keys` changed, or when it is writable by the card holder (see
+        is_writable(), with the EF_ARR of the previous dump), otherwise it is 
+        taken from the previous dump
+        
+        returns the files found, as select_paths() does: files removed from 
+        the card are missing, and files created since the previous dump are 
+        not searched
+        """
+        prev = dict([(tuple(f['Absolut Path']), f) for f in files \
+                     if len(f.get('Absolut Path', [])) >= 2])
+        ARR = dict([(p, f['Data']) for (p, f) in prev.items() \
+                    if p[-2:] in ((0x6F, 0x06), (0x2F, 0x06)) \
+                    and f.get('Data')])
+        cnt = [0, 0]
         #
-        # and loop to scan recursively over child_DF
-        if recursive:
-            # manage maximum recursion level: do not scan children DF
-            # if absolut path is over recursion level
-            if type(recursive) == int and len(DF_path)/2 >= recursive:
-                return
-            # scan children DF
-            for path in map(DF_path.__add__, child_DF):
-                print('recursive selection of path %s' % path)
-                self.explore_DF(path, under_AID, recursive)
+        def read(fil):
+            old = prev[tuple(fil['Absolut Path'])]
+            if 'Data' not in old.keys() \
+            or [k for k in self.redump_keys if fil.get(k) != old.get(k)] \
+            or self.is_writable(fil, ARR):
+                cnt[0] += 1
+                return True
+            fil['Data'] = old['Data']
+            cnt[1] += 1
+            return False
+        #
+        FS = self.select_paths(list(prev.keys()), under_AID, read)
+        if self.dbg:
+            log(2, '(redump) %i files found out of %i, %i EF read again, %i '\
+                   'EF unchanged' % (len(FS), len(prev), cnt[0], cnt[1]))
+        return FS
+    
+    def is_writable(self, fil, ARR={}):
+        """
+        self.is_writable(fil, ARR={}) -> bool
+        
+        tells if the content of the EF described by the file dictionnary `fil`
+        (as returned by select()) can be changed by the card holder: with an
+        UPDATE (or WRITE, INCREASE) access condition being always or a PIN, 
+        see `holder_conditions` and `holder_keys`
+        
+        SIM access conditions and UICC compact security attributes are used
+        directly; UICC references to expanded security attributes need the 
+        records of the EF_ARR, in `ARR`: {absolute path of EF_ARR: records}
+        returns True when the access conditions are not known
+        """
+        if 'UPDATE' in fil.keys():
+            # SIM
+            return fil['UPDATE'] in self.holder_conditions \
+                or fil.get('Structure') == 'cyclic' \
+                and fil.get('INCREASE') in self.holder_conditions
+        elif fil.get('Security Attributes compact'):
+            return self._compact_writable(fil['Security Attributes compact'])
+        elif fil.get('Security Attributes ref to expand'):
+            rule = self._ARR_rule(fil['Security Attributes ref to expand'], 
+                                  fil.get('Absolut Path', []), ARR)
+            if rule is not None:
+                return self._expanded_writable(rule)
+        return True
+    
+    @staticmethod
+    def _compact_writable(Data):
+        # one security condition byte per access mode bit set, from b7 to b1
+        AM, SC = Data[0], Data[1:]
+        if not SC:
+            return True
+        bits = [b for b in (0x40, 0x20, 0x10, 0x08) \
+                if AM & 0x80 == 0 and AM & b] \
+             + [b for b in (0x04, 0x02, 0x01) if AM & b]
+        for i in range(len(bits)):
+            cond = SC[min(i, len(SC)-1)]
+            # always, or user authentication
+            if bits[i] in (0x04, 0x02) and cond != 0xFF \
+            and (cond == 0 or cond & 0b00010000):
+                return True
+        return False
+    
+    @staticmethod
+    def _ARR_rule(ref, path, ARR):
+        """
+        returns the EF_ARR record referenced by the expanded security 
+        attributes reference `ref` of the file at the absolute `path`, 
+        looking for the EF_ARR in its DF and its parents, or None
+        """
+        if len(ref) == 1:
+            fids, num = [(0x6F, 0x06), (0x2F, 0x06)], ref[0]
+        elif len(ref) >= 3:
+            fids, num = [tuple(ref[0:2])], ref[2]
+        else:
+            return None
+        path = tuple(path)
+        for i in range(len(path)-2, -1, -2):
+            for fid in fids:
+                recs = ARR.get(path[:i] + fid)
+                if recs is not None:
+                    if 1 <= num <= len(recs):
+                        return recs[num-1]
+                    return None
+        return None
+    
+    def _expanded_writable(self, rule):
+        # rule: EF_ARR record, access mode DO (0x80: access mode byte, 
+        # 0x84: command header) followed by their security condition DO
+        try:
+            rule = TLV_parser(rule)
+        except IndexError:
+            return True
+        write = False
+        for (T, L, V) in rule:
+            if T == 0x80:
+                write = bool(V and V[-1] & 0x06)
+            elif T == 0x84:
+                write = len(V) > 1 and V[1] in (0xD6, 0xDC, 0xE2, 0x32)
+            elif write and self._holder_condition(T, V):
+                return True
+        return False
+    
+    def _holder_condition(self, T, V):
+        # tells if the security condition DO T, V can be satisfied by the 
+        # card holder
+        if T == 0x90:
+            # always
+            return True
+        elif T == 0x97:
+            # never
+            return False
+        elif T == 0xA4:
+            # control reference template: key reference
+            for (t, l, v) in TLV_parser(V):
+                if t == 0x83 and v:
+                    return v[0] in self.holder_keys
+            return True
+        elif T in (0xA0, 0xAF):
+            # OR, AND templates
+            conds = [self._holder_condition(t, v) for (t, l, v) \
+                     in TLV_parser(V)]
+            return any(conds) if T == 0xA0 else bool(conds) and all(conds)
+        return True
+    
+    def fetch_content(self, files=[], under_AID=None):
+        """
+        self.fetch_content(files=[dict(file), ...], under_AID=None) 
+            -> list(files)
+        
+        reads the content of the EF in the given list of files returned by 
+        scan_DF() or explore_DF() with with_content=False (e.g. a subset of 
+        self.FS), according to their "Absolut Path", and sets their "Data" key
+        the files are processed DF by DF, to select each DF path once
+        """
+        EF = [f for f in files if 'Type' in f.keys() and f['Type'][0:2] == 'EF'
+              and 'Data' not in f.keys() and 'Absolut Path' in f.keys()]
+        # by parent DF first, to keep the EF of each DF together
+        EF.sort(key=lambda f: (f['Absolut Path'][:-2], 
+                               f['Absolut Path'][-2:]))
+        cur = None
+        for fil in EF:
+            path = fil['Absolut Path']
+            if path[:-2] != cur:
+                cur = path[:-2]
+                self.go_to_path(cur, under_AID)
+            ret = self.select(path[-2:], 'fid')
+            if ret is None:
+                if self.dbg:
+                    log(2, '(fetch_content) unable to select %s' % path)
+            elif 'Data' in ret.keys():
+                fil['Data'] = ret['Data']
+        return files
     
     def init_FS(self):
         self.FS = []
@@ -1569,6 +3147,8 @@ class UICC(ISO7816):
         ([0x7F, 0x90], 'DF', 'DF_TETRA'),
         ([0x7F, 0x31], 'DF', 'DF_iDEN'),
         ]
+    # {file id: name} of the files above
+    files_name = dict([(tuple(ref[0]), ref[2]) for ref in files])
     
     def __init__(self, reader=''):
         """
@@ -1602,9 +3182,9 @@ class UICC(ISO7816):
             del fil[0xC6]
         
         if 'File Identifier' in fil.keys():
-            for ref in self.files:
-                if fil['File Identifier'] == ref[0]:
-                    fil['Name'] = ref[2]
+            name = self.files_name.get(tuple(fil['File Identifier']))
+            if name is not None:
+                fil['Name'] = name
         
         # return the enriched file 
         return fil
@@ -1783,4 +3363,130 @@ class UICC(ISO7816):
         """
         if hasattr(self, 'AID') and aid_num <= len(self.AID)+1:
             return self.select(self.AID[aid_num-1], 'aid')
+    
+    def open_AID_channels(self, aid_nums=None):
+        """
+        self.open_AID_channels(aid_nums=[int, ...]) 
+            -> dict {AID number: logical channel}
+        
+        opens a supplementary logical channel for each AID number given (all
+        AID in self.AID by default) and selects the application on it
+        go_to_path(), and the methods relying on it (e.g. explore_DF() or 
+        select_paths()), then work on the channel of their `under_AID` 
+        argument, and on the basic channel for the MF, so that several 
+        applications can be accessed alternately without selecting them 
+        again
+        the channels are closed with close_channels()
+        """
+        if aid_nums is None:
+            if not self.AID:
+                self.get_AID()
+            aid_nums = range(1, len(self.AID)+1)
+        cur = self.channel
+        for num in aid_nums:
+            if self._AID_channel(num) is not None:
+                continue
+            channel = self.open_channel()
+            if channel is None:
+                break
+            self.use_channel(channel)
+            if self.select_by_aid(num) is None:
+                if self.dbg:
+                    log(2, '(open_AID_channels) AID%i not selectable on ' \
+                           'channel %i' % (num, channel))
+                self.use_channel(cur)
+                self.close_channel(channel)
+                continue
+            self._channels[channel] = num
+            self.use_channel(cur)
+        return dict([(num, channel) for (channel, num) \
+                     in self._channels.items() if num is not None])
 
+    
+    def read_by_SFI(self, addr=[0x6F, 0x07], SFI=None):
+        """
+        self.read_by_SFI(addr=[0x.., 0x..], SFI=None) 
+            -> dict() on success, None on error
+        
+        reads the EF with the file identifier `addr` in the current DF / ADF,
+        without selecting it: the EF is referenced with its Short File 
+        Identifier in the READ_BINARY / READ_RECORD commands
+        
+        the SFI is taken from the argument, or from the file parameters kept
+        in the session cache (see enable_cache()), or from the FS tables 
+        (MF_SFI, USIM_app_SFI)
+        falls back to select() when the SFI is unknown, when the file 
+        parameters are not cached and the FS catalogue expects a record EF, 
+        or when the reading fails
+        
+        returns the file dictionnary, with the "Data" key, as select() does
+        however, when the file parameters are not cached, only the transparent 
+        content can be read, and the file dictionnary is reduced to the file 
+        id, SFI, structure and size
+        """
+        if self._sel is None:
+            # the current DF is not known
+            return self.select(addr)
+        from card.FS import MF_SFI, USIM_app_SFI, catalogue
+        aid, df, addr = self._sel[0], self._sel[1], tuple(addr)
+        key = (aid, df, addr)
+        fil = None
+        if self.cache is not None:
+            fil = self.cache.get_FCP(key)
+        if aid is None:
+            cat = catalogue('MF')
+        elif aid[0:5] == (0xA0, 0x00, 0x00, 0x00, 0x87) \
+        and aid[5:7] == (0x10, 0x02):
+            cat = catalogue('USIM')
+        else:
+            cat = None
+        if SFI is None:
+            if fil is not None:
+                SFI = self.get_SFI(fil)
+            elif df == () and aid is None:
+                SFI = MF_SFI.get(addr)
+            elif df == () and cat is not None:
+                SFI = USIM_app_SFI.get(addr)
+        if SFI is None:
+            return self.select(list(addr))
+        if fil is None and cat is not None \
+        and cat.structure(df + addr) in ('linear fixed', 'cyclic'):
+            # record EF in the FS catalogue: its record length is required 
+            # and only given by its selection
+            return self.select(list(addr))
+        #
+        if fil is not None and self.cache.has(key, fil):
+            # content cached: no command is sent, the EF selected on the card
+            # (and self._sel) does not change
+            sel, self._sel = self._sel, key
+            fil = self.read_EF(fil.copy())
+            self._sel = sel
+            return fil
+        elif fil is not None:
+            # file parameters known: the read is done as after a selection, 
+            # the card selecting the EF referenced by its SFI
+            self._sel = key
+            fil = self.read_EF(fil.copy(), SFI=SFI)
+            if 'Data' in fil.keys():
+                return fil
+        else:
+            # file parameters unknown: try a transparent reading of the 
+            # whole EF, the card returns the exact size available with 6Cxx
+            self.coms.push( self.READ_BINARY(Le=0x00, SFI=SFI) )
+            if self.coms()[2][0] == 0x6C and self.coms()[2][1]:
+                self.coms.push( self.READ_BINARY(Le=self.coms()[2][1], \
+                                                 SFI=SFI) )
+            if self.coms()[2] in ((0x90, 0x00), (0x62, 0x82)) \
+            and 0 < len(self.coms()[3]) < 0x100:
+                self._sel = key
+                return file_record([('Type', 'EF working'),
+                                    ('Structure', 'transparent'),
+                                    ('File Identifier', list(addr)),
+                                    ('Size', len(self.coms()[3])),
+                                    ('Short File Identifier', [SFI<<3]),
+                                    ('Data', self.coms()[3])])
+        # the EF currently selected is not known anymore
+        if self.dbg >= 2:
+            log(3, '(read_by_SFI) %s' % self.coms())
+        self._sel = (aid, df, None)
+        return self.select(list(addr))
@@ -28,7 +28,7 @@ with this program; if not, write to the Free Software Foundation, Inc.,
 #################################
 
 from card.ICC import ISO7816
-from card.FS import SIM_FS, MF_FS
+from card.FS import catalogue
 from card.utils import *
 
 SIM_service_table = {
@@ -237,7 +237,7 @@ class SIM(ISO7816):
         type / format of file... see TS 51.011
         works over the SIM file structure
         """
-        fil = {}
+        fil = file_record()
         fil['Size'] = Data[2]*0x100 + Data[3]
         fil['File Identifier'] = Data[4:6]
         fil['Type'] = ('RFU', 'MF', 'DF', '', 'EF')[Data[6]]
@@ -395,7 +395,7 @@ class SIM(ISO7816):
                 cnt += 1
                 if B & 2**i:
                     info = 'allocated'
-                    if B & (2**i+1):
+                    if B & 2**(i+1):
                         info += ' | activated'
                     if cnt in SIM_service_table:
                         services.append('%i : %s : %s' \
@@ -404,34 +404,104 @@ class SIM(ISO7816):
                         services.append('%i : %s' % (cnt, info))
         return services
     
-    def explore_fs(self, filename='sim_fs.txt', depth=True, emul=False):
+    def explore_fs(self, filename='sim_fs.txt', depth=True, emul=False, 
+                   layout=None, known_only=False, image=False, previous=None):
         """
-        self.explore_fs(self, filename='sim_fs', depth=True) -> None
+        self.explore_fs(self, filename='sim_fs', depth=True, layout=None, 
+                        known_only=False, image=False, previous=None) 
+            -> None, or dict(delta) with previous
             filename: file to write in information found
             depth: depth in recursivity, uint, or True=infinite
+            layout: layout_cache instance, to only select the files known for
+                    this card model (see explore_DF())
+            known_only: only select the files listed in the FS tables (see 
+                        card.FS), instead of brute forcing all addresses
+            image: write a card image (see card.utils.image_writer) instead 
+                   of text, with the raw file parameters and all records
+            previous: previous dump of the same card, card image (file name 
+                      or image_reader) or list of files (e.g. from 
+                      card.store.card_store.files()), to only select again 
+                      its files and read the content of those which may have 
+                      changed (see redump()), instead of brute forcing 
+                      addresses; the delta with the previous dump is returned 
+                      (see card.utils.diff_images())
         
         brute force all file addresses from MF recursively 
         (until no more DF are found)
         write information on existing DF and file in the output file
         """
-        simfs_entries = MF_FS.keys()
-        if not emul:
-            self.explore_DF([], None, depth)
+        cat = catalogue('MF')
+        if isinstance(previous, str):
+            previous = image_reader(previous)
+        if isinstance(previous, image_reader) \
+        and previous.header.get('ICCID') not in (None, self.get_ICCID()):
+            log(1, '(explore_fs) previous dump of another card, ICCID %s' \
+                   % previous.header['ICCID'])
+            return None
+        if image or previous is not None:
+            # records are kept with their number, to be compared
+            raw = (self.keep_raw, self.empty_records)
+            self.keep_raw, self.empty_records = True, True
+        if not hasattr(self, 'FS'):
+            self.init_FS()
+        if image:
+            # each file is written as soon as it is found
+            img = image_writer(filename, self.ATR, [], 
+                               ICCID=self.get_ICCID())
+        try:
+            if previous is not None:
+                found = self.redump([fil for fil in previous \
+                                     if not fil.get('AID')])
+            elif known_only:
+                found = self.select_paths(
+                            cat.known_paths(depth+1 if type(depth) == int \
+                                            else None))
+            elif emul:
+                # files already in self.FS
+                found, self.FS = self.FS, []
+            elif layout is not None:
+                start = len(self.FS)
+                self.explore_DF([], None, depth, layout=layout)
+                found = self.FS[start:]
+                del self.FS[start:]
+            else:
+                found = self.iter_DF([], None, depth)
+            for fil in found:
+                name = cat.name(fil['Absolut Path'])
+                if name is not None:
+                    fil['Name'] = name
+                if image:
+                    img.write(fil)
+                self.FS.append(fil)
+            f = self.select()
+            if image and f is not None:
+                img.write(f, None, [])
+        finally:
+            if image:
+                img.close()
+            if image or previous is not None:
+                self.keep_raw, self.empty_records = raw
+        #
+        delta = None
+        if previous is not None:
+            files = list(self.FS)
+            if f is not None:
+                files.insert(0, dict(f, **{'Absolut Path': []}))
+            delta = diff_images(previous, files)
+        if image:
+            return delta
         
         fd = open(filename, 'w')
         fd.write('\n### MF ###\n')
-        f = self.select()
         write_dict(f, fd)
         fd.write('\n')
         #
         for f in self.FS:
-            path = tuple(f['Absolut Path'])
-            if path in simfs_entries:
-                f['Name'] = MF_FS[path]
             write_dict(f, fd)
             fd.write('\n')
         
         fd.close()
+        return delta
     
     def get_ICCID(self):
         # select MF
@@ -31,7 +31,7 @@ with this program; if not, write to the Free Software Foundation, Inc.,
 
 from card.ICC import UICC, ISO7816
 from card.SIM import SIM
-from card.FS import USIM_app_FS
+from card.FS import catalogue
 from card.utils import *
 
 USIM_service_table = {
@@ -261,11 +261,11 @@ class USIM(UICC):
         """
         get_imsi() -> string(IMSI)
         
-        reads IMSI value at address [0x6F, 0x07]
+        reads IMSI value at address [0x6F, 0x07], by its SFI when possible
         returns IMSI string on success or None on error
         """
-        # select IMSI file
-        imsi = self.select([0x6F, 0x07])
+        # read IMSI file
+        imsi = self.read_by_SFI([0x6F, 0x07])
         if imsi is None: 
             return None
         # and parse the received data into the IMSI structure
@@ -364,9 +364,9 @@ class USIM(UICC):
                 if self.dbg:
                     log(3, '(update_GBA_BP) RAND found in GBA_BP')
                 # update transparent file with B_TID and key lifetime
-                self.coms.push( self.UPDATE_BINARY( P2=len(RAND)+1,
-                                Data=[len(B_TID)] + B_TID + \
-                                [len(key_lifetime)] + key_lifetime ))
+                self.update_binary( [len(B_TID)] + B_TID + \
+                                    [len(key_lifetime)] + key_lifetime,
+                                    offset=len(RAND)+1 )
                 if self.dbg >= 2: 
                     log(3, '(update_GBA_BP) %s' % self.coms())
                 if self.coms()[2] == 0x90 and self.dbg:
@@ -545,13 +545,14 @@ class USIM(UICC):
         """
         self.get_services() -> None
         
-        reads USIM Service Table at address [0x6F, 0x38]
+        reads USIM Service Table at address [0x6F, 0x38], by its SFI when 
+        possible
         prints services allowed / activated
         returns None
         """
-        # select SST file
-        sst = self.select([0x6F, 0x38])
-        if self.coms()[2] != (0x90, 0x00): 
+        # read SST file
+        sst = self.read_by_SFI([0x6F, 0x38])
+        if sst is None: 
             if self.dbg >= 2: 
                 log(3, '(get_services) %s' % self.coms())
             return None
@@ -580,31 +581,106 @@ class USIM(UICC):
                         services.append('%i : available' % cnt)
         return services
     
-    def explore_fs(self, filename='usim_fs.txt', depth=2):
+    def explore_fs(self, filename='usim_fs.txt', depth=2, layout=None, 
+                   known_only=False, image=False, previous=None):
         """
-        self.explore_fs(self, filename='usim_fs', depth=2) -> None
+        self.explore_fs(self, filename='usim_fs', depth=2, layout=None, 
+                        known_only=False, image=False, previous=None) 
+            -> None, or dict(delta) with previous
             filename: file to write in information found
             depth: depth in recursivity, True=infinite
+            layout: layout_cache instance, to only select the files known for
+                    this card model (see explore_DF())
+            known_only: only select the files listed in the FS tables (see 
+                        card.FS), instead of brute forcing all addresses
+            image: write a card image (see card.utils.image_writer) instead 
+                   of text, with the raw file parameters and all records
+            previous: previous dump of the same card, card image (file name 
+                      or image_reader) or list of files (e.g. from 
+                      card.store.card_store.files()), to only select again 
+                      its files and read the content of those which may have 
+                      changed (see redump()), instead of brute forcing 
+                      addresses; the delta with the previous dump is returned 
+                      (see card.utils.diff_images())
         
         brute force all file addresses from 1st USIM AID
         with a maximum recursion level (to avoid infinite looping...)
         write information on existing DF and file in the output file
         """
-        usimfs_entries = USIM_app_FS.keys()
-        self.explore_DF([], self.AID.index(self.AID_USIM) + 1, depth)
+        cat = catalogue('USIM')
+        if isinstance(previous, str):
+            previous = image_reader(previous)
+        if isinstance(previous, image_reader) \
+        and previous.header.get('ICCID') not in (None, self.get_ICCID()):
+            log(1, '(explore_fs) previous dump of another card, ICCID %s' \
+                   % previous.header['ICCID'])
+            return None
+        if image or previous is not None:
+            # records are kept with their number, to be compared
+            raw = (self.keep_raw, self.empty_records)
+            self.keep_raw, self.empty_records = True, True
+        if not hasattr(self, 'FS'):
+            self.init_FS()
+        num = self.AID.index(self.AID_USIM) + 1
+        if image:
+            # each file is written as soon as it is found
+            img = image_writer(filename, self.ATR, self.AID, 
+                               ICCID=self.get_ICCID(),
+                               AID_USIM=image_writer._hex(self.AID_USIM or []))
+        try:
+            if previous is not None:
+                found = self.redump([fil for fil in previous \
+                            if fil.get('AID', self.AID_USIM) == self.AID_USIM],
+                            num)
+            elif known_only:
+                found = self.select_paths(
+                            cat.known_paths(depth+1 if type(depth) == int \
+                                            else None), num)
+            elif layout is not None:
+                start = len(self.FS)
+                self.explore_DF([], num, depth, layout=layout)
+                found = self.FS[start:]
+                del self.FS[start:]
+            else:
+                found = self.iter_DF([], num, depth)
+            for fil in found:
+                name = cat.name(fil['Absolut Path'])
+                if name is not None:
+                    fil['Name'] = name
+                if image:
+                    img.write(fil, self.AID_USIM)
+                self.FS.append(fil)
+            f = self.select_by_aid(num)
+            if image and f is not None:
+                img.write(f, self.AID_USIM, [])
+        finally:
+            if image:
+                img.close()
+            if image or previous is not None:
+                self.keep_raw, self.empty_records = raw
+        #
+        delta = None
+        if previous is not None:
+            files = [dict(fil, AID=self.AID_USIM) for fil in self.FS]
+            if f is not None:
+                files.insert(0, dict(f, AID=self.AID_USIM, 
+                                     **{'Absolut Path': []}))
+            if not isinstance(previous, image_reader):
+                previous = [dict(fil, AID=fil.get('AID', self.AID_USIM)) \
+                            for fil in previous]
+            delta = diff_images(previous, files)
+        if image:
+            return delta
         
         fd = open(filename, 'w')
         fd.write('\n### AID %s ###\n' % self.AID_USIM)
-        f = self.select_by_aid( self.AID.index(self.AID_USIM) + 1 )
         write_dict(f, fd)
         fd.write('\n')
         #
         for f in self.FS:
-            path = tuple(f['Absolut Path'])
-            if path in usimfs_entries:
-                f['Name'] = USIM_app_FS[path]
             write_dict(f, fd)
             fd.write('\n')
         
         fd.close()
+        return delta
 
@@ -0,0 +1,582 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# Python library to emulate
+# UICC and SIM cards
+# from a card image
+# (see card.utils.image_writer)
+# in-process, without pyscard
+#################################
+
+from card.utils import *
+
+
+class vfile(object):
+    """
+    file of a virtual card: file dictionnary, raw selection response,
+    content, and position in the file tree
+    """
+
+    def __init__(self, fil, parent=None, AID=None):
+        self.fil = fil
+        self.fid = tuple(fil.get('File Identifier', ()))
+        self.parent = parent
+        self.AID = AID
+        self.children = {}
+        self.is_DF = fil.get('Type') in ('MF', 'DF')
+        if 'Raw' in fil:
+            self.raw = list(fil['Raw'])
+        else:
+            self.raw = self.make_FCP(fil)
+        if self.is_DF or 'Data' not in fil:
+            # content not available: not readable
+            self.data = None
+        elif fil.get('Structure') == 'transparent':
+            self.data = list(fil['Data'])
+        else:
+            self.data = [list(rec) for rec in fil['Data']]
+            # records filtered out when read, without card.ICC.empty_records
+            reclen = fil.get('Record Length', 0)
+            if reclen and fil.get('Size'):
+                for i in range(len(self.data), fil['Size'] // reclen):
+                    self.data.append( reclen * [0xFF] )
+        self.SFI = None
+        if not self.is_DF:
+            if fil.get('Short File Identifier'):
+                self.SFI = fil['Short File Identifier'][0] >> 3
+            elif 'Short File Identifier' not in fil and len(self.fid) == 2:
+                self.SFI = self.fid[1] & 0x1F
+
+    @staticmethod
+    def make_FCP(fil):
+        """
+        returns a minimal FCP template for the file dictionnary `fil`, when
+        its raw selection response is not available
+        """
+        fcp = []
+        if 'File Descriptor' in fil:
+            fcp += [0x82, len(fil['File Descriptor'])] + fil['File Descriptor']
+        elif fil.get('Type') in ('MF', 'DF'):
+            fcp += [0x82, 0x02, 0x78, 0x21]
+        if 'File Identifier' in fil:
+            fcp += [0x83, 0x02] + fil['File Identifier']
+        if 'DF Name' in fil:
+            fcp += [0x84, len(fil['DF Name'])] + fil['DF Name']
+        if 'Short File Identifier' in fil:
+            fcp += [0x88, len(fil['Short File Identifier'])] \
+                 + fil['Short File Identifier']
+        fcp += [0x8A, 0x01, 0x05]
+        if 'Size' in fil:
+            fcp += [0x80, 0x02, fil['Size'] >> 8, fil['Size'] & 0xFF]
+        return [0x62, len(fcp)] + fcp
+
+    def add(self, child):
+        child.parent = self
+        self.children[child.fid] = child
+        return child
+
+    def __repr__(self):
+        return 'vfile(%s)' % ''.join(['%.2X' % b for b in self.fid])
+
+
+class virtual_card(object):
+    """
+    virtual UICC or SIM card, answering APDU from the files of a card image
+    (image_reader instance or file name, or list of file dictionnaries such
+    as self.FS, with "Absolut Path" and "AID" for files under an AID)
+
+    to be given as the `reader` of ISO7816 and its subclasses, or set as
+    ISO7816.default_reader for code creating its own instances; e.g.:
+        vc = virtual_card('usim.img')
+        u = USIM(reader=vc)
+
+    handles the commands SELECT (by file id, parent, AID, path from MF or
+    from current DF), GET RESPONSE, READ / UPDATE BINARY, READ / UPDATE /
+    SEARCH RECORD, STATUS, VERIFY and MANAGE CHANNEL, returning the raw
+    selection responses of the original card (or a minimal FCP), with
+    SW 9Fxx for the SIM class (0xA0) and 61xx otherwise
+    access conditions are not enforced, except for the content that was
+    not read when the image was made, which is answered with 6982
+    updates are kept in memory, during the whole life of the instance
+
+    EF_DIR and EF_ICCID are created from the AID and ICCID of the image
+    header, when they are not part of the image
+    """
+
+    dbg = 0
+
+    # number of tries for each PIN before being blocked
+    PIN_tries = 3
+
+    def __init__(self, image=[], ATR=None, PIN=None):
+        """
+        loads the card image `image`, with the ATR (by default, the one of
+        the image), and the PIN values: dict {reference (P2 of VERIFY):
+        list of bytes}; PIN not given are verified with any value
+        """
+        if isinstance(image, str):
+            image = image_reader(image)
+        if isinstance(image, image_reader):
+            header, AID = image.header, image.AID
+            if ATR is None:
+                ATR = image.ATR
+        else:
+            header, AID = {}, []
+        self.ATR = ATR or [0x3B, 0x00]
+        self.PIN = PIN or {}
+        self.tries = {}
+        self.verified = set()
+        self.apdus = 0
+        self.connection = self
+        #
+        self.MF = vfile({'Type': 'MF', 'File Identifier': [0x3F, 0x00]})
+        self.ADF = {}
+        files = sorted(image, key=lambda f: len(f['Absolut Path']))
+        for fil in files:
+            self._load(fil)
+        for aid in AID:
+            self._ADF(tuple(aid))
+        if (0x2F, 0x00) not in self.MF.children and self.ADF:
+            self._make_DIR(sorted(self.ADF.keys()))
+        if (0x2F, 0xE2) not in self.MF.children and header.get('ICCID'):
+            self._make_ICCID(header['ICCID'])
+        self.connect()
+
+    def _ADF(self, aid):
+        # returns the ADF of the AID, creating it when needed
+        if aid not in self.ADF:
+            fid = [0x7F, 0xF0 + len(self.ADF) % 0x10]
+            self.ADF[aid] = self.MF.add(vfile({'Type': 'DF',
+                                'File Identifier': fid, 'DF Name': list(aid)},
+                                AID=aid))
+        return self.ADF[aid]
+
+    def _load(self, fil):
+        # adds the file dictionnary `fil` to the file tree
+        path = list(fil['Absolut Path'])
+        aid = tuple(fil['AID']) if fil.get('AID') else None
+        if aid is not None and not path:
+            old = self.ADF.get(aid)
+            adf = vfile(fil, AID=aid)
+            if not adf.fid:
+                adf.fid = (0x7F, 0xF0 + len(self.ADF) % 0x10)
+            if old is not None:
+                for child in old.children.values():
+                    adf.add(child)
+            self.ADF[aid] = self.MF.add(adf)
+            return
+        if path[:2] == [0x3F, 0x00]:
+            path = path[2:]
+        if not path:
+            root = vfile(fil)
+            root.fid, root.is_DF, root.children = (0x3F, 0x00), True, \
+                                                  self.MF.children
+            self.MF = root
+            for child in root.children.values():
+                child.parent = root
+            return
+        node = self._ADF(aid) if aid is not None else self.MF
+        for i in range(0, len(path)-2, 2):
+            fid = tuple(path[i:i+2])
+            if fid not in node.children:
+                node.add(vfile({'Type': 'DF', 'File Identifier': list(fid)}))
+            node = node.children[fid]
+        new = vfile(fil, AID=aid)
+        if not new.fid:
+            new.fid = tuple(path[-2:])
+        old = node.children.get(new.fid)
+        if old is not None:
+            for child in old.children.values():
+                new.add(child)
+        node.add(new)
+
+    def _make_DIR(self, AIDs):
+        # EF_DIR, with an application template record per AID
+        recs = [[0x61, len(aid)+2, 0x4F, len(aid)] + list(aid) for aid in AIDs]
+        reclen = max([len(r) for r in recs])
+        data = [r + (reclen-len(r)) * [0xFF] for r in recs]
+        self.MF.add(vfile({'Type': 'EF working', 'Structure': 'linear fixed',
+                           'File Identifier': [0x2F, 0x00],
+                           'File Descriptor': [0x42, 0x21, 0, reclen,
+                                               len(data)],
+                           'Short File Identifier': [0x1E << 3],
+                           'Record Length': reclen, 'Size': reclen*len(data),
+                           'Data': data}))
+
+    def _make_ICCID(self, ICCID):
+        # EF_ICCID, with the ICCID digits in swapped BCD
+        digits = [int(d) for d in ICCID if d.isdigit()] + 20 * [0xF]
+        data = [(digits[i+1] << 4) | digits[i] for i in range(0, 20, 2)]
+        self.MF.add(vfile({'Type': 'EF working', 'Structure': 'transparent',
+                           'File Identifier': [0x2F, 0xE2],
+                           'File Descriptor': [0x41, 0x21],
+                           'Short File Identifier': [0x02 << 3],
+                           'Size': 10, 'Data': data}))
+
+    ###
+    # pyscard CardService and CardConnection like interface
+    ###
+    def connect(self):
+        """
+        resets the card: closes the logical channels, selects the MF
+        and clears the PIN verified
+        """
+        self.channels = {0: self._state()}
+        self.verified = set()
+
+    def disconnect(self):
+        pass
+
+    def getReader(self):
+        return 'virtual card'
+
+    def getATR(self):
+        return self.ATR
+
+    def _state(self):
+        # selection state of a logical channel
+        return {'DF': self.MF, 'EF': None, 'app': None, 'resp': [],
+                'rec': 0}
+
+    def transmit(self, apdu):
+        """
+        transmit(apdu=[0x.., ...]) -> (list of bytes, sw1, sw2)
+
+        processes the command APDU and returns the response
+        """
+        self.apdus += 1
+        if len(apdu) < 4:
+            return [], 0x67, 0x00
+        CLA, INS, P1, P2 = apdu[:4]
+        Lc = apdu[4] if len(apdu) > 4 else 0
+        data = list(apdu[5:5+Lc]) if len(apdu) > 5 else []
+        Le = Lc if len(apdu) == 5 else 0
+        if CLA & 0x40:
+            channel = (CLA & 0x0F) + 4
+        elif CLA == 0xA0:
+            channel = 0
+        else:
+            channel = CLA & 0x03
+        if channel not in self.channels:
+            return [], 0x68, 0x81
+        st = self.channels[channel]
+        cmd = self.commands.get(INS)
+        if cmd is None:
+            return [], 0x6D, 0x00
+        ret = getattr(self, cmd)(st, CLA, P1, P2, data, Le)
+        if self.dbg:
+            log(3, '(virtual_card) %s -> %s' % (apdu, ret))
+        return ret
+
+    commands = {
+        0xA4 : '_select',
+        0xC0 : '_get_response',
+        0xB0 : '_read_binary',
+        0xD6 : '_update_binary',
+        0xB2 : '_read_record',
+        0xDC : '_update_record',
+        0xA2 : '_search_record',
+        0xF2 : '_status',
+        0x20 : '_verify',
+        0x70 : '_manage_channel',
+        }
+
+    def _respond(self, st, CLA, resp):
+        # keeps the response for GET RESPONSE
+        st['resp'] = resp
+        if not resp:
+            return [], 0x90, 0x00
+        return [], 0x9F if CLA == 0xA0 else 0x61, len(resp) & 0xFF
+
+    ###
+    # file selection
+    ###
+    def _by_fid(self, st, fid):
+        # file reachable by file id from the current DF
+        df = st['DF']
+        if fid == (0x3F, 0x00):
+            return self.MF
+        elif fid == (0x7F, 0xFF):
+            return st['app']
+        elif fid in df.children:
+            return df.children[fid]
+        elif fid == df.fid:
+            return df
+        elif df.parent is not None:
+            if fid == df.parent.fid:
+                return df.parent
+            sib = df.parent.children.get(fid)
+            if sib is not None and sib.is_DF:
+                return sib
+        return None
+
+    def _select(self, st, CLA, P1, P2, data, Le):
+        node = None
+        if P1 in (0x00, 0x01, 0x02) and len(data) == 2:
+            node = self._by_fid(st, tuple(data))
+            if node is not None and P1 == 0x01 and not node.is_DF \
+            or node is not None and P1 == 0x02 and node.is_DF:
+                node = None
+        elif P1 == 0x00 and not data:
+            node = self.MF
+        elif P1 == 0x03:
+            node = st['DF'].parent
+        elif P1 == 0x04:
+            for (aid, adf) in sorted(self.ADF.items()):
+                if len(data) >= 5 and list(aid[:len(data)]) == data:
+                    node = adf
+                    st['app'] = adf
+                    break
+        elif P1 in (0x08, 0x09) and data and len(data) % 2 == 0:
+            if P1 == 0x08:
+                node = self.MF
+                if data[:2] == [0x3F, 0x00]:
+                    data = data[2:]
+            else:
+                node = st['DF']
+                if data[:2] == [0x7F, 0xFF]:
+                    node, data = st['app'], data[2:]
+            for i in range(0, len(data), 2):
+                if node is None:
+                    break
+                node = node.children.get(tuple(data[i:i+2]))
+        if node is None:
+            return [], 0x6A, 0x82
+        if node.is_DF:
+            st['DF'], st['EF'] = node, None
+        else:
+            st['DF'], st['EF'] = node.parent, node
+        st['rec'] = 0
+        if P2 & 0x0C == 0x0C:
+            return self._respond(st, CLA, [])
+        return self._respond(st, CLA, node.raw)
+
+    def _get_response(self, st, CLA, P1, P2, data, Le):
+        resp = st['resp']
+        if not resp:
+            return [], 0x6F, 0x00
+        if Le and Le < len(resp):
+            return [], 0x6C, len(resp)
+        st['resp'] = []
+        return resp, 0x90, 0x00
+
+    def _status(self, st, CLA, P1, P2, data, Le):
+        if P2 & 0x0C == 0x0C:
+            return [], 0x90, 0x00
+        resp = st['DF'].raw
+        if Le and Le != len(resp):
+            return [], 0x6C, len(resp) & 0xFF
+        return resp, 0x90, 0x00
+
+    ###
+    # EF content
+    ###
+    def _EF(self, st, SFI=None):
+        # returns the EF referenced by SFI, or the current EF, or a SW
+        if SFI:
+            for node in st['DF'].children.values():
+                if node.SFI == SFI:
+                    st['EF'], st['rec'] = node, 0
+                    return node
+            return (0x6A, 0x82)
+        if st['EF'] is None:
+            return (0x69, 0x86)
+        return st['EF']
+
+    def _transparent(self, st, P1, P2):
+        # returns (EF, offset) for READ / UPDATE BINARY, or a SW
+        if P1 & 0x80:
+            ef, off = self._EF(st, P1 & 0x1F), P2
+        else:
+            ef, off = self._EF(st), (P1 << 8) | P2
+        if isinstance(ef, tuple):
+            return ef
+        elif ef.fil.get('Structure') != 'transparent':
+            return (0x69, 0x81)
+        elif ef.data is None:
+            return (0x69, 0x82)
+        return ef, off
+
+    def _read_binary(self, st, CLA, P1, P2, data, Le):
+        ret = self._transparent(st, P1, P2)
+        if isinstance(ret[0], int):
+            return [], ret[0], ret[1]
+        ef, off = ret
+        Le = Le or 0x100
+        if off >= len(ef.data):
+            return [], 0x6B, 0x00
+        if off + Le > len(ef.data):
+            return [], 0x6C, len(ef.data) - off
+        return ef.data[off:off+Le], 0x90, 0x00
+
+    def _update_binary(self, st, CLA, P1, P2, data, Le):
+        ret = self._transparent(st, P1, P2)
+        if isinstance(ret[0], int):
+            return [], ret[0], ret[1]
+        ef, off = ret
+        if off + len(data) > len(ef.data):
+            return [], 0x6B, 0x00
+        ef.data[off:off+len(data)] = data
+        return [], 0x90, 0x00
+
+    def _records(self, st, P2):
+        # returns the record EF for READ / UPDATE / SEARCH RECORD, or a SW
+        ef = self._EF(st, P2 >> 3)
+        if isinstance(ef, tuple):
+            return ef
+        elif ef.fil.get('Structure') in (None, 'transparent') or ef.is_DF:
+            return (0x69, 0x81)
+        elif ef.data is None:
+            return (0x69, 0x82)
+        return ef
+
+    def _rec_num(self, st, ef, P1, mode):
+        # returns the record number for the mode, or None
+        if mode == 0x04:
+            num = P1 or st['rec']
+        elif mode == 0x02:
+            num = st['rec'] + 1
+        elif mode == 0x03:
+            num = st['rec'] - 1 if st['rec'] else len(ef.data)
+        else:
+            return None
+        if not 1 <= num <= len(ef.data):
+            return None
+        return num
+
+    def _read_record(self, st, CLA, P1, P2, data, Le):
+        ef = self._records(st, P2)
+        if isinstance(ef, tuple):
+            return [], ef[0], ef[1]
+        mode = P2 & 0x07
+        if mode == 0x05:
+            # all records from P1, as many as fit in Le
+            if not 1 <= P1 <= len(ef.data):
+                return [], 0x6A, 0x83
+            Le, resp = Le or 0x100, []
+            for rec in ef.data[P1-1:]:
+                if len(resp) + len(rec) > Le:
+                    break
+                resp += rec
+            if not resp:
+                return [], 0x6C, len(ef.data[P1-1]) & 0xFF
+            return resp, 0x90, 0x00
+        num = self._rec_num(st, ef, P1, mode)
+        if num is None:
+            return [], 0x6A, 0x83
+        rec = ef.data[num-1]
+        if Le and Le != len(rec):
+            return [], 0x6C, len(rec) & 0xFF
+        st['rec'] = num
+        return rec[:], 0x90, 0x00
+
+    def _update_record(self, st, CLA, P1, P2, data, Le):
+        ef = self._records(st, P2)
+        if isinstance(ef, tuple):
+            return [], ef[0], ef[1]
+        reclen = len(ef.data[0]) if ef.data else 0
+        if len(data) != reclen:
+            return [], 0x67, 0x00
+        mode = P2 & 0x07
+        if mode == 0x03 and ef.fil.get('Structure') == 'cyclic':
+            # the oldest record becomes the 1st one
+            ef.data.insert(0, ef.data.pop())
+            num = 1
+        else:
+            num = self._rec_num(st, ef, P1, mode)
+            if num is None:
+                return [], 0x6A, 0x83
+        ef.data[num-1] = data
+        st['rec'] = num
+        return [], 0x90, 0x00
+
+    def _search_record(self, st, CLA, P1, P2, data, Le):
+        ef = self._records(st, P2)
+        if isinstance(ef, tuple):
+            return [], ef[0], ef[1]
+        mode = P2 & 0x07
+        if mode == 0x04:
+            pattern, off = data, None
+        elif mode == 0x06 and len(data) >= 2 and data[0] == 0x04:
+            pattern, off = data[2:], data[1]
+        else:
+            return [], 0x6A, 0x86
+        nums = []
+        for num in range(max(P1, 1), len(ef.data)+1):
+            rec = ef.data[num-1]
+            if off is not None:
+                if rec[off:off+len(pattern)] == pattern:
+                    nums.append(num)
+            else:
+                for i in range(0, len(rec)-len(pattern)+1):
+                    if rec[i:i+len(pattern)] == pattern:
+                        nums.append(num)
+                        break
+        if not nums:
+            return [], 0x62, 0x82
+        return self._respond(st, CLA, nums)
+
+    ###
+    # security and channels
+    ###
+    def _verify(self, st, CLA, P1, P2, data, Le):
+        tries = self.tries.get(P2, self.PIN_tries)
+        if not tries:
+            return [], 0x69, 0x83
+        if not data:
+            if P2 in self.verified:
+                return [], 0x90, 0x00
+            return [], 0x63, 0xC0 | tries
+        if P2 not in self.PIN or list(self.PIN[P2]) == data:
+            self.tries[P2] = self.PIN_tries
+            self.verified.add(P2)
+            return [], 0x90, 0x00
+        self.tries[P2] = tries - 1
+        self.verified.discard(P2)
+        return [], 0x63, 0xC0 | (tries - 1)
+
+    def _manage_channel(self, st, CLA, P1, P2, data, Le):
+        if P1 == 0x00:
+            channel = P2
+            if not channel:
+                channel = 1
+                while channel in self.channels:
+                    channel += 1
+            if channel > 19 or channel in self.channels:
+                return [], 0x68, 0x81
+            self.channels[channel] = self._state()
+            return ([channel] if not P2 else []), 0x90, 0x00
+        elif P1 == 0x80 and P2 in self.channels and P2:
+            del self.channels[P2]
+            return [], 0x90, 0x00
+        return [], 0x6A, 0x86
+
+    def __repr__(self):
+        return 'virtual_card(files=%i, AID=%i, apdus=%i)' \
+               % (self._count(self.MF), len(self.ADF), self.apdus)
+
+    def _count(self, node, seen=None):
+        seen = set() if seen is None else seen
+        if id(node) in seen:
+            return 0
+        seen.add(id(node))
+        return 1 + sum([self._count(c, seen) for c in node.children.values()])
@@ -175,14 +175,14 @@ class personalize(object):
         # go to ICCID and update it
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x2F, 0xE2])
-        ret = sim.UPDATE_BINARY(0, 0, encode_ICCID(self.ICCID))
+        ret = sim.update_binary(encode_ICCID(self.ICCID))
         print('Writing ICCID: %s' % ret)
         #
         # go to IMSI and update it
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x7F, 0x20])
         sim.SELECT_FILE(0, 0, [0x6F, 0x07])
-        ret = sim.UPDATE_BINARY(0, 0, encode_IMSI(self.IMSI))
+        ret = sim.update_binary(encode_IMSI(self.IMSI))
         print('Writing IMSI: %s' % ret)
         #
         # go to SMSP address and update the 1st record for SMSP
@@ -198,28 +198,28 @@ class personalize(object):
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x7F, 0x20])
         sim.SELECT_FILE(0, 0, [0x6F, 0x31])
-        ret = sim.UPDATE_BINARY(0, 0, T_HPLMN)
+        ret = sim.update_binary(T_HPLMN)
         print('Writing HPLMN selection search period: %s' % ret)
         #
         # go to PLMNsel address and update binary string for HPLMN
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x7F, 0x20])
         sim.SELECT_FILE(0, 0, [0x6F, 0x30])
-        ret = sim.UPDATE_BINARY(0, 0, PLMNsel)
+        ret = sim.update_binary(PLMNsel)
         print('Writing PLMN selector: %s' % ret)
         #
         # go to SST address and update the service table
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x7F, 0x20])
         sim.SELECT_FILE(0, 0, [0x6F, 0x38])
-        ret = sim.UPDATE_BINARY(0, 0, SST)
+        ret = sim.update_binary(SST)
         print('Writing SIM Services Table: %s' % ret)
         #
         # go to SPN address and update Service Provider Name
         sim.SELECT_FILE(0, 0, [0x3F, 0x00])
         sim.SELECT_FILE(0, 0, [0x7F, 0x20])
         sim.SELECT_FILE(0, 0, [0x6F, 0x46])
-        ret = sim.UPDATE_BINARY(0, 0, SPN)
+        ret = sim.update_binary(SPN)
         print('Writing Service Provider Name: %s' % ret)
         #
         sim.disconnect()
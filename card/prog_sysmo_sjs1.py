@@ -171,49 +171,49 @@ def program_files(uicc, ADM, ICCID, IMSI, Ki, OPc):
     # 2) ICCID
     uicc.SELECT_FILE(0, 4, [0x3F, 0x00])
     uicc.SELECT_FILE(0, 4, [0x2F, 0xE2])
-    ret = uicc.UPDATE_BINARY(0, 0, encode_iccid(ICCID))
+    ret = uicc.update_binary(encode_iccid(ICCID))
     print('Writing ICCID: %s' % ret)
     
     # 3) IMSI
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x6F, 0x07])
-    ret = uicc.UPDATE_BINARY(0, 0, encode_imsi(IMSI))
+    ret = uicc.update_binary(encode_imsi(IMSI))
     print('Writing IMSI: %s' % ret)
     
     # 4) Ki
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x00, 0xFF])
-    ret = uicc.UPDATE_BINARY(0, 0, stringToByte(Ki))
+    ret = uicc.update_binary(stringToByte(Ki))
     print('Writing Ki: %s' % ret)
     
     # 5) OPc
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x00, 0xF7])
-    ret = uicc.UPDATE_BINARY(0, 0, [0x01] + stringToByte(OPc))
+    ret = uicc.update_binary([0x01] + stringToByte(OPc))
     print('Writing OPc: %s' % ret)
     
     # 6) T_HPLMN
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x6F, 0x31])
-    ret = uicc.UPDATE_BINARY(0, 0, T_HPLMN)
+    ret = uicc.update_binary(T_HPLMN)
     print('Writing HPLMN selection search period: %s' % ret)
     
     # 7) PLMNsel
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x6F, 0x30])
-    ret = uicc.UPDATE_BINARY(0, 0, PLMNsel)
+    ret = uicc.update_binary(PLMNsel)
     print('Writing PLMN selector: %s' % ret)
     
     # 8) SPN
     select_dfgsm(uicc)
     uicc.SELECT_FILE(0, 4, [0x6F, 0x46])
-    ret = uicc.UPDATE_BINARY(0, 0, SPN)
+    ret = uicc.update_binary(SPN)
     print('Writing Service Provider Name: %s' % ret)
     
     # 9) SST
     #select_dfgsm(uicc)
     #uicc.SELECT_FILE(0, 4, [0x6F, 0x38])
-    #ret = uicc.UPDATE_BINARY(0, 0, SST)
+    #ret = uicc.update_binary(SST)
     #print('Writing SIM Services Table: %s' % ret)
     
     # 10) SMSP
@@ -194,28 +194,28 @@ def program_files(uicc):
     uicc.SELECT_FILE(0, 4, [0x3F, 0x00])
     uicc.SELECT_FILE(0, 4, [0x7F, 0x20])
     uicc.SELECT_FILE(0, 4, [0x6F, 0x31])
-    ret = uicc.UPDATE_BINARY(0, 0, T_HPLMN)
+    ret = uicc.update_binary(T_HPLMN)
     print('Writing HPLMN selection search period: %s' % ret)
     #
     # go to PLMNsel address and update binary string for HPLMN
     uicc.SELECT_FILE(0, 4, [0x3F, 0x00])
     uicc.SELECT_FILE(0, 4, [0x7F, 0x20])
     uicc.SELECT_FILE(0, 4, [0x6F, 0x30])
-    ret = uicc.UPDATE_BINARY(0, 0, PLMNsel)
+    ret = uicc.update_binary(PLMNsel)
     print('Writing PLMN selector: %s' % ret)
     #
     # go to SST address and update the service table
     uicc.SELECT_FILE(0, 4, [0x3F, 0x00])
     uicc.SELECT_FILE(0, 4, [0x7F, 0x20])
     uicc.SELECT_FILE(0, 4, [0x6F, 0x38])
-    ret = uicc.UPDATE_BINARY(0, 0, SST)
+    ret = uicc.update_binary(SST)
     print('Writing SIM Services Table: %s' % ret)
     #
     # go to SPN address and update Service Provider Name
     uicc.SELECT_FILE(0, 4, [0x3F, 0x00])
     uicc.SELECT_FILE(0, 4, [0x7F, 0x20])
     uicc.SELECT_FILE(0, 4, [0x6F, 0x46])
-    ret = uicc.UPDATE_BINARY(0, 0, SPN)
+    ret = uicc.update_binary(SPN)
     print('Writing Service Provider Name: %s' % ret)
 
 
@@ -0,0 +1,341 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# Python library to compute
+# statistics over the filesystem
+# dumps of many cards, with
+# numpy columnar arrays
+#################################
+
+import json
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from card.utils import *
+
+
+class fleet_stats(object):
+    """
+    statistics over the filesystem dumps of many cards, kept in columns:
+    one row per file of each card, with its card id, path id, size, record
+    length, number of records, and the codes of its type, structure, life
+    cycle status and access conditions
+
+    cards ids index self.cards (ICCID, or name of the dump), paths ids index
+    self.paths ("AID/path" keys, as in card images, see image_writer), and
+    codes index self.values[column]; services of EF_UST (1 bit per service)
+    and EF_SST (allocated and activated bits) are kept as bit matrices, one
+    row per card
+
+    dumps are added with add(): card images (file name or image_reader),
+    lists of files (e.g. self.FS), or a card.store.card_store; the numpy
+    arrays are built on the first query after an addition, e.g.:
+        st = fleet_stats(['card1.img', 'card2.img'])
+        st.presence_ratio()
+        st.size_distribution([0x6F, 0x3A], [0x7F, 0x10])
+        st.with_service(125)
+
+    requires numpy
+    """
+
+    dbg = 0
+
+    # integer columns
+    columns = ('card', 'path', 'size', 'record_length', 'records',
+               'type', 'structure', 'life_cycle', 'access')
+    # columns of strings, interned to integer codes
+    codes = ('type', 'structure', 'life_cycle', 'access')
+
+    # "AID/path" prefix and suffix of the service tables: EF_UST in a USIM
+    # ADF, EF_SST in DF_GSM
+    services_path = {'UST': ('A0000000871002', '/6F38'),
+                     'SST': ('MF/', 'MF/7F206F38')}
+
+    def __init__(self, dumps=[]):
+        """
+        initializes the statistics with the list of dumps given, see add()
+        """
+        if np is None:
+            log(1, '(fleet_stats) numpy library not found')
+            raise ImportError('numpy library not found')
+        self.cards = []
+        self.paths = []
+        self.values = dict([(c, []) for c in self.codes])
+        self._ids = {'card': {}, 'path': {}}
+        for c in self.codes:
+            self._ids[c] = {}
+        self._rows = dict([(c, []) for c in self.columns])
+        # {table: [array of card id, array of service number,
+        #          array of activated]}
+        self._serv = {'UST': [[], [], []], 'SST': [[], [], []]}
+        self._arrays = None
+        for dump in dumps:
+            self.add(dump)
+
+    def _intern(self, column, value):
+        # returns the integer id of the value in the column
+        ids = self._ids[column]
+        if value not in ids:
+            ids[value] = len(ids)
+            if column == 'card':
+                self.cards.append(value)
+            elif column == 'path':
+                self.paths.append(value)
+            else:
+                self.values[column].append(value)
+        return ids[value]
+
+    @staticmethod
+    def _access(fcp):
+        # access conditions of the file parameters, as a str
+        return ' '.join(['%s=%s' % (k, json.dumps(fcp[k])) for k in \
+                         access_keys if k in fcp and k != 'PIN Status'])
+
+    def _add_record(self, card, rec):
+        # adds the file from its card image line `rec`
+        fcp, rows = rec['fcp'], self._rows
+        size, reclen = fcp.get('Size', -1), fcp.get('Record Length', -1)
+        if size > 0 and reclen > 0:
+            records = size // reclen
+        elif len(fcp.get('File Descriptor', [])) == 5:
+            records = fcp['File Descriptor'][4]
+        else:
+            records = -1
+        key = '%s/%s' % (rec['AID'] or 'MF', rec['path'])
+        rows['card'].append(card)
+        rows['path'].append(self._intern('path', key))
+        rows['size'].append(size)
+        rows['record_length'].append(reclen)
+        rows['records'].append(records)
+        rows['type'].append(self._intern('type', fcp.get('Type')))
+        rows['structure'].append(self._intern('structure',
+                                              fcp.get('Structure')))
+        rows['life_cycle'].append(self._intern('life_cycle',
+                                               fcp.get('Life Cycle Status')))
+        rows['access'].append(self._intern('access', self._access(fcp)))
+        # service tables
+        data = rec.get('data')
+        for (tab, (prefix, suffix)) in self.services_path.items():
+            if key.startswith(prefix) and key.endswith(suffix) \
+            and data is not None and not isinstance(data, list):
+                self._add_services(card, tab, data)
+        self._arrays = None
+
+    def _add_services(self, card, table, data):
+        # adds the services of the content (hex str) of EF_UST or EF_SST
+        bits = np.unpackbits(np.array(image_reader._unhex(data),
+                                      dtype=np.uint8), bitorder='little')
+        if table == 'SST':
+            nums = np.nonzero(bits[0::2])[0]
+            act = bits[1::2][nums].astype(bool)
+        else:
+            nums = np.nonzero(bits)[0]
+            act = np.ones(len(nums), dtype=bool)
+        serv = self._serv[table]
+        serv[0].append( np.full(len(nums), card, dtype=np.int32) )
+        serv[1].append( nums.astype(np.int32) + 1 )
+        serv[2].append( act )
+
+    def add(self, dump, name=None):
+        """
+        adds the files of a dump:
+            a card image (file name or image_reader instance), named by the
+                ICCID of its header (or its file name),
+            a list of file dictionnaries (e.g. self.FS), with their "Absolut
+                Path", and "AID" for files under an AID,
+            a card.store.card_store instance, with all its cards named by
+                their ICCID
+        `name` overrides the name of the card
+        """
+        if isinstance(dump, str):
+            dump = image_reader(dump)
+        if isinstance(dump, image_reader):
+            card = self._intern('card',
+                                name or dump.header.get('ICCID', dump.filename))
+            for rec in dump.records():
+                self._add_record(card, rec)
+        elif hasattr(dump, 'db') and hasattr(dump, 'queries'):
+            self._add_store(dump)
+        else:
+            card = self._intern('card', name or 'card %i' % len(self.cards))
+            for fil in dump:
+                self._add_record(card, image_writer._record(fil,
+                                                            fil.get('AID')))
+
+    def _add_store(self, store):
+        # adds all the cards of a card_store
+        ids = {}
+        for (card_id, ICCID) in store.db.execute('SELECT id, ICCID FROM cards'):
+            ids[card_id] = self._intern('card', ICCID)
+        for (card_id, AID, path, fcp) in store.db.execute(
+        'SELECT card, AID, path, fcp FROM files ORDER BY card, rowid'):
+            self._add_record(ids[card_id], {'AID': AID or None, 'path': path,
+                                            'fcp': json.loads(fcp)})
+        for (card_id, tab, num, act) in store.db.execute(
+        'SELECT card, tab, num, activated FROM services'):
+            if tab in self._serv:
+                serv = self._serv[tab]
+                serv[0].append( np.array([ids[card_id]], dtype=np.int32) )
+                serv[1].append( np.array([num], dtype=np.int32) )
+                serv[2].append( np.array([act], dtype=bool) )
+        self._arrays = None
+
+    def _freeze(self):
+        # builds the numpy arrays from the rows added
+        if self._arrays is not None:
+            return self._arrays
+        self._arrays = dict([(c, np.array(self._rows[c], dtype=np.int32)) \
+                             for c in self.columns])
+        for (tab, serv) in self._serv.items():
+            if serv[0]:
+                cards, nums, act = [np.concatenate(s) for s in serv]
+            else:
+                cards, nums, act = [np.zeros(0, dtype=np.int32)] * 3
+            width = int(nums.max()) if len(nums) else 0
+            mat = np.zeros((len(self.cards), width), dtype=bool)
+            mat[cards, nums-1] = True
+            self._arrays[tab] = mat
+            mat = np.zeros((len(self.cards), width), dtype=bool)
+            mat[cards[act.astype(bool)], nums[act.astype(bool)]-1] = True
+            self._arrays[tab + ' activated'] = mat
+        return self._arrays
+
+    def column(self, name):
+        """
+        returns the numpy array of the column `name` (see columns), one
+        value per file of each card; -1 for sizes not available
+        """
+        return self._freeze()[name]
+
+    def _path_id(self, path, AID=None):
+        # returns the id of the path (list of bytes) under the AID, or -1
+        return self._ids['path'].get(image_writer._key(AID, path), -1)
+
+    def _mask(self, path=None, AID=None):
+        # returns the boolean mask of the rows of the file, or of all rows
+        arr = self._freeze()
+        if path is None:
+            return np.ones(len(arr['card']), dtype=bool)
+        return arr['path'] == self._path_id(path, AID)
+
+    def presence(self):
+        """
+        returns the boolean matrix [card id, path id] of the files present
+        on each card
+        """
+        arr = self._freeze()
+        mat = np.zeros((len(self.cards), len(self.paths)), dtype=bool)
+        mat[arr['card'], arr['path']] = True
+        return mat
+
+    def presence_ratio(self):
+        """
+        returns {"AID/path": ratio of the cards with the file}
+        """
+        if not self.cards:
+            return {}
+        ratio = self.presence().mean(axis=0)
+        return dict(zip(self.paths, ratio.tolist()))
+
+    def cards_with(self, path, AID=None, present=True):
+        """
+        returns the list of the cards with (or without, if not present) the
+        file at the absolute path (list of bytes), under the AID (list of
+        bytes, None for the MF)
+        """
+        has = np.zeros(len(self.cards), dtype=bool)
+        has[self.column('card')[self._mask(path, AID)]] = True
+        if not present:
+            has = ~has
+        return [self.cards[i] for i in np.nonzero(has)[0]]
+
+    def sizes(self, path, AID=None, column='size'):
+        """
+        returns the numpy array of the sizes (or of another integer column)
+        of the file at the absolute path, under the AID, on the cards where
+        it is present
+        """
+        return self.column(column)[self._mask(path, AID)]
+
+    def size_distribution(self, path, AID=None, bins=10, column='size'):
+        """
+        returns the histogram (counts, bins edges) of the sizes (or of
+        another integer column, e.g. "records") of the file at the absolute
+        path, under the AID, ignoring the sizes not available
+        """
+        sizes = self.sizes(path, AID, column)
+        return np.histogram(sizes[sizes >= 0], bins=bins)
+
+    def breakdown(self, column='access', path=None, AID=None):
+        """
+        returns {value: number of files} for a column of codes (see codes),
+        for the file at the absolute path under the AID, or for all files
+        """
+        codes = self.column(column)[self._mask(path, AID)]
+        vals, cnts = np.unique(codes, return_counts=True)
+        return dict([(self.values[column][v], int(c)) for (v, c) in \
+                     zip(vals.tolist(), cnts.tolist())])
+
+    def access_breakdown(self, path=None, AID=None):
+        """
+        returns {access conditions: number of files}, for the file at the
+        absolute path under the AID, or for all files
+        """
+        return self.breakdown('access', path, AID)
+
+    def services(self, table='UST', activated=True):
+        """
+        returns the boolean matrix [card id, service number - 1] of the
+        services of the table "UST" or "SST", activated (or only allocated
+        in the SST, if not activated)
+        """
+        arr = self._freeze()
+        return arr[table + ' activated'] if activated else arr[table]
+
+    def service_ratio(self, table='UST', activated=True):
+        """
+        returns the numpy array of the ratio of cards with each service
+        (index: service number - 1), among the cards with the service table
+        """
+        mat = self.services(table, activated)
+        if not self._serv[table][0]:
+            return np.zeros(mat.shape[1])
+        with_table = np.zeros(len(self.cards), dtype=bool)
+        with_table[np.concatenate(self._serv[table][0])] = True
+        return mat[with_table].mean(axis=0)
+
+    def with_service(self, num, table='UST', activated=True):
+        """
+        returns the list of the cards with the service `num` in the table
+        "UST" or "SST"
+        """
+        mat = self.services(table, activated)
+        if num < 1 or num > mat.shape[1]:
+            return []
+        return [self.cards[i] for i in np.nonzero(mat[:, num-1])[0]]
+
+    def __repr__(self):
+        return 'fleet_stats(cards=%i, paths=%i, files=%i)' \
+               % (len(self.cards), len(self.paths), len(self._rows['card']))
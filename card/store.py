@@ -0,0 +1,477 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# Python library to store
+# identities, services and
+# filesystem dumps of many cards
+# in a SQLite database
+#################################
+
+import time
+import json
+import sqlite3
+
+from card.utils import *
+
+
+class card_store(object):
+    """
+    inventory of cards in a SQLite database, with for each card:
+        its ICCID, IMSI, ATR, list of AID and type ("USIM", "SIM", ...),
+        the services of its service table (EF_UST or EF_SST),
+        the files of its filesystem dump, stored like in card images (see
+        card.utils.image_writer), with the hashes of their parameters and
+        content
+    cards are identified by their ICCID: adding a card again replaces all
+    what was stored for it
+
+    cards are added from a card instance (add_card()), from card images
+    (add_image()), or from the values returned by get_ICCID(), get_imsi(),
+    get_services() and a list of files such as self.FS (add()); many cards
+    can be added within a single transaction (add_many(), add_images())
+
+    queries use the indexes on the IMSI, the service numbers and the file
+    paths, e.g.:
+        db = card_store('fleet.db')
+        db.add_images(['card1.img', 'card2.img'])
+        db.find_IMSI('208011234567890')
+        db.with_service(125)
+    """
+
+    dbg = 0
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS cards ('
+        'id INTEGER PRIMARY KEY, ICCID TEXT NOT NULL UNIQUE, IMSI TEXT, '
+        'ATR TEXT, AID TEXT, type TEXT, time REAL)',
+        'CREATE INDEX IF NOT EXISTS cards_IMSI ON cards (IMSI)',
+        # tab: "UST" or "SST", activated: 0 for a SIM service only allocated
+        'CREATE TABLE IF NOT EXISTS services ('
+        'card INTEGER NOT NULL, tab TEXT NOT NULL, num INTEGER NOT NULL, '
+        'activated INTEGER NOT NULL, PRIMARY KEY (card, tab, num))',
+        'CREATE INDEX IF NOT EXISTS services_num '
+        'ON services (tab, num, activated)',
+        # AID: hex str, "" for the MF, path: hex str, data: JSON
+        'CREATE TABLE IF NOT EXISTS files ('
+        'card INTEGER NOT NULL, AID TEXT NOT NULL, path TEXT NOT NULL, '
+        'fcp TEXT NOT NULL, raw TEXT, data TEXT, fcp_hash TEXT, '
+        'data_hash TEXT)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS files_card '
+        'ON files (card, AID, path)',
+        'CREATE INDEX IF NOT EXISTS files_path ON files (AID, path)')
+
+    # parameterized queries, compiled once by sqlite3 and then kept in its
+    # statements cache
+    queries = {
+        'id': 'SELECT id FROM cards WHERE ICCID=?',
+        'insert': 'INSERT INTO cards (ICCID, IMSI, ATR, AID, type, time) '
+                  'VALUES (?, ?, ?, ?, ?, ?)',
+        'update': 'UPDATE cards SET IMSI=?, ATR=?, AID=?, type=?, time=? '
+                  'WHERE id=?',
+        'del_services': 'DELETE FROM services WHERE card=?',
+        'del_files': 'DELETE FROM files WHERE card=?',
+        'service': 'INSERT INTO services (card, tab, num, activated) '
+                   'VALUES (?, ?, ?, ?)',
+        'file': 'INSERT INTO files (card, AID, path, fcp, raw, data, '
+                'fcp_hash, data_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        'card': 'SELECT id, ICCID, IMSI, ATR, AID, type, time FROM cards '
+                'WHERE ICCID=?',
+        'card_services': 'SELECT tab, num, activated FROM services '
+                         'WHERE card=? ORDER BY tab, num',
+        'IMSI': 'SELECT ICCID FROM cards WHERE IMSI=? ORDER BY ICCID',
+        'with_service': 'SELECT ICCID FROM cards JOIN services '
+                        'ON services.card=cards.id WHERE tab=? AND num=? '
+                        'AND activated>=? ORDER BY ICCID',
+        'with_file': 'SELECT ICCID FROM cards JOIN files '
+                     'ON files.card=cards.id WHERE files.AID=? AND path=? '
+                     'ORDER BY ICCID',
+        'get_file': 'SELECT files.AID, path, fcp, raw, data FROM files '
+                    'JOIN cards ON files.card=cards.id '
+                    'WHERE ICCID=? AND files.AID=? AND path=?',
+        'files': 'SELECT files.AID, path, fcp, raw, data FROM files '
+                 'JOIN cards ON files.card=cards.id WHERE ICCID=? '
+                 'ORDER BY files.rowid',
+        'hashes': 'SELECT files.AID, path, fcp_hash, data_hash FROM files '
+                  'JOIN cards ON files.card=cards.id WHERE ICCID=?',
+        'count': 'SELECT COUNT(*) FROM cards'}
+
+    # absolute paths of EF_IMSI and of the service tables, in card images:
+    # under the 1st AID for a UICC, under the MF for a SIM
+    IMSI_path = {'UST': [0x6F, 0x07], 'SST': [0x7F, 0x20, 0x6F, 0x07]}
+    services_path = {'UST': [0x6F, 0x38], 'SST': [0x7F, 0x20, 0x6F, 0x38]}
+
+    def __init__(self, filename=':memory:'):
+        """
+        opens (or creates) the SQLite database `filename`
+        """
+        self.filename = filename
+        self.db = sqlite3.connect(filename, cached_statements=256)
+        for sql in self.schema:
+            self.db.execute(sql)
+        self.db.commit()
+
+    @staticmethod
+    def _hex(bytelist):
+        return ''.join(['%.2X' % b for b in bytelist])
+
+    @staticmethod
+    def _services(services):
+        # returns the list of (service number, activated) from get_services()
+        # strings, or from service numbers
+        ret = []
+        for s in services or []:
+            if isinstance(s, int):
+                ret.append( (s, 1) )
+            else:
+                info = s.split(':')
+                # USIM: "available", SIM: "allocated" or
+                # "allocated | activated"
+                ret.append( (int(info[0]),
+                             int('allocated' not in info[-1] \
+                                 or 'activated' in info[-1])) )
+        return ret
+
+    @staticmethod
+    def _services_from_table(table, data):
+        # returns the list of (service number, activated) from the content
+        # of EF_UST (1 bit per service) or EF_SST (2 bits per service)
+        ret = []
+        if table == 'SST':
+            for i in range(len(data) * 4):
+                B = data[i//4] >> (2 * (i%4))
+                if B & 1:
+                    ret.append( (i+1, (B >> 1) & 1) )
+        else:
+            for i in range(len(data) * 8):
+                if data[i//8] & (1 << (i%8)):
+                    ret.append( (i+1, 1) )
+        return ret
+
+    def _card_id(self, ICCID, IMSI, ATR, AID, type):
+        # inserts or updates the card, removing its services and files
+        cur = self.db.cursor()
+        info = (IMSI, self._hex(ATR or []),
+                json.dumps([self._hex(aid) for aid in AID or []]),
+                type, time.time())
+        row = cur.execute(self.queries['id'], (ICCID, )).fetchone()
+        if row is None:
+            cur.execute(self.queries['insert'], (ICCID, ) + info)
+            return cur.lastrowid
+        cur.execute(self.queries['update'], info + (row[0], ))
+        cur.execute(self.queries['del_services'], (row[0], ))
+        cur.execute(self.queries['del_files'], (row[0], ))
+        return row[0]
+
+    def _add(self, ICCID, IMSI=None, services=None, FS=None, ATR=None,
+             AID=None, type=None, FS_AID=None, table=None, records=None):
+        # inserts the card, without committing; services are (number,
+        # activated), and image file lines can be given in `records`
+        if type is None:
+            type = 'USIM' if AID else 'SIM'
+        if table is None:
+            table = 'SST' if type == 'SIM' else 'UST'
+        card = self._card_id(ICCID, IMSI, ATR, AID, type)
+        self.db.executemany(self.queries['service'],
+                            [(card, table, num, act) for (num, act) in \
+                             services or []])
+        rows = []
+        for fil in FS or []:
+            rec = image_writer._record(fil, fil.get('AID', FS_AID))
+            if 'Raw' in fil:
+                rec['raw'] = self._hex(fil['Raw'])
+            rows.append( self._file_row(card, rec) )
+        for rec in records or []:
+            rows.append( self._file_row(card, rec) )
+        self.db.executemany(self.queries['file'], rows)
+        if self.dbg >= 2:
+            log(3, '(card_store) card %s: %i services, %i files' \
+                   % (ICCID, len(services or []), len(rows)))
+        return card
+
+    @staticmethod
+    def _file_row(card, rec, fcp_hash=None, data_hash=None):
+        # returns the row of the files table for the image file line `rec`
+        data = rec.get('data')
+        return (card, rec['AID'] or '', rec['path'],
+                image_writer._dumps(rec['fcp']), rec.get('raw'),
+                None if data is None else image_writer._dumps(data),
+                fcp_hash or image_writer._hash(rec['fcp']),
+                data_hash or image_writer._hash(data))
+
+    def add(self, ICCID, IMSI=None, services=None, FS=None, ATR=None,
+            AID=None, type=None, FS_AID=None, commit=True, 
+            service_table=None):
+        """
+        adds a card, from:
+            ICCID, IMSI: as returned by get_ICCID() and get_imsi()
+            services: as returned by get_services(), or list of service
+                      numbers
+            service_table: content of EF_UST or EF_SST (list of bytes), 
+                           parsed instead of `services` when given
+            FS: list of file dictionnaries (e.g. self.FS), with their
+                "Absolut Path", and "AID" for files under an AID
+            ATR, AID: list of bytes, and list of AID (list of bytes)
+            type: "USIM", "SIM"... by default, "USIM" when AID are given,
+                  "SIM" otherwise; services are stored for the table "SST"
+                  for a SIM, "UST" otherwise
+            FS_AID: AID (list of bytes) of the files of FS without "AID"
+                    key, None for the MF
+            commit: commit the transaction
+
+        returns the card id in the database
+        """
+        if type is None:
+            type = 'USIM' if AID else 'SIM'
+        if service_table is not None:
+            services = self._services_from_table(
+                           'SST' if type == 'SIM' else 'UST', service_table)
+        else:
+            services = self._services(services)
+        card = self._add(ICCID, IMSI, services, FS, ATR, AID, type, FS_AID)
+        if commit:
+            self.db.commit()
+        return card
+
+    def add_many(self, cards):
+        """
+        adds many cards within a single transaction, `cards` being an
+        iterable of dict with the arguments of add()
+
+        returns the number of cards added
+        """
+        cnt = 0
+        try:
+            for kw in cards:
+                kw = dict(kw)
+                if kw.get('service_table') is not None:
+                    kw['services'] = self._services_from_table(
+                        'SST' if kw.get('type', 'USIM' if kw.get('AID') \
+                                        else 'SIM') == 'SIM' else 'UST', 
+                        kw['service_table'])
+                else:
+                    kw['services'] = self._services(kw.get('services'))
+                kw.pop('service_table', None)
+                kw.pop('commit', None)
+                self._add(**kw)
+                cnt += 1
+        except:
+            self.db.rollback()
+            raise
+        self.db.commit()
+        return cnt
+
+    def add_card(self, card, FS=True, commit=True):
+        """
+        adds the card connected with `card` (USIM, SIM... instance), from
+        its get_ICCID(), get_imsi() methods (when available) and the content
+        of its service table (EF_UST in the USIM ADF, or EF_SST), and with 
+        its files in card.FS (e.g. after explore_fs()) if FS
+
+        returns the card id in the database, or None if the ICCID can not
+        be read
+        """
+        if getattr(card, 'AID_USIM', None) in getattr(card, 'AID', []):
+            # EF_IMSI and EF_UST are read in the USIM ADF
+            card.select_by_aid( card.AID.index(card.AID_USIM) + 1 )
+            table = card.read_by_SFI(self.services_path['UST'])
+        elif hasattr(card, 'get_services'):
+            table = card.select(self.services_path['SST'][:2]) and \
+                    card.select(self.services_path['SST'][2:])
+        else:
+            table = None
+        IMSI = card.get_imsi() if hasattr(card, 'get_imsi') else None
+        ICCID = card.get_ICCID()
+        if ICCID is None:
+            if self.dbg:
+                log(2, '(card_store) unable to read the ICCID')
+            return None
+        AID = getattr(card, 'AID', None)
+        return self.add(ICCID, IMSI, None,
+                        card.FS if FS and hasattr(card, 'FS') else None,
+                        card.ATR, AID, card.__class__.__name__,
+                        getattr(card, 'AID_USIM', None), commit, 
+                        table.get('Data', []) if table else None)
+
+    @staticmethod
+    def _image_USIM_AID(img):
+        # returns the USIM AID of the card image `img`, from its header
+        # (AID_USIM) or the 1st AID with the USIM RID and application code
+        # (A0000000871002), as USIM.SELECT_ADF_USIM() does
+        if img.header.get('AID_USIM'):
+            return img._unhex(img.header['AID_USIM'])
+        for aid in img.AID:
+            if aid[0:7] == [0xA0, 0x00, 0x00, 0x00, 0x87, 0x10, 0x02]:
+                return aid
+        return None
+
+    def _add_image(self, img):
+        # inserts the card image `img` (image_reader or file name), without
+        # committing
+        if not isinstance(img, image_reader):
+            img = image_reader(img)
+        AID = self._image_USIM_AID(img)
+        table = 'UST' if AID else 'SST'
+        ICCID = img.header.get('ICCID')
+        if ICCID is None and [0x2F, 0xE2] in img:
+            ICCID = decode_BCD( img.get([0x2F, 0xE2]).get('Data', []) )
+        if ICCID is None:
+            if self.dbg:
+                log(2, '(card_store) %s: no ICCID' % img.filename)
+            return None
+        IMSI, services = None, []
+        fil = img.get(self.IMSI_path[table], AID)
+        if fil is not None and len(fil.get('Data', [])) == 9:
+            IMSI = decode_BCD(fil['Data'])[3:]
+        fil = img.get(self.services_path[table], AID)
+        if fil is not None and fil.get('Data'):
+            services = self._services_from_table(table, fil['Data'])
+        card = self._add(ICCID, IMSI, services, None, img.ATR, img.AID,
+                         img.header.get('type'), None, table)
+        rows = []
+        for rec in img.records():
+            h = img.index['%s/%s' % (rec['AID'] or 'MF', rec['path'])]
+            rows.append( self._file_row(card, rec, h[1], h[2]) )
+        self.db.executemany(self.queries['file'], rows)
+        return card
+
+    def add_image(self, img, commit=True):
+        """
+        adds the card from its card image `img` (image_reader instance or
+        file name), with its ICCID from the header (or EF_ICCID), IMSI from
+        EF_IMSI and services from EF_UST (or EF_SST for a SIM image)
+
+        returns the card id in the database, or None when the ICCID is not
+        available
+        """
+        card = self._add_image(img)
+        if commit:
+            self.db.commit()
+        return card
+
+    def add_images(self, images):
+        """
+        adds many card images (image_reader instances or file names) within
+        a single transaction
+
+        returns the number of cards added
+        """
+        cnt = 0
+        try:
+            for img in images:
+                if self._add_image(img) is not None:
+                    cnt += 1
+        except:
+            self.db.rollback()
+            raise
+        self.db.commit()
+        return cnt
+
+    def card(self, ICCID):
+        """
+        returns a dict with the "ICCID", "IMSI", "ATR" (list of bytes),
+        "AID" (list of list of bytes), "type", "time" (of the last update),
+        "services" ({table: [service number, ...]}, only activated services)
+        of the card, or None
+        """
+        row = self.db.execute(self.queries['card'], (ICCID, )).fetchone()
+        if row is None:
+            return None
+        unhex = image_reader._unhex
+        ret = {'ICCID': row[1], 'IMSI': row[2], 'ATR': unhex(row[3] or ''),
+               'AID': [unhex(aid) for aid in json.loads(row[4] or '[]')],
+               'type': row[5], 'time': row[6], 'services': {}}
+        for (tab, num, act) in self.db.execute(self.queries['card_services'],
+                                               (row[0], )):
+            if act:
+                ret['services'].setdefault(tab, []).append(num)
+        return ret
+
+    def find_IMSI(self, IMSI):
+        """
+        returns the list of ICCID of the cards with the IMSI
+        """
+        return [r[0] for r in self.db.execute(self.queries['IMSI'], (IMSI, ))]
+
+    def with_service(self, num, table='UST', activated=True):
+        """
+        returns the list of ICCID of the cards with the service `num`
+        in their service table `table` ("UST" or "SST"); for the SST,
+        services only allocated are included when activated is False
+        """
+        return [r[0] for r in self.db.execute(self.queries['with_service'],
+                                    (table, num, 1 if activated else 0))]
+
+    def with_file(self, path, AID=None):
+        """
+        returns the list of ICCID of the cards with a file at the absolute
+        path (list of bytes), under the AID (list of bytes, None for the MF)
+        """
+        return [r[0] for r in self.db.execute(self.queries['with_file'],
+                                (self._hex(AID or []), self._hex(path)))]
+
+    @staticmethod
+    def _file(row):
+        # returns the file dictionnary of a row (AID, path, fcp, raw, data)
+        rec = {'AID': row[0] or None, 'path': row[1],
+               'fcp': json.loads(row[2])}
+        if row[3] is not None:
+            rec['raw'] = row[3]
+        if row[4] is not None:
+            rec['data'] = json.loads(row[4])
+        return image_reader._load(rec)
+
+    def get_file(self, ICCID, path, AID=None):
+        """
+        returns the file dictionnary of the card at the absolute path (list
+        of bytes), under the AID (list of bytes, None for the MF), or None
+        """
+        row = self.db.execute(self.queries['get_file'],
+                    (ICCID, self._hex(AID or []), self._hex(path))).fetchone()
+        if row is None:
+            return None
+        return self._file(row)
+
+    def files(self, ICCID):
+        """
+        returns the list of file dictionnaries of the card, in the order
+        they were added, with their "Absolut Path", and "AID" for files
+        under an AID, as accepted by diff_images()
+        """
+        return [self._file(row) for row in \
+                self.db.execute(self.queries['files'], (ICCID, ))]
+
+    def hashes(self, ICCID):
+        """
+        returns {"AID/path": (hash of parameters, hash of content)} for the
+        files of the card, with the keys and hashes of the card images index
+        """
+        return dict([('%s/%s' % (r[0] or 'MF', r[1]), (r[2], r[3])) for r in \
+                     self.db.execute(self.queries['hashes'], (ICCID, ))])
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        return self.db.execute(self.queries['count']).fetchone()[0]
+
+    def __repr__(self):
+        return 'card_store(%s, cards=%i)' % (self.filename, len(self))
@@ -23,10 +23,20 @@ with this program; if not, write to the Free Software Foundation, Inc.,
 # being used in smartcard specs #
 #################################
 
+import os
 import sys
+import json
+import time
+import hashlib
 
 from collections import deque
-from smartcard.util import toBytes
+try:
+    from collections.abc import MutableMapping, KeysView
+except ImportError:
+    # python 2
+    from collections import MutableMapping, KeysView
+# pyscard is not imported here: the parsing and decoding functions
+# can be used without it (and without pcsclite)
 
 
 ###############
@@ -83,6 +93,28 @@ def byteToBit(byte):
             byte = byte - pow(2, i)
     return bit
 
+# equivalent to the pyscard function "toHexString"
+def toHexString(bytelist):
+    '''
+    toHexString([0x3F, 0x00]) -> '3F 00'
+    
+    converts a list of bytes into an hexadecimal string
+    '''
+    return ' '.join(['%.2X' % b for b in bytelist])
+
+# equivalent to the pyscard function "toBytes"
+def toBytes(string):
+    '''
+    toBytes('3F 00') -> [63, 0]
+    
+    converts an hexadecimal string (with or without spaces) into a list
+    of bytes
+    '''
+    string = ''.join(string.split())
+    if len(string) % 2:
+        raise TypeError('not a string representing a list of bytes')
+    return [int(string[i:i+2], 16) for i in range(0, len(string), 2)]
+
 # equivalent to the pyscard function "toASCIIBytes"
 # new version of python (>2.6) seems to have a built-in "bytes" type
 def stringToByte(string):
@@ -386,8 +418,345 @@ def make_graph(FS, master_name='(0x3F, 0x00)\nMF'):
                         nodes['%s'%abspath]))
     # and return graph ...
     return graph
+
+
+class graph_writer:
+    '''
+    streaming writer of the graph of a filesystem, without pydot: each file
+    is written as soon as it is given, in the graphviz DOT language (to be
+    rendered e.g. with `dot -Tsvg`), or as a JSON tree
+
+    files are file dictionnaries with their "Absolut Path" (and "Name", if
+    known), e.g. from self.FS, self.iter_DF() or an image_reader; files
+    under an AID are attached to a node for their ADF, below the master node
+
+    with group, the files of each ADF are put in a DOT cluster (or in a
+    subtree of the JSON tree, which is always the case)
+
+    the JSON tree is only kept as small dicts until close():
+        {"name": str, "path": hex str, "type": str, "AID": hex str or null,
+         "children": [...]}
+    '''
+
+    colors = {'master': 'green', 'ADF': 'green', 'DF': 'blue', 'EF': 'yellow'}
+
+    def __init__(self, filename, master_name='(0x3F, 0x00)\nMF',
+                 format='dot', group=False):
+        '''
+        creates the graph file `filename` (or writes into the file object
+        given), in the `format` "dot" or "json", with the master node
+        `master_name`, and with DOT clusters per ADF if group
+        '''
+        if format not in ('dot', 'json'):
+            raise ValueError('unknown graph format: %s' % format)
+        self.format, self.group = format, group
+        if hasattr(filename, 'write'):
+            self.filename, self.fd, self._own = None, filename, False
+        else:
+            self.filename, self.fd, self._own = filename, open(filename, 'w'), True
+        self.count = 0
+        self._ADF = {}
+        self._cluster = None
+        if format == 'dot':
+            self.fd.write('digraph G {\n  rankdir=LR;\n  node [style=filled];\n')
+            self._node('master', master_name, 'master')
+        else:
+            self._tree = {'name': master_name, 'path': '', 'type': 'MF',
+                          'AID': None, 'children': []}
+            # {"AID/path": JSON node}
+            self._nodes = {'MF/': self._tree}
+
+    @staticmethod
+    def _quote(s):
+        # DOT quoted string, newlines being kept as \n
+        return '"%s"' % s.replace('\\', '\\\\').replace('"', '\\"')\
+                         .replace('\n', '\\n')
+
+    def _node(self, node_id, label, kind):
+        self.fd.write('  %s [label=%s, fillcolor=%s];\n' \
+                      % (node_id, self._quote(label), self.colors[kind]))
+
+    @staticmethod
+    def _id(AID, path):
+        return 'n%s_%s' % (image_writer._hex(AID) if AID else 'MF',
+                           image_writer._hex(path))
+
+    @staticmethod
+    def _label(fil, path):
+        label = '(%s %s)' % (hex(path[-2]), hex(path[-1])) if len(path) >= 2 \
+                else ''
+        if 'Name' in fil:
+            return '%s\n%s' % (fil['Name'], label)
+        return label
+
+    def _open_ADF(self, AID):
+        # writes the ADF node of the AID, the 1st time files are under it
+        key = image_writer._hex(AID)
+        if self.format == 'json':
+            if key not in self._ADF:
+                self._ADF[key] = {'name': 'ADF %s' % key, 'path': '',
+                                  'type': 'ADF', 'AID': key, 'children': []}
+                self._tree['children'].append(self._ADF[key])
+                self._nodes['%s/' % key] = self._ADF[key]
+            return
+        if self.group and key != self._cluster:
+            if self._cluster is not None:
+                self.fd.write('  }\n')
+            # clusters with the same name are merged by graphviz
+            self.fd.write('  subgraph cluster_%s {\n  label=%s;\n' \
+                          % (key, self._quote('ADF %s' % key)))
+            self._cluster = key
+        if key not in self._ADF:
+            # its edge from the master is written at the end, out of the
+            # clusters, which would otherwise contain the master node
+            self._ADF[key] = self._id(AID, [])
+            self._node(self._ADF[key], 'ADF\n%s' % key, 'ADF')
+
+    def _close_cluster(self):
+        if self._cluster is not None:
+            self.fd.write('  }\n')
+            self._cluster = None
+
+    def write(self, fil, AID=None):
+        '''
+        writes the node of the file dictionnary `fil`, and its edge from its
+        parent, under the AID (list of bytes, None for the MF) of the file
+        ("AID" key), or the one given
+        '''
+        AID = fil.get('AID') or AID
+        path = fil['Absolut Path']
+        kind = 'EF' if fil.get('Type', 'EF')[:2] == 'EF' else 'DF'
+        if AID:
+            self._open_ADF(AID)
+        elif self.group:
+            self._close_cluster()
+        if not path:
+            # the ADF (or MF) itself
+            return
+        if self.format == 'json':
+            key = image_writer._key(AID, path)
+            node = {'name': fil.get('Name', ''), 'path': key.split('/')[1],
+                    'type': kind, 'AID': key.split('/')[0] if AID else None,
+                    'children': []}
+            # files whose DF was not given are attached to the ADF (or MF)
+            parent = self._nodes.get(image_writer._key(AID, path[:-2])) or \
+                     self._nodes[image_writer._key(AID, [])]
+            parent['children'].append(node)
+            if kind == 'DF':
+                self._nodes[key] = node
+        else:
+            node_id = self._id(AID, path)
+            self._node(node_id, self._label(fil, path), kind)
+            if len(path) >= 4 or AID:
+                parent = self._id(AID, path[:-2])
+            else:
+                parent = 'master'
+            self.fd.write('  %s -> %s;\n' % (parent, node_id))
+        self.count += 1
+
+    def close(self):
+        '''
+        ends the graph, and closes the graph file
+        '''
+        if self.fd is None:
+            return
+        if self.format == 'dot':
+            self._close_cluster()
+            for key in sorted(self._ADF):
+                self.fd.write('  master -> %s;\n' % self._ADF[key])
+            self.fd.write('}\n')
+        else:
+            json.dump(self._tree, self.fd, separators=(',', ':'))
+            self._nodes = {}
+        if self._own:
+            self.fd.close()
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return 'graph_writer(%s, %s, files=%i)' \
+               % (self.filename, self.format, self.count)
+
+
+def write_graph(FS, filename, master_name='(0x3F, 0x00)\nMF', format='dot',
+                group=False, AID=None):
+    '''
+    writes the graph of the files of FS (list of file dictionnaries, or any
+    iterable of them, e.g. self.iter_DF() or an image_reader) into the file
+    `filename`, in the DOT language or as a JSON tree, see graph_writer;
+    files without "AID" are taken under the `AID` given (None for the MF)
+
+    unlike make_graph(), it does not require pydot, and the files are
+    written while they are iterated
+    returns the number of files written
+    '''
+    with graph_writer(filename, master_name, format, group) as gw:
+        for fil in FS:
+            gw.write(fil, AID)
+    return gw.count
+
+
+#########################################
+# Compact file dictionnary, see select() #
+#########################################
+class file_record(MutableMapping):
+    '''
+    file dictionnary with slots, as returned by parse_file(), select() and 
+    read_EF(), and kept in self.FS
+    
+    the usual file parameters are kept in slot attributes, other parameters
+    (and unparsed tags) in an additional dict; the file content is stored
+    as bytes, and records as a list of bytes
+    
+    it can be used as a dict, with the same keys as before (e.g. 
+    "File Identifier", "Absolut Path", "Data"), the values being returned 
+    as they are set, except the file content which is returned as a (new) 
+    list of integers, or list of records; the attributes give direct access
+    to the stored values, e.g. rec.data, rec.fid
+    '''
+    
+    # file dictionnary key -> attribute
+    fields = (('Type', 'type'), ('Structure', 'structure'),
+              ('File Identifier', 'fid'), ('Absolut Path', 'path'),
+              ('Size', 'size'), ('Record Length', 'record_length'),
+              ('File Descriptor', 'descriptor'), 
+              ('Life Cycle Status', 'life_cycle'),
+              ('Short File Identifier', 'SFI'), ('DF Name', 'DF_name'), 
+              ('Name', 'name'), ('AID', 'AID'), ('Raw', 'raw'), 
+              ('Data', 'data'), ('Access', 'access'), 
+              ('Record Number', 'record_number'), 
+              ('UICC characteristics', 'UICC_char'),
+              ('Security Attributes ref to expand', 'SA_ref'),
+              ('Control', 'control'))
+    _attr = dict(fields)
+    
+    __slots__ = tuple([a for (k, a) in fields]) + ('_extra', )
+    
+    def __init__(self, *args, **kwargs):
+        '''
+        initializes the record as a dict: from a dict or list of (key, value),
+        and keyword arguments
+        '''
+        self._extra = None
+        self.update(*args, **kwargs)
+    
+    @staticmethod
+    def _pack(val):
+        # list of bytes -> bytes, list of list of bytes -> list of bytes
+        if isinstance(val, list):
+            try:
+                return bytes(bytearray(val))
+            except (TypeError, ValueError):
+                if val and isinstance(val[0], list):
+                    try:
+                        return [bytes(bytearray(v)) for v in val]
+                    except (TypeError, ValueError):
+                        pass
+        return val
+    
+    @staticmethod
+    def _unpack(val):
+        if isinstance(val, bytes):
+            return list(bytearray(val))
+        elif isinstance(val, list) and val and isinstance(val[0], bytes):
+            return [list(bytearray(v)) for v in val]
+        return val
+    
+    def __getitem__(self, key):
+        attr = self._attr.get(key)
+        if attr is None:
+            if self._extra is not None and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key)
+        try:
+            if attr == 'data':
+                # the content, changed in place, has to be set again
+                return self._unpack(self.data)
+            return getattr(self, attr)
+        except AttributeError:
+            raise KeyError(key)
+    
+    def __setitem__(self, key, val):
+        attr = self._attr.get(key)
+        if attr is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = val
+        elif attr == 'data':
+            self.data = self._pack(val)
+        else:
+            setattr(self, attr, val)
+    
+    def __delitem__(self, key):
+        attr = self._attr.get(key)
+        if attr is None:
+            if self._extra is None or key not in self._extra:
+                raise KeyError(key)
+            del self._extra[key]
+        elif hasattr(self, attr):
+            delattr(self, attr)
+        else:
+            raise KeyError(key)
+    
+    def __contains__(self, key):
+        attr = self._attr.get(key)
+        if attr is None:
+            return self._extra is not None and key in self._extra
+        return hasattr(self, attr)
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
     
+    def __iter__(self):
+        for (k, a) in self.fields:
+            if hasattr(self, a):
+                yield k
+        if self._extra:
+            for k in list(self._extra.keys()):
+                yield k
     
+    def __len__(self):
+        return len([a for (k, a) in self.fields if hasattr(self, a)]) \
+             + len(self._extra or ())
+    
+    def keys(self):
+        # view, to test "key in fil.keys()" without building a list
+        return KeysView(self)
+    
+    def copy(self):
+        # shallow copy, as dict.copy()
+        rec = file_record()
+        for (k, a) in self.fields:
+            if hasattr(self, a):
+                setattr(rec, a, getattr(self, a))
+        if self._extra:
+            rec._extra = dict(self._extra)
+        return rec
+    
+    def __getstate__(self):
+        return (tuple([getattr(self, a, None) for (k, a) in self.fields]),
+                tuple([hasattr(self, a) for (k, a) in self.fields]), 
+                self._extra)
+    
+    def __setstate__(self, state):
+        for i in range(len(self.fields)):
+            if state[1][i]:
+                setattr(self, self.fields[i][1], state[0][i])
+        self._extra = state[2]
+    
+    def __repr__(self):
+        # printed as the file dictionnary
+        return repr(dict(self))
+
+
 
 #######################################################
 # Generic class to keep track of sent / received APDU #
@@ -433,3 +802,794 @@ class apdu_stack:
         except IndexError:
             return None
 
+
+############################################################
+# Generic class to limit and pace the APDU sent to a card #
+############################################################
+class apdu_budget:
+    '''
+    limits the number of APDU sent and the time spent by an operation (e.g. a
+    brute force), and paces the APDU sent to the card
+    
+    the delay between 2 APDU is adapted: it grows when the card responds 
+    much slower than usual or with a SW in `throttle_sw`, and shrinks back 
+    otherwise
+    
+    when set as the `budget` attribute of an ISO7816 instance, sr_apdu() 
+    paces the APDU, and brute force methods stop and return their partial 
+    result once the budget is exhausted
+    a new budget (or a reset()) is required for each operation
+    '''
+    
+    # SW indicating the card suffers from the rate of commands
+    throttle_sw = ((0x64, 0x00), (0x65, 0x81), (0x6F, 0x00))
+    # factor over the usual response time of an instruction, and minimum 
+    # difference in seconds with it, to consider the card is slowing down
+    slow_factor = 2.0
+    slow_margin = 0.005
+    # weight of the last response time in the usual response time of an
+    # instruction (exponentially weighted moving average)
+    smoothing = 0.1
+
+    def __init__(self, max_apdu=None, max_time=None, min_delay=0.0, 
+                 max_delay=1.0):
+        '''
+        initializes the budget with a maximum number of APDU `max_apdu` and
+        a maximum time in seconds `max_time` (None for unlimited), and the 
+        bounds of the delay between 2 APDU, in seconds
+        '''
+        self.max_apdu  = max_apdu
+        self.max_time  = max_time
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.reset()
+
+    def reset(self):
+        '''
+        restarts the budget counters
+        '''
+        self.start   = time.time()
+        self.count   = 0
+        self.delay   = self.min_delay
+        self.usual   = {}
+        self._last   = None
+
+    def exhausted(self):
+        '''
+        returns True when the number of APDU or the time is over the budget
+        '''
+        if self.max_apdu is not None and self.count >= self.max_apdu:
+            return True
+        if self.max_time is not None \
+        and time.time() - self.start >= self.max_time:
+            return True
+        return False
+
+    def wait(self):
+        '''
+        waits for the current delay after the last APDU, before sending 
+        another one
+        '''
+        if self.delay and self._last is not None:
+            rem = self._last + self.delay - time.time()
+            if rem > 0:
+                time.sleep(rem)
+
+    def record(self, latency, sw, INS=None):
+        '''
+        records an APDU exchanged, with its response time `latency`, the 
+        status word `sw` and the instruction code `INS`, and adapts the 
+        delay
+        the response time is compared to the usual one for this instruction,
+        a moving average kept in self.usual
+        '''
+        self.count += 1
+        self._last = time.time()
+        usual = self.usual.get(INS)
+        if usual is None:
+            self.usual[INS] = latency
+        else:
+            self.usual[INS] = usual + self.smoothing * (latency - usual)
+        if sw in self.throttle_sw \
+        or (usual is not None and latency > self.slow_factor * usual \
+        and latency - usual > self.slow_margin):
+            self.delay = min(self.max_delay, max(2 * self.delay, 0.01))
+        else:
+            self.delay = max(self.min_delay, self.delay / 2)
+            if self.delay < 0.001:
+                self.delay = self.min_delay
+
+    def __repr__(self):
+        return 'apdu_budget(apdu=%i/%s, time=%.1f/%s, delay=%.3f)' \
+               % (self.count, self.max_apdu, time.time() - self.start, 
+                  self.max_time, self.delay)
+
+
+#########################################################
+# Generic class to keep EF content read within a session #
+#########################################################
+class EF_cache:
+    '''
+    session cache for EF content
+
+    keeps the content of EF read within a session, indexed by the location of
+    the file (AID, DF path, EF file id):
+    - list of bytes for EF transparent
+    - list of all records (including empty ones) for cyclic or linear EF
+
+    the size parameters of the file are stored together with the content,
+    and checked again when the content is requested
+
+    keeps also the file parameters (FCP) of the files selected, without 
+    their content
+
+    keeps track of hits and misses
+    '''
+
+    def __init__(self):
+        '''
+        initializes an empty cache
+        '''
+        self.files  = {}
+        self.FCP    = {}
+        self.hits   = 0
+        self.misses = 0
+
+    @staticmethod
+    def _meta(fil):
+        return (fil.get('Structure'), fil.get('Size'), fil.get('Record Length'))
+
+    def get(self, key, fil):
+        '''
+        returns the content cached for the file at `key`, if its size parameters
+        corresponds to the one of the file dict `fil`, None otherwise
+        '''
+        if key in self.files and self.files[key][0] == self._meta(fil):
+            self.hits += 1
+            return self.files[key][1]
+        self.misses += 1
+        return None
+
+    def has(self, key, fil):
+        '''
+        returns True if content is cached for the file at `key`, with the size
+        parameters of the file dict `fil`, without counting a hit or a miss
+        '''
+        return key in self.files and self.files[key][0] == self._meta(fil)
+
+    def put(self, key, fil, content):
+        '''
+        stores the content read from the file at `key`
+        '''
+        self.files[key] = (self._meta(fil), content)
+
+    def put_FCP(self, key, fil):
+        '''
+        stores the file parameters of the file at `key`
+        '''
+        self.FCP[key] = file_record([(k, v[:] if isinstance(v, list) else v)\
+                                     for (k, v) in fil.items() if k != 'Data'])
+
+    def get_FCP(self, key):
+        '''
+        returns the file parameters stored for the file at `key`, or None
+        '''
+        return self.FCP.get(key)
+
+    def update_binary(self, key, offset, data):
+        '''
+        writes through the data updated in the transparent file at `key`
+        '''
+        if key in self.files:
+            content = self.files[key][1]
+            if offset + len(data) <= len(content):
+                content[offset:offset+len(data)] = data
+            else:
+                del self.files[key]
+
+    def update_record(self, key, num, data):
+        '''
+        writes through the data updated in the record `num` of the file at `key`
+        '''
+        if key in self.files:
+            content = self.files[key][1]
+            if 1 <= num <= len(content):
+                content[num-1] = list(data)
+            else:
+                del self.files[key]
+
+    def invalidate(self, key=None):
+        '''
+        drops the content cached for the file at `key`, or all of it if `key`
+        is None
+        '''
+        if key is None:
+            self.files.clear()
+            self.FCP.clear()
+        else:
+            if key in self.files:
+                del self.files[key]
+            if key in self.FCP:
+                del self.FCP[key]
+
+    def stats(self):
+        '''
+        returns a dict with the number of files cached, hits and misses
+        '''
+        return {'files': len(self.files), 'FCP': len(self.FCP), 
+                'hits': self.hits, 'misses': self.misses}
+
+    def __repr__(self):
+        return 'EF_cache(files=%(files)i, FCP=%(FCP)i, hits=%(hits)i, '\
+               'misses=%(misses)i)'\
+               % self.stats()
+
+
+
+##################################################################
+# Generic class to save the progress of a filesystem exploration #
+##################################################################
+class scan_checkpoint:
+    '''
+    keeps the progress of a filesystem exploration (see ISO7816.explore_DF())
+    and saves it into a file with pickle, so that the exploration can be 
+    resumed after an interruption (see ISO7816.resume_explore())
+    
+    the state is a dict with the exploration arguments, the DF paths still to
+    scan, the last file address scanned in the current DF, the files found
+    and the directory structure
+    '''
+    
+    # number of file addresses scanned between 2 saves
+    period = 64
+
+    def __init__(self, filename):
+        '''
+        initializes an empty checkpoint, to be saved in `filename`
+        '''
+        self.filename = filename
+        self.state = {}
+        self._cnt = 0
+
+    def save(self):
+        '''
+        writes the state into the file, atomically: a previous checkpoint is
+        never left half-written
+        '''
+        import pickle
+        tmp = self.filename + '.tmp'
+        fd = open(tmp, 'wb')
+        try:
+            pickle.dump(self.state, fd, pickle.HIGHEST_PROTOCOL)
+            fd.flush()
+            os.fsync(fd.fileno())
+        finally:
+            fd.close()
+        if hasattr(os, 'replace'):
+            os.replace(tmp, self.filename)
+        else:
+            os.rename(tmp, self.filename)
+        self._cnt = 0
+
+    def load(self):
+        '''
+        reads the state from the file, and returns it
+        '''
+        import pickle
+        fd = open(self.filename, 'rb')
+        try:
+            self.state = pickle.load(fd)
+        finally:
+            fd.close()
+        return self.state
+
+    def scanned(self, dir_path, addr, FS, child_DF):
+        '''
+        records that the file address `addr` under the DF at `dir_path` has
+        been scanned, with the files and child DF found so far under this DF
+        saves the state every `period` addresses
+        '''
+        self.state['scan'] = (list(dir_path), list(addr), FS[:], child_DF[:])
+        self._cnt += 1
+        if self._cnt >= self.period:
+            self.save()
+
+    def __repr__(self):
+        return 'scan_checkpoint(%s)' % self.filename
+
+
+###########################################################
+# Generic class to keep the filesystem layout of card models #
+###########################################################
+class layout_cache:
+    '''
+    persistent cache of the filesystem layout of card models, in a JSON file
+    
+    for each card model, identified by a key (see ISO7816.layout_key()), and 
+    for each explored scope (MF or AID, and DF path), keeps the absolute 
+    paths of the files found, the directory structure and the DF aliases 
+    (see ISO7816._DF_alias()), so that identical cards do not need to be 
+    brute forced again (see ISO7816.explore_DF())
+    '''
+
+    def __init__(self, filename):
+        '''
+        initializes the cache from `filename`, if the file exists
+        '''
+        self.filename = filename
+        self.models = {}
+        if os.path.exists(filename):
+            fd = open(filename, 'r')
+            try:
+                self.models = json.load(fd)
+            finally:
+                fd.close()
+
+    @staticmethod
+    def _path_str(path):
+        return ''.join(['%.2X' % b for b in path])
+
+    @staticmethod
+    def _str_path(string):
+        return [int(string[i:i+2], 16) for i in range(0, len(string), 2)]
+
+    def get(self, key, scope):
+        '''
+        returns a 3-tuple (list of files absolute path, directory structure,
+        dict of DF aliases {absolute path: absolute path of the DF}) for the
+        card model `key` and the `scope`, or None
+        '''
+        if key not in self.models or scope not in self.models[key]:
+            return None
+        layout = self.models[key][scope]
+        struct = dict([(tuple(self._str_path(k)), v) \
+                       for (k, v) in layout['struct'].items()])
+        aliases = dict([(tuple(self._str_path(k)), self._str_path(v)) \
+                        for (k, v) in layout.get('aliases', {}).items()])
+        return [self._str_path(p) for p in layout['files']], struct, aliases
+
+    def put(self, key, scope, paths, struct, aliases={}):
+        '''
+        stores the list of files absolute path, the directory structure and
+        the DF aliases for the card model `key` and the `scope`
+        '''
+        if key not in self.models:
+            self.models[key] = {}
+        self.models[key][scope] = {
+            'files': [self._path_str(path) for path in paths],
+            'struct': dict([(self._path_str(k), [list(c) for c in v]) \
+                            for (k, v) in struct.items()]),
+            'aliases': dict([(self._path_str(k), self._path_str(v)) \
+                             for (k, v) in aliases.items()])}
+
+    def save(self):
+        '''
+        writes the cache into the file, atomically
+        '''
+        tmp = self.filename + '.tmp'
+        fd = open(tmp, 'w')
+        try:
+            json.dump(self.models, fd, indent=1, sort_keys=True)
+        finally:
+            fd.close()
+        if hasattr(os, 'replace'):
+            os.replace(tmp, self.filename)
+        else:
+            os.rename(tmp, self.filename)
+
+    def __repr__(self):
+        return 'layout_cache(%s, models=%i)' % (self.filename, len(self.models))
+
+
+##############################################
+# Generic classes to write and read card images #
+##############################################
+class image_writer:
+    '''
+    streaming writer of a card image: a text file with one JSON object per
+    line, and a sidecar index file (`filename`.idx)
+    
+    the 1st line is the header:
+        {"format": "card image", "version": 2, "ATR": hex str, 
+         "AID": [hex str, ...], ... other information given}
+    each following line is a file:
+        {"AID": hex str or null (MF), "path": hex str (absolute path), 
+         "fcp": {file parameters}, "raw": hex str (selection response), 
+         "data": hex str (transparent EF) or [hex str, ...] (records)}
+    "raw" and "data" being optional; in the file parameters, integer keys 
+    (unparsed tags) are written as hex str, e.g. "0xC6"
+    
+    the index file is {"version": 2, "files": {"AID/path": [offset of the 
+    file line, hash of "fcp", hash of "data" or null]}}, AID being "MF" for 
+    files under the MF, see image_reader and diff_images()
+    (version 1 index files map "AID/path" to the offset only)
+    '''
+    
+    version = 2
+
+    def __init__(self, filename, ATR=[], AID=[], **info):
+        '''
+        creates the image file `filename` and writes its header, with the 
+        ATR, the list of AID and the other `info` given (JSON compatible)
+        '''
+        self.filename = filename
+        self.index = {}
+        self.fd = open(filename, 'wb')
+        header = dict(info)
+        header.update({'format': 'card image', 'version': self.version,
+                       'ATR': self._hex(ATR), 
+                       'AID': [self._hex(aid) for aid in AID]})
+        self._write(header)
+
+    @staticmethod
+    def _hex(bytelist):
+        return ''.join(['%.2X' % b for b in bytelist])
+
+    @staticmethod
+    def _key(AID, path):
+        return '%s/%s' % (image_writer._hex(AID) if AID else 'MF', 
+                          image_writer._hex(path))
+
+    @classmethod
+    def _enc(cls, val):
+        # makes file parameters JSON compatible
+        if isinstance(val, dict):
+            return dict([('0x%.2X' % k if isinstance(k, int) else k, 
+                          cls._enc(v)) for (k, v) in val.items()])
+        elif isinstance(val, (list, tuple)):
+            return [cls._enc(v) for v in val]
+        return val
+
+    @staticmethod
+    def _dumps(obj):
+        return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+    @classmethod
+    def _hash(cls, obj):
+        # hash of a JSON compatible object, None for None
+        if obj is None:
+            return None
+        return hashlib.sha1(cls._dumps(obj).encode('ascii')).hexdigest()
+
+    @classmethod
+    def _record(cls, fil, AID=None, path=None):
+        # returns the JSON compatible file line, without the raw response
+        if path is None:
+            path = fil['Absolut Path']
+        rec = {'AID': cls._hex(AID) if AID else None, 
+               'path': cls._hex(path),
+               'fcp': cls._enc(dict([(k, v) for (k, v) in fil.items() \
+                       if k not in ('Data', 'Absolut Path', 'Raw', 'AID')]))}
+        if 'Data' in fil:
+            data = fil['Data']
+            if data and isinstance(data[0], list):
+                rec['data'] = [cls._hex(r) for r in data]
+            elif fil.get('Structure', 'transparent') != 'transparent':
+                rec['data'] = []
+            else:
+                rec['data'] = cls._hex(data)
+        return rec
+
+    def _write(self, obj):
+        self.fd.write((self._dumps(obj) + '\n').encode('ascii'))
+
+    def write(self, fil, AID=None, path=None):
+        '''
+        writes the file dictionnary `fil` (as returned by select()), under 
+        the given AID (list of bytes, None for the MF), at the absolute path
+        `path` (by default, its "Absolut Path" key)
+        '''
+        rec = self._record(fil, AID, path)
+        if 'Raw' in fil:
+            rec['raw'] = self._hex(fil['Raw'])
+        self.index['%s/%s' % (rec['AID'] or 'MF', rec['path'])] = \
+            [self.fd.tell(), self._hash(rec['fcp']), self._hash(rec.get('data'))]
+        self._write(rec)
+
+    def close(self):
+        '''
+        closes the image file, and writes the index file
+        '''
+        if self.fd.closed:
+            return
+        self.fd.close()
+        fd = open(self.filename + '.idx', 'w')
+        try:
+            json.dump({'version': self.version, 'files': self.index}, fd, 
+                      sort_keys=True, separators=(',', ':'))
+        finally:
+            fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return 'image_writer(%s, files=%i)' % (self.filename, len(self.index))
+
+
+class image_reader:
+    '''
+    reader of a card image written by image_writer
+    
+    the header is available in self.header, the ATR and AID as lists of 
+    bytes in self.ATR and self.AID
+    files are returned as file dictionnaries, like select() does, with their
+    "Absolut Path", "AID" (for files under an AID), "Raw" and "Data" keys
+    they can be iterated in the order they were written, or accessed 
+    directly by AID and path thanks to the index file, which is rebuilt when
+    missing, or of another version (e.g. written for a version 1 image)
+    '''
+
+    def __init__(self, filename):
+        '''
+        opens the image file `filename`, reads its header and index
+        '''
+        self.filename = filename
+        self.fd = open(filename, 'rb')
+        self.header = json.loads(self.fd.readline().decode('ascii'))
+        if self.header.get('format') != 'card image':
+            self.fd.close()
+            raise ValueError('%s: not a card image' % filename)
+        self.ATR = self._unhex(self.header['ATR'])
+        self.AID = [self._unhex(aid) for aid in self.header['AID']]
+        self._start = self.fd.tell()
+        index = None
+        if os.path.exists(filename + '.idx'):
+            fd = open(filename + '.idx', 'r')
+            try:
+                index = json.load(fd)
+            finally:
+                fd.close()
+        if isinstance(index, dict) and 'files' in index \
+        and index.get('version') == image_writer.version \
+        and self.header.get('version') == image_writer.version:
+            self.index = index['files']
+        else:
+            # file lines are the same in version 1 images
+            self.index = {}
+            off = self._start
+            for line in self.fd:
+                rec = json.loads(line.decode('ascii'))
+                self.index['%s/%s' % (rec['AID'] or 'MF', rec['path'])] = \
+                    [off, image_writer._hash(rec['fcp']), 
+                     image_writer._hash(rec.get('data'))]
+                off += len(line)
+
+    @staticmethod
+    def _unhex(string):
+        return [int(string[i:i+2], 16) for i in range(0, len(string), 2)]
+
+    @classmethod
+    def _dec(cls, val):
+        # restores the integer keys of file parameters
+        if isinstance(val, dict):
+            return dict([(int(k, 16) if k[:2] == '0x' else k, cls._dec(v)) \
+                         for (k, v) in val.items()])
+        elif isinstance(val, list):
+            return [cls._dec(v) for v in val]
+        return val
+
+    @classmethod
+    def _load(cls, rec):
+        # returns the file dictionnary of the JSON file line `rec`
+        fil = file_record(cls._dec(rec['fcp']))
+        fil['Absolut Path'] = cls._unhex(rec['path'])
+        if rec['AID']:
+            fil['AID'] = cls._unhex(rec['AID'])
+        if 'raw' in rec:
+            fil['Raw'] = cls._unhex(rec['raw'])
+        if 'data' in rec:
+            if isinstance(rec['data'], list):
+                fil['Data'] = [cls._unhex(r) for r in rec['data']]
+            else:
+                fil['Data'] = cls._unhex(rec['data'])
+        return fil
+
+    def _file(self, line):
+        return self._load(json.loads(line.decode('ascii')))
+
+    def get(self, path=[], AID=None):
+        '''
+        returns the file dictionnary at the absolute `path`, under the AID 
+        (list of bytes, None for the MF), or None
+        '''
+        key = image_writer._key(AID, path)
+        if key not in self.index:
+            return None
+        self.fd.seek(self.index[key][0])
+        return self._file(self.fd.readline())
+
+    def _rec(self, key):
+        # returns the JSON file line at the index `key`
+        self.fd.seek(self.index[key][0])
+        return json.loads(self.fd.readline().decode('ascii'))
+
+    def paths(self, AID=None):
+        '''
+        returns the sorted list of the absolute paths of the files under 
+        the AID (list of bytes, None for the MF)
+        '''
+        prefix = image_writer._key(AID, [])
+        return sorted([self._unhex(k[len(prefix):]) for k in self.index \
+                       if k.startswith(prefix)])
+
+    def records(self):
+        '''
+        yields the JSON file lines (dict), as written by image_writer, in the
+        order they were written, without decoding them
+        '''
+        self.fd.seek(self._start)
+        line = self.fd.readline()
+        while line:
+            off = self.fd.tell()
+            yield json.loads(line.decode('ascii'))
+            self.fd.seek(off)
+            line = self.fd.readline()
+
+    def __iter__(self):
+        self.fd.seek(self._start)
+        line = self.fd.readline()
+        while line:
+            off = self.fd.tell()
+            yield self._file(line)
+            self.fd.seek(off)
+            line = self.fd.readline()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        # key: absolute path, or 2-tuple (AID, absolute path)
+        if isinstance(key, tuple) and len(key) == 2 \
+        and isinstance(key[1], (list, tuple)):
+            return image_writer._key(*key) in self.index
+        return image_writer._key(None, key) in self.index
+
+    def close(self):
+        self.fd.close()
+
+    def __repr__(self):
+        return 'image_reader(%s, files=%i)' % (self.filename, len(self.index))
+
+
+# file parameters reported as access conditions by diff_images()
+access_keys = ('Security Attributes', 'Security Attributes raw', 
+               'Security Attributes compact', 'Security Attributes expanded', 
+               'Security Attributes ref to expand', 'PIN Status', 
+               'READ', 'UPDATE', 'INCREASE', 'INVALIDATE', 'REHABILITATE', 
+               'CHV1', 'CHV2', 'Adm')
+
+def _image_files(img, AID=None, opened=None):
+    # returns {"AID/path": (hash of parameters, hash of content, 
+    #                       function returning the JSON file line)}
+    # image files opened are appended to `opened`, to be closed after use
+    if isinstance(img, str):
+        img = image_reader(img)
+        if opened is not None:
+            opened.append(img)
+    if isinstance(img, image_reader):
+        return dict([(k, (v[1], v[2], lambda k=k: img._rec(k))) \
+                     for (k, v) in img.index.items()])
+    files = {}
+    for fil in img:
+        rec = image_writer._record(fil, fil.get('AID') or AID)
+        files['%s/%s' % (rec['AID'] or 'MF', rec['path'])] = \
+            (image_writer._hash(rec['fcp']), 
+             image_writer._hash(rec.get('data')), lambda rec=rec: rec)
+    return files
+
+def _diff_data(old, new):
+    # compares the content of 2 files, in hex str (transparent) or list of 
+    # hex str (records), returning lists of bytes
+    if old is None or new is None:
+        return None
+    unhex = image_reader._unhex
+    if isinstance(old, list) and isinstance(new, list):
+        diff = []
+        for i in range(max(len(old), len(new))):
+            o = old[i] if i < len(old) else None
+            n = new[i] if i < len(new) else None
+            if o != n:
+                diff.append( (i+1, None if o is None else unhex(o), 
+                                   None if n is None else unhex(n)) )
+        return diff
+    elif isinstance(old, list) or isinstance(new, list):
+        # structure changed: whole content, list of records for a record EF
+        dec = lambda d: [unhex(r) for r in d] if isinstance(d, list) \
+                        else unhex(d)
+        return [(0, dec(old), dec(new))]
+    old, new = unhex(old), unhex(new)
+    diff, start = [], None
+    for i in range(max(len(old), len(new)) + 1):
+        same = i >= len(old) and i >= len(new) \
+            or i < len(old) and i < len(new) and old[i] == new[i]
+        if not same and start is None:
+            start = i
+        elif same and start is not None:
+            diff.append( (start, old[start:i], new[start:i]) )
+            start = None
+    return diff
+
+def diff_images(old, new, ignore=(), AID=None):
+    '''
+    diff_images(old, new, ignore=(), AID=None) -> dict
+    
+    compares 2 card images, each one being an image file name, an 
+    image_reader instance, or a list of file dictionnaries with their 
+    "Absolut Path" (e.g. self.FS after explore_DF()), and their "AID" for 
+    files under an AID; files of the lists without "AID" are taken under the
+    `AID` given (list of bytes, None for the MF), like image_writer.write()
+    does, e.g. diff_images(u.FS, 'usim.img', AID=u.AID_USIM) after 
+    u.explore_DF([], 1)
+    
+    files are matched by AID and path, and compared by the hashes of their
+    parameters and content first (kept in the index of image files), so 
+    that only the files whose hashes differ are loaded and compared in 
+    details; parameters in `ignore` are not compared
+    
+    returns a dict with:
+        "added": list of (AID, path) of the files only in the new image
+        "removed": list of (AID, path) of the files only in the old image
+        "changed": list of dict for the files that differ, with
+            "AID", "path", 
+            "fcp": {parameter: (old value, new value)}, 
+            "access": {parameter: (old value, new value)} for the access 
+                      conditions parameters (see access_keys),
+            "data": list of (offset, old bytes, new bytes) for the ranges of 
+                    bytes that differ in a transparent EF, or of (record 
+                    number, old record, new record) for a record EF, or 
+                    [(0, old content, new content)] when the EF structure 
+                    changed, or None when the content is only available in 
+                    one image
+        "unchanged": number of identical files
+    AID and path being lists of bytes (AID None for the MF), and unparsed 
+    tags as hex str (e.g. "0xC6")
+    '''
+    opened = []
+    try:
+        return _diff_files(_image_files(old, AID, opened), 
+                           _image_files(new, AID, opened), ignore)
+    finally:
+        for img in opened:
+            img.close()
+
+def _diff_files(old, new, ignore=()):
+    # compares the files returned by _image_files(), see diff_images()
+    ignore = set(['0x%.2X' % k if isinstance(k, int) else k for k in ignore])
+    unhex = image_reader._unhex
+    def loc(key):
+        aid, path = key.split('/')
+        return (None if aid == 'MF' else unhex(aid), unhex(path))
+    #
+    ret = {'added': [loc(k) for k in sorted(new) if k not in old],
+           'removed': [loc(k) for k in sorted(old) if k not in new],
+           'changed': [],
+           'unchanged': 0}
+    for key in sorted(old):
+        if key not in new:
+            continue
+        o, n = old[key], new[key]
+        if o[:2] == n[:2]:
+            ret['unchanged'] += 1
+            continue
+        ro, rn = o[2](), n[2]()
+        fcp, access, data = {}, {}, []
+        if o[0] != n[0]:
+            for k in set(ro['fcp']) | set(rn['fcp']):
+                if k not in ignore and ro['fcp'].get(k) != rn['fcp'].get(k):
+                    if k in access_keys:
+                        access[k] = (ro['fcp'].get(k), rn['fcp'].get(k))
+                    else:
+                        fcp[k] = (ro['fcp'].get(k), rn['fcp'].get(k))
+        if o[1] != n[1]:
+            data = _diff_data(ro.get('data'), rn.get('data'))
+        if fcp or access or data != []:
+            aid, path = loc(key)
+            ret['changed'].append({'AID': aid, 'path': path, 'fcp': fcp, 
+                                   'access': access, 'data': data})
+        else:
+            ret['unchanged'] += 1
+    return ret
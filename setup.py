@@ -15,7 +15,8 @@ setup(
     
     # optional dependency
     extras_require={
-        'graph': ['pydot', 'graphviz']
+        'graph': ['pydot', 'graphviz'],
+        'analytics': ['numpy']
         },
     
     author="Benoit Michau",
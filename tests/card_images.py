@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# small USIM card image for the
+# tests, to be written with
+# image_writer and answered by
+# card.emul.virtual_card
+#################################
+
+from card.utils import image_writer
+
+ATR = [0x3B, 0x9F, 0x96, 0x80, 0x1F, 0xC7]
+USIM_AID = [0xA0, 0x00, 0x00, 0x00, 0x87, 0x10, 0x02, 0xFF, 0x33, 0xFF,
+            0xFF, 0x89]
+ICCID = '8933016667000000001'
+IMSI = [0x08, 0x09, 0x10, 0x10, 0x10, 0x32, 0x54, 0x76, 0x98]
+
+
+def DF(path, AID=None):
+    fil = {'Type': 'DF', 'File Identifier': path[-2:], 'Absolut Path': path,
+           'File Descriptor': [0x78, 0x21]}
+    if AID:
+        fil['AID'] = AID
+    return fil
+
+def EF_transparent(path, data, SFI=None, AID=None):
+    fil = {'Type': 'EF working', 'Structure': 'transparent',
+           'File Identifier': path[-2:], 'Absolut Path': path,
+           'File Descriptor': [0x41, 0x21], 'Size': len(data), 'Data': data}
+    if SFI is not None:
+        fil['Short File Identifier'] = [SFI << 3]
+    if AID:
+        fil['AID'] = AID
+    return fil
+
+def EF_records(path, records, reclen, num, AID=None, struct='linear fixed'):
+    # `records` first records, the following `num` - len(records) being empty
+    fd = 0x46 if struct == 'cyclic' else 0x42
+    fil = {'Type': 'EF working', 'Structure': struct,
+           'File Identifier': path[-2:], 'Absolut Path': path,
+           'File Descriptor': [fd, 0x21, 0x00, reclen, num],
+           'Size': reclen * num, 'Record Length': reclen,
+           'Data': [rec + (reclen - len(rec)) * [0xFF] for rec in records] \
+                 + (num - len(records)) * [reclen * [0xFF]]}
+    if AID:
+        fil['AID'] = AID
+    return fil
+
+def ADN(num):
+    # ADN record: alpha identifier and dialling number
+    name = [ord(c) for c in 'contact %i' % num]
+    return name + [0xFF] * (16 - len(name)) + \
+           [0x06, 0x81, 0x10, 0x32, 0x54, 0x76, 0x98] + 7 * [0xFF]
+
+def files():
+    """
+    returns the list of the file dictionnaries of the card: a DF_TELECOM
+    with EF_ADN and DF_PHONEBOOK, DF_GSM, and a USIM ADF with EF_IMSI,
+    EF_UST, EF_LOCI and DF_PHONEBOOK
+    """
+    return [
+        EF_transparent([0x2F, 0xE2], [0x98, 0x33, 0x10, 0x66, 0x76, 0x00,
+                                      0x00, 0x00, 0x00, 0xF1]),
+        DF([0x7F, 0x10]),
+        EF_records([0x7F, 0x10, 0x6F, 0x3A], [ADN(i) for i in range(1, 6)],
+                   30, 20),
+        DF([0x7F, 0x10, 0x5F, 0x3A]),
+        EF_records([0x7F, 0x10, 0x5F, 0x3A, 0x4F, 0x30],
+                   [[0xA8, 0x05, 0xC0, 0x03, 0x4F, 0x3A, 0x01]], 10, 4),
+        DF([0x7F, 0x20]),
+        EF_transparent([0x6F, 0x07], IMSI, 0x07, USIM_AID),
+        EF_transparent([0x6F, 0x38], [0x9E, 0x6B, 0x1D, 0x9C, 0x0C, 0x00],
+                       0x04, USIM_AID),
+        EF_transparent([0x6F, 0x7E], [0xFF, 0xFF, 0xFF, 0xFF, 0x00, 0xF1,
+                                      0x10, 0x00, 0x01, 0xFF, 0x01],
+                       0x0B, USIM_AID),
+        DF([0x5F, 0x3A], USIM_AID),
+        EF_records([0x5F, 0x3A, 0x4F, 0x30],
+                   [[0xA8, 0x05, 0xC0, 0x03, 0x4F, 0x3A, 0x01]], 10, 4,
+                   USIM_AID),
+        ]
+
+def write_image(filename, fs=None, **info):
+    """
+    writes the card image `filename` with the files `fs` (by default,
+    files()), and returns its file name
+    """
+    info.setdefault('ICCID', ICCID)
+    img = image_writer(filename, ATR, [USIM_AID],
+                       AID_USIM=image_writer._hex(USIM_AID), **info)
+    for fil in files() if fs is None else fs:
+        img.write(fil, fil.get('AID'))
+    img.close()
+    return filename
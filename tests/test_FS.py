@@ -0,0 +1,120 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# FS catalogues lookups
+#################################
+
+import unittest
+
+from card.FS import catalogue, FS_catalogue, MF_FS
+from card.ICC import ISO7816
+
+
+class catalogue_test(unittest.TestCase):
+
+    def test_cached(self):
+        self.assertIs(catalogue('MF'), catalogue('MF'))
+        self.assertIsInstance(catalogue('USIM'), FS_catalogue)
+
+    def test_MF(self):
+        cat = catalogue('MF')
+        self.assertEqual(cat.path('EF_ICCID'), (0x2F, 0xE2))
+        self.assertEqual(cat.name((0x7F, 0x10, 0x6F, 0x3A)), 'EF_ADN')
+        self.assertEqual(cat.parent((0x7F, 0x10, 0x6F, 0x3A)), (0x7F, 0x10))
+        self.assertIn((0x7F, 0x10, 0x6F, 0x3A), cat.candidates((0x6F, 0x3A)))
+        self.assertIn((0x7F, 0x10), cat.children(()))
+        self.assertNotIn((0x3F, 0x00), cat.children(()))
+        self.assertIsNone(cat.name((0x12, 0x34)))
+        self.assertEqual(cat.children((0x12, 0x34)), [])
+
+    def test_floating_DF(self):
+        # DF_PHONEBOOK under the MF and DF_TELECOM, and in the DF catalogue
+        cat = catalogue('MF')
+        self.assertEqual(cat.name((0x5F, 0x3A)), 'DF_PHONEBOOK')
+        self.assertEqual(cat.name((0x7F, 0x10, 0x5F, 0x3A)), 'DF_PHONEBOOK')
+        self.assertEqual(cat.path('DF_PHONEBOOK'), (0x5F, 0x3A))
+        self.assertIn((0x5F, 0x3A), catalogue('DF').children(()))
+        self.assertEqual(catalogue('USIM').name((0x5F, 0x3A, 0x4F, 0x30)), 
+                         'EF_PBR')
+
+    def test_USIM(self):
+        cat = catalogue('USIM')
+        self.assertEqual(cat.path('EF_IMSI'), (0x6F, 0x07))
+        self.assertEqual(cat.name((0x6F, 0x07)), 'EF_IMSI')
+        self.assertNotIn([0x7F, 0xFF], cat.known_paths())
+
+    def test_structure(self):
+        cat = catalogue('MF')
+        self.assertEqual(cat.structure((0x7F, 0x10)), 'DF')
+        self.assertEqual(cat.structure((0x2F, 0xE2)), 'transparent')
+        self.assertEqual(cat.structure((0x7F, 0x10, 0x6F, 0x3A)), 
+                         'linear fixed')
+        self.assertIsNone(cat.structure((0x12, 0x34)))
+        self.assertEqual(catalogue('USIM').structure((0x6F, 0x07)), 
+                         'transparent')
+
+    def test_known_paths(self):
+        cat = catalogue('MF')
+        paths = cat.known_paths(1)
+        self.assertTrue(paths and all([len(p) == 2 for p in paths]))
+        self.assertEqual(paths, sorted(paths))
+        self.assertEqual(len(cat.known_paths()), len(cat))
+        for addr in MF_FS:
+            if len(addr) % 2 == 0 and addr != (0x3F, 0x00):
+                self.assertIn(list(addr), cat.known_paths())
+
+
+class blacklist_test(unittest.TestCase):
+
+    def setUp(self):
+        # without card, nor explored directory structure
+        self.card = ISO7816.__new__(ISO7816)
+        self.card.dbg = 0
+
+    def blacklist(self, DF_path, under_AID=None):
+        return sorted(map(tuple, self.card.make_blacklist(DF_path, under_AID)))
+
+    def test_catalogue(self):
+        # the DF known next to DF_TELECOM
+        BL = self.blacklist([0x7F, 0x10])
+        for DF in ((0x3F, 0x00), (0x7F, 0xFF), (0x7F, 0x10), (0x7F, 0x20)):
+            self.assertIn(DF, BL)
+        # not DF_PHONEBOOK, which is also under DF_TELECOM
+        self.assertNotIn((0x5F, 0x3A), BL)
+        self.assertEqual(self.blacklist([0x7F, 0x10, 0x5F, 0x3A]),
+                         [(0x3F, 0x00), (0x3F, 0xFF), (0x5F, 0x3A),
+                          (0x7F, 0x10), (0x7F, 0xFF)])
+        # the DF known next to DF_PHONEBOOK in the USIM ADF
+        BL = self.blacklist([0x5F, 0x3A], 1)
+        self.assertIn((0x5F, 0x40), BL)
+        self.assertNotIn((0x5F, 0x3B), BL)
+
+    def test_explored(self):
+        # the directory structure explored replaces the catalogue
+        self.card._MF_struct = {(): [[0x7F, 0x10], [0x7F, 0x21]]}
+        self.assertEqual(self.blacklist([0x7F, 0x10]),
+                         [(0x3F, 0x00), (0x3F, 0xFF), (0x7F, 0x10),
+                          (0x7F, 0x21), (0x7F, 0xFF)])
+
+
+if __name__ == '__main__':
+    unittest.main()
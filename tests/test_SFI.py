@@ -0,0 +1,115 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# EF read by Short File 
+# Identifier, without SELECT
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.utils import file_record
+from card.emul import virtual_card
+from card_images import write_image, USIM_AID, IMSI
+
+
+class SFI_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.vc = virtual_card(write_image(os.path.join(self.dir, 'u.img')))
+        self.u = USIM(reader=self.vc)
+        self.u.dbg = 0
+        self.ADF = self.vc.ADF[tuple(USIM_AID)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def card_data(self, fid):
+        # content of the EF on the virtual card
+        return self.ADF.children[tuple(fid)].data
+
+    def commands(self, n):
+        # names of the last `n` commands sent
+        return [c[0].split(' apdu')[0] for c in self.u.coms.apdu_stack][-n:]
+
+    def test_read_by_SFI(self):
+        u = self.u
+        u.select_by_aid(1)
+        u.select([0x6F, 0x38])
+        # SFI from the FS tables: READ BINARY only, file parameters reduced
+        n = self.vc.apdus
+        fil = u.read_by_SFI([0x6F, 0x07])
+        self.assertIsInstance(fil, file_record)
+        self.assertEqual(fil['Data'], IMSI)
+        self.assertEqual(fil['Short File Identifier'], [0x07 << 3])
+        self.assertEqual(self.commands(self.vc.apdus - n), 
+                         (self.vc.apdus - n) * ['READ BINARY'])
+        self.assertEqual(u._sel[2], (0x6F, 0x07))
+        # record EF in the FS catalogue: selected
+        u.select([0x5F, 0x3A])
+        self.assertEqual(u.read_by_SFI([0x4F, 0x30])['Record Length'], 10)
+        # from the ADF root again
+        u.select([0x7F, 0xFF])
+        self.assertEqual(u.read_by_SFI([0x6F, 0x7E])['Data'], 
+                         self.card_data([0x6F, 0x7E]))
+        self.assertEqual(self.commands(1), ['READ BINARY'])
+
+    def test_cached_FCP(self):
+        u = self.u
+        u.enable_cache()
+        u.select_by_aid(1)
+        ref = u.select([0x6F, 0x07])
+        u.cache.invalidate()
+        u.cache.put_FCP((tuple(USIM_AID), (), (0x6F, 0x07)), ref)
+        u.select([0x6F, 0x38])
+        n = self.vc.apdus
+        fil = u.read_by_SFI([0x6F, 0x07])
+        self.assertEqual(self.vc.apdus - n, 1)
+        self.assertEqual(dict(fil), dict(ref))
+
+    def test_cache_hit(self):
+        u = self.u
+        u.enable_cache()
+        u.select_by_aid(1)
+        ref = u.select([0x6F, 0x07])
+        u.select([0x6F, 0x38])
+        # content cached: no command sent, the current EF does not change
+        n = self.vc.apdus
+        fil = u.read_by_SFI([0x6F, 0x07])
+        self.assertEqual(self.vc.apdus, n)
+        self.assertEqual(fil['Data'], ref['Data'])
+        self.assertEqual(u._sel[2], (0x6F, 0x38))
+        # hence this writes EF_UST
+        u.update_binary([0x01, 0x02])
+        self.assertEqual(self.card_data([0x6F, 0x38])[:2], [0x01, 0x02])
+        self.assertEqual(self.card_data([0x6F, 0x07]), IMSI)
+        for fid in ([0x6F, 0x38], [0x6F, 0x07]):
+            self.assertEqual(u.read_by_SFI(fid)['Data'], self.card_data(fid))
+            self.assertEqual(u.select(fid)['Data'], self.card_data(fid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# DF selectable at several paths
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.ICC import UICC
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image, DF, EF_records
+
+PBR = [[0xA8, 0x05, 0xC0, 0x03, 0x4F, 0x3A, 0x01]]
+
+
+def phonebooks(name=None):
+    # DF_PHONEBOOK with the same EF_PBR under DF_TELECOM and DF_GSM
+    fs = []
+    for df in ([0x7F, 0x10], [0x7F, 0x20]):
+        fs.append(DF(df))
+        fs.append(DF(df + [0x5F, 0x3A]))
+        if name:
+            fs[-1]['DF Name'] = name
+        fs.append(EF_records(df + [0x5F, 0x3A, 0x4F, 0x30], PBR, 10, 4))
+    return fs
+
+
+class alias_test(unittest.TestCase):
+
+    def uicc(self, fs):
+        u = UICC(reader=virtual_card(fs))
+        u.dbg = 0
+        u.detect_aliases = True
+        u._MF_struct = {(): [[0x7F, 0x10], [0x7F, 0x20]]}
+        for df in ([0x7F, 0x10], [0x7F, 0x20]):
+            u.explore_DF(df, recursive=2)
+        return u, dict([(tuple(f['Absolut Path']), f) for f in u.FS])
+
+    def test_same_parameters(self):
+        # DF with the same file id and descriptor only: distinct DF
+        u, FS = self.uicc(phonebooks())
+        self.assertIn((0x7F, 0x20, 0x5F, 0x3A, 0x4F, 0x30), FS)
+        self.assertNotIn('Alias of', FS[(0x7F, 0x20, 0x5F, 0x3A)])
+        self.assertEqual(u._MF_struct[(0x7F, 0x20)], [[0x5F, 0x3A]])
+        self.assertIn((0x7F, 0x20, 0x5F, 0x3A), u._MF_struct)
+
+    def test_same_name(self):
+        # DF with the same name and children: not scanned again, recorded
+        u, FS = self.uicc(phonebooks([0xA0, 0x00, 0x00, 0x00, 0x01]))
+        self.assertNotIn((0x7F, 0x20, 0x5F, 0x3A, 0x4F, 0x30), FS)
+        self.assertEqual(FS[(0x7F, 0x20, 0x5F, 0x3A)]['Alias of'],
+                         [0x7F, 0x10, 0x5F, 0x3A])
+        self.assertEqual(u._MF_struct[(0x7F, 0x20)], [[0x5F, 0x3A]])
+        self.assertNotIn((0x7F, 0x20, 0x5F, 0x3A), u._MF_struct)
+
+
+class ADF_alias_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = write_image(os.path.join(self.dir, 'u.img'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_ADF(self):
+        # DF under the MF, and the ADF itself, are selectable from the ADF
+        u = USIM(reader=virtual_card(self.image))
+        u.dbg = 0
+        u.detect_aliases = True
+        u.explore_DF([], 1, True, early_exit=True)
+        FS = dict([(tuple(f['Absolut Path']), f) for f in u.FS])
+        self.assertIn((0x5F, 0x3A, 0x4F, 0x30), FS)
+        self.assertIn((0x7F, 0x10, 0x6F, 0x3A), FS)
+        # the current ADF is never selected, the ADF file id is an alias
+        self.assertFalse([p for p in FS if p[-2:] == (0x7F, 0xFF)])
+        self.assertEqual(FS[(0x7F, 0xF0)]['Alias of'], [])
+        self.assertIn([0x7F, 0xF0], u._AID1_struct[()])
+
+
+if __name__ == '__main__':
+    unittest.main()
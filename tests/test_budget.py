@@ -0,0 +1,86 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# pacing of the APDU sent
+#################################
+
+import unittest
+
+from card.utils import apdu_budget
+
+OK = (0x90, 0x00)
+SELECT, READ_RECORD = 0xA4, 0xB2
+
+
+class budget_test(unittest.TestCase):
+
+    def test_count(self):
+        budget = apdu_budget(max_apdu=3)
+        for i in range(3):
+            self.assertFalse(budget.exhausted())
+            budget.record(0.001, OK, SELECT)
+        self.assertTrue(budget.exhausted())
+
+    def test_mixed_instructions(self):
+        # fast SELECT and slow READ RECORD: the usual pace of the card
+        budget = apdu_budget()
+        for i in range(200):
+            budget.record(0.001, OK, SELECT)
+            budget.record(0.040, OK, READ_RECORD)
+            self.assertEqual(budget.delay, 0.0)
+
+    def test_mixed_latencies(self):
+        # short and long responses to the same instruction, e.g. records of
+        # different lengths: the delay stays bounded
+        budget = apdu_budget()
+        delays = []
+        for i in range(500):
+            budget.record(0.020 if i % 5 == 0 else 0.001, OK, READ_RECORD)
+            delays.append(budget.delay)
+        self.assertLessEqual(max(delays), 0.02)
+        self.assertEqual(budget.delay, 0.0)
+
+    def test_slow_down(self):
+        budget = apdu_budget(max_delay=0.5)
+        for i in range(50):
+            budget.record(0.001, OK, SELECT)
+        # the card becomes slower: the delay grows, then shrinks back once
+        # the slower pace is the usual one
+        delays = []
+        for i in range(200):
+            budget.record(0.010, OK, SELECT)
+            delays.append(budget.delay)
+        self.assertGreater(max(delays), 0.01)
+        self.assertLessEqual(max(delays), 0.5)
+        self.assertEqual(budget.delay, 0.0)
+
+    def test_throttle(self):
+        budget = apdu_budget(max_delay=0.1)
+        for i in range(10):
+            budget.record(0.001, (0x6F, 0x00), SELECT)
+        self.assertEqual(budget.delay, 0.1)
+        for i in range(20):
+            budget.record(0.001, OK, SELECT)
+        self.assertEqual(budget.delay, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
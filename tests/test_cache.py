@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# selection tracking and session
+# cache, against a virtual card
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image, USIM_AID, IMSI
+
+
+class cache_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.vc = virtual_card(write_image(os.path.join(self.dir, 'u.img')))
+        self.u = USIM(reader=self.vc)
+        self.u.dbg = 0
+        self.ADF = self.vc.ADF[tuple(USIM_AID)]
+        self.TELECOM = self.vc.MF.children[(0x7F, 0x10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_select_context(self):
+        u, aid = self.u, tuple(USIM_AID)
+        u.select([0x3F, 0x00])
+        u.select([0x7F, 0x10])
+        self.assertEqual(u._sel, (None, (0x7F, 0x10), None))
+        u.select([0x5F, 0x3A])
+        self.assertEqual(u._sel, (None, (0x7F, 0x10, 0x5F, 0x3A), None))
+        u.select([0x4F, 0x30])
+        self.assertEqual(u._sel, (None, (0x7F, 0x10, 0x5F, 0x3A), 
+                                  (0x4F, 0x30)))
+        # parent DF, then sibling DF of DF_TELECOM
+        u.select([0x7F, 0x10])
+        self.assertEqual(u._sel, (None, (0x7F, 0x10), None))
+        self.assertIsNotNone(u.select([0x7F, 0x20]))
+        self.assertEqual(u._sel, (None, (0x7F, 0x20), None))
+        # USIM ADF, and DF_TELECOM from its root
+        u.select_by_aid(1)
+        self.assertEqual(u._sel, (aid, (), None))
+        u.select([0x6F, 0x07])
+        self.assertEqual(u._sel, (aid, (), (0x6F, 0x07)))
+        u.select([0x5F, 0x3A])
+        self.assertEqual(u._sel, (aid, (0x5F, 0x3A), None))
+        u.select([0x7F, 0xFF])
+        self.assertEqual(u._sel, (aid, (), None))
+        u.select([0x7F, 0x10])
+        self.assertEqual(u._sel, (None, (0x7F, 0x10), None))
+
+    def test_cache(self):
+        u = self.u
+        cache = u.enable_cache()
+        u.select_by_aid(1)
+        u.select([0x6F, 0x07])
+        self.assertEqual(cache.stats()['misses'], 1)
+        # content cached: SELECT and GET RESPONSE only
+        n = self.vc.apdus
+        self.assertEqual(u.select([0x6F, 0x07])['Data'], IMSI)
+        self.assertEqual(self.vc.apdus - n, 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+        # written through
+        u.update_binary([0x01, 0x02], 3)
+        self.assertEqual(self.ADF.children[(0x6F, 0x07)].data[3:5], 
+                         [0x01, 0x02])
+        self.assertEqual(u.select([0x6F, 0x07])['Data'], 
+                         self.ADF.children[(0x6F, 0x07)].data)
+        u.disable_cache()
+        self.assertEqual(u.select([0x6F, 0x07])['Data'], 
+                         self.ADF.children[(0x6F, 0x07)].data)
+
+    def test_cache_records(self):
+        u = self.u
+        u.enable_cache()
+        u.empty_records = True
+        u.select([0x7F, 0x10])
+        u.select([0x6F, 0x3A])
+        rec = [0x41] * 30
+        self.assertEqual(u.UPDATE_RECORD(7, 0x04, rec)[2], (0x90, 0x00))
+        u.select([0x3F, 0x00])
+        n = self.vc.apdus
+        u.select([0x7F, 0x10])
+        fil = u.select([0x6F, 0x3A])
+        # SELECT and GET RESPONSE only
+        self.assertEqual(self.vc.apdus - n, 4)
+        self.assertEqual(fil['Data'][6], rec)
+        self.assertEqual(fil['Data'], 
+                         self.TELECOM.children[(0x6F, 0x3A)].data)
+
+
+if __name__ == '__main__':
+    unittest.main()
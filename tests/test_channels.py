@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# class byte encoding of the
+# logical channels
+#################################
+
+import unittest
+
+from card.ICC import ISO7816
+
+
+class channel_CLA_test(unittest.TestCase):
+
+    def test_first_interindustry(self):
+        self.assertEqual(ISO7816.channel_CLA(0x00, 0), 0x00)
+        self.assertEqual(ISO7816.channel_CLA(0x00, 3), 0x03)
+        self.assertEqual(ISO7816.channel_CLA(0x80, 2), 0x82)
+        # secure messaging, command chaining
+        self.assertEqual(ISO7816.channel_CLA(0x0C, 1), 0x0D)
+        self.assertEqual(ISO7816.channel_CLA(0x10, 1), 0x11)
+
+    def test_further_interindustry(self):
+        self.assertEqual(ISO7816.channel_CLA(0x00, 4), 0x40)
+        self.assertEqual(ISO7816.channel_CLA(0x00, 19), 0x4F)
+        self.assertEqual(ISO7816.channel_CLA(0x80, 5), 0xC1)
+        self.assertEqual(ISO7816.channel_CLA(0x10, 4), 0x50)
+
+    def test_secure_messaging(self):
+        # SM indication kept from one class to the other
+        self.assertEqual(ISO7816.channel_CLA(0x08, 4), 0x60)
+        self.assertEqual(ISO7816.channel_CLA(0x0C, 7), 0x63)
+        self.assertEqual(ISO7816.channel_CLA(0x88, 19), 0xEF)
+        self.assertEqual(ISO7816.channel_CLA(0x60, 0), 0x08)
+        self.assertEqual(ISO7816.channel_CLA(0x60, 6), 0x62)
+        self.assertEqual(ISO7816.channel_CLA(0x40, 2), 0x02)
+
+    def test_other_class(self):
+        # SIM class, not interindustry
+        self.assertEqual(ISO7816.channel_CLA(0xA0, 0), 0xA0)
+        self.assertEqual(ISO7816.channel_CLA(0xA0, 1), 0xA1)
+        self.assertEqual(ISO7816.channel_CLA(0xA0, 3), 0xA3)
+        self.assertRaises(ValueError, ISO7816.channel_CLA, 0xA0, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
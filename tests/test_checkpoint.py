@@ -0,0 +1,93 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# interrupted and resumed
+# filesystem explorations
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.utils import apdu_budget
+from card.emul import virtual_card
+from card_images import write_image
+
+
+class checkpoint_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = write_image(os.path.join(self.dir, 'u.img'))
+        self.checkpoint = os.path.join(self.dir, 'scan.ckpt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def usim(self):
+        u = USIM(reader=virtual_card(self.image))
+        u.dbg = 0
+        # DF_TELECOM, DF_GSM and the USIM ADF under the MF
+        u._MF_struct = {(): [[0x7F, 0x10], [0x7F, 0x20], [0x7F, 0xF0]]}
+        return u
+
+    def explore(self, u, **kwargs):
+        u.explore_DF([0x7F, 0x10], recursive=2, early_exit=True, **kwargs)
+
+    def dump(self, u):
+        return [(f['Absolut Path'], f.get('Data')) for f in u.FS], \
+               u._MF_struct
+
+    def test_resume(self):
+        u = self.usim()
+        self.explore(u)
+        full = self.dump(u)
+        for max_apdu in (40, 500, 900):
+            u = self.usim()
+            u.budget = apdu_budget(max_apdu)
+            self.explore(u, checkpoint=self.checkpoint)
+            self.assertTrue(u.budget.exhausted())
+            self.assertLess(len(u.FS), len(full[0]))
+            # from another session, after a restart
+            u = self.usim()
+            u.resume_explore(self.checkpoint)
+            self.assertEqual(self.dump(u), full)
+
+    def test_resume_twice(self):
+        u = self.usim()
+        self.explore(u)
+        full = self.dump(u)
+        u = self.usim()
+        u.budget = apdu_budget(300)
+        self.explore(u, checkpoint=self.checkpoint)
+        u = self.usim()
+        u.budget = apdu_budget(300)
+        u.resume_explore(self.checkpoint)
+        self.assertTrue(u.budget.exhausted())
+        u = self.usim()
+        u.resume_explore(self.checkpoint)
+        self.assertEqual(self.dump(u), full)
+
+
+if __name__ == '__main__':
+    unittest.main()
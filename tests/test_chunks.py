@@ -0,0 +1,92 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# transparent EF larger than one
+# READ / UPDATE BINARY command
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image, files, DF, EF_transparent
+
+# EF_IMG instance data file of 600 bytes, in DF_GRAPHICS
+IMG = [i & 0xFF for i in range(600)]
+
+
+class chunk_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        fs = files() + [DF([0x7F, 0x10, 0x5F, 0x50]), 
+                        EF_transparent([0x7F, 0x10, 0x5F, 0x50, 0x4F, 0x01],
+                                       IMG)]
+        self.vc = virtual_card(write_image(os.path.join(self.dir, 'u.img'), 
+                                           fs))
+        self.u = USIM(reader=self.vc)
+        self.u.dbg = 0
+        self.EF = self.vc.MF.children[(0x7F, 0x10)].children[(0x5F, 0x50)]\
+                  .children[(0x4F, 0x01)]
+        self.u.go_to_path([0x7F, 0x10, 0x5F, 0x50])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def commands(self, n):
+        # names of the last `n` commands sent
+        return [c[0].split(' apdu')[0] for c in self.u.coms.apdu_stack][-n:]
+
+    def test_read(self):
+        n = self.vc.apdus
+        fil = self.u.select([0x4F, 0x01])
+        self.assertEqual(fil['Data'], IMG)
+        # SELECT, GET RESPONSE, and 3 READ BINARY of 255, 255 and 90 bytes
+        self.assertEqual(self.vc.apdus - n, 5)
+        self.assertEqual(self.commands(3), 3 * ['READ BINARY'])
+
+    def test_read_chunk_size(self):
+        self.u.chunk_size = 100
+        self.u.coms.apdu_stack.clear()
+        self.assertEqual(self.u.select([0x4F, 0x01])['Data'], IMG)
+        self.assertEqual(self.commands(6), 6 * ['READ BINARY'])
+        self.assertEqual(self.u.read_binary(80, 520), IMG[520:])
+        self.assertIsNone(self.u.read_binary(10, 600))
+        # less bytes available than requested: end of file
+        self.assertEqual(self.u.read_binary(10, 595), IMG[595:])
+        self.assertEqual(self.u.read_binary(150, 520), IMG[520:])
+
+    def test_update(self):
+        self.u.select([0x4F, 0x01])
+        data = [0xA5] * 520
+        ret = self.u.update_binary(data, 40)
+        self.assertEqual(ret[2], (0x90, 0x00))
+        self.assertEqual(self.commands(3), 3 * ['UPDATE BINARY'])
+        self.assertEqual(self.EF.data, IMG[:40] + data + IMG[560:])
+        self.assertEqual(self.u.select([0x4F, 0x01])['Data'], self.EF.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
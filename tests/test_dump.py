@@ -0,0 +1,112 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# USIM dumps made without brute
+# forcing all file addresses
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.utils import image_reader, layout_cache
+from card.emul import virtual_card
+from card_images import write_image
+
+
+class failing_card(virtual_card):
+    # virtual card removed from the reader after `limit` commands
+    limit = 0x6000
+
+    def transmit(self, apdu):
+        if self.apdus >= self.limit:
+            raise IOError('card removed')
+        return virtual_card.transmit(self, apdu)
+
+
+class dump_test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        cls.image = write_image(os.path.join(cls.dir, 'u.img'))
+        # the complete dump, brute forcing all addresses, made once
+        cls.full, n = cls.dump('full.img')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    @classmethod
+    def dump(cls, filename, **kwargs):
+        """
+        dumps the USIM of the virtual card into the card image `filename`
+        returns the dict {(AID, path): JSON file line} of the image, and the
+        number of commands sent
+        """
+        vc = virtual_card(cls.image)
+        u = USIM(reader=vc)
+        u.dbg = 0
+        n = vc.apdus
+        filename = os.path.join(cls.dir, filename)
+        u.explore_fs(filename, image=True, **kwargs)
+        img = image_reader(filename)
+        recs = dict([((r['AID'], r['path']), r) for r in img.records()])
+        img.close()
+        return recs, vc.apdus - n
+
+    def test_layout(self):
+        layout = layout_cache(os.path.join(self.dir, 'layout.json'))
+        # unknown card model: brute forced, and stored
+        recs, n = self.dump('l1.img', layout=layout)
+        self.assertEqual(recs, self.full)
+        self.assertTrue(os.path.exists(layout.filename))
+        # known card model, from the layout file
+        layout = layout_cache(layout.filename)
+        recs, n = self.dump('l2.img', layout=layout)
+        self.assertEqual(recs, self.full)
+        self.assertLess(n, 200)
+
+    def test_known_only(self):
+        recs, n = self.dump('k.img', known_only=True)
+        self.assertLess(n, 200)
+        # the files listed in the FS tables, as in the complete dump
+        paths = sorted([k[1] for k in recs])
+        self.assertEqual(paths, ['', '5F3A', '5F3A4F30', '6F07', '6F38',
+                                 '6F7E'])
+        for k in recs:
+            self.assertEqual(recs[k], self.full[k])
+
+    def test_interrupted(self):
+        # the files found before the error are in the image
+        u = USIM(reader=failing_card(self.image))
+        u.dbg = 0
+        filename = os.path.join(self.dir, 'i.img')
+        self.assertRaises(IOError, u.explore_fs, filename, image=True)
+        img = image_reader(filename)
+        self.assertEqual(img.paths(u.AID_USIM), [[0x5F, 0x3A]])
+        img.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# file records: dict behaviour,
+# storage and image round trip
+#################################
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+from card.utils import file_record, image_reader
+from card_images import write_image, files, EF_records, ADN
+
+
+def ADN_file(num=250):
+    fil = EF_records([0x7F, 0x10, 0x6F, 0x3A], [ADN(i) for i in range(num)],
+                     30, num)
+    fil.update({'Control': 'FCP', 'Access': 'shareable', 
+                'Record Number': num, 'UICC characteristics': 0x71,
+                'Security Attributes ref to expand': [0x6F, 0x06, 0x02],
+                'Life Cycle Status': 'operational state - activated'})
+    return fil
+
+def allocated(build):
+    # memory allocated by the object returned by build()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size
+
+
+class file_record_test(unittest.TestCase):
+
+    def test_dict(self):
+        fil = ADN_file()
+        rec = file_record(fil)
+        self.assertEqual(dict(rec), fil)
+        self.assertEqual(rec['Data'], fil['Data'])
+        self.assertEqual(rec['Data'][0], ADN(0))
+        # the usual parameters are all in slots
+        self.assertIsNone(rec._extra)
+        self.assertEqual(rec.data[0], bytes(bytearray(ADN(0))))
+        rec['Proprietary'] = [0x80, 0x01]
+        self.assertEqual(rec._extra, {'Proprietary': [0x80, 0x01]})
+        del rec['Data']
+        self.assertNotIn('Data', rec)
+        self.assertRaises(KeyError, rec.__getitem__, 'Data')
+        self.assertEqual(rec.copy(), rec)
+        self.assertEqual(pickle.loads(pickle.dumps(rec)), rec)
+
+    def test_data(self):
+        rec = file_record()
+        for data in ([], [0x01, 0xFF], [[0x01], [0xFF, 0xFF]], [[]], None,
+                     [256], 'text'):
+            rec['Data'] = data
+            self.assertEqual(rec['Data'], data)
+        # a new list on each access
+        rec['Data'] = [0x01, 0x02]
+        rec['Data'].append(0x03)
+        self.assertEqual(rec['Data'], [0x01, 0x02])
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc not available')
+    def test_memory(self):
+        as_dict = allocated(ADN_file)
+        as_record = allocated(lambda: file_record(ADN_file()))
+        self.assertLess(as_record, as_dict // 2)
+
+    def test_image(self):
+        dir = tempfile.mkdtemp()
+        try:
+            fs = files() + [ADN_file()]
+            fs[-1]['Absolut Path'] = [0x7F, 0x10, 0x6F, 0x3B]
+            fs[-1]['File Identifier'] = [0x6F, 0x3B]
+            img = image_reader(write_image(os.path.join(dir, 'r.img'), fs))
+            try:
+                for fil in fs:
+                    rec = img.get(fil['Absolut Path'], fil.get('AID'))
+                    self.assertIsInstance(rec, file_record)
+                    self.assertEqual(rec.get('Data'), fil.get('Data'))
+                    self.assertEqual(rec['Absolut Path'], fil['Absolut Path'])
+            finally:
+                img.close()
+        finally:
+            shutil.rmtree(dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
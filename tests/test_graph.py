@@ -0,0 +1,114 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# graph of the filesystem, in the
+# DOT language or as a JSON tree
+#################################
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from card.utils import write_graph, graph_writer, image_reader
+from card_images import files, write_image
+
+AID = 'A0000000871002FF33FFFF89'
+
+
+class graph_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def graph(self, FS, **kwargs):
+        # returns the number of files written, and the graph file content
+        filename = os.path.join(self.dir, 'g')
+        n = write_graph(FS, filename, **kwargs)
+        with open(filename) as fd:
+            return n, fd.read()
+
+    def test_dot(self):
+        fs = files()
+        fs[2]['Name'] = 'EF_ADN'
+        n, dot = self.graph(fs)
+        self.assertEqual(n, len(fs))
+        self.assertTrue(dot.startswith('digraph G {\n'))
+        self.assertTrue(dot.endswith('}\n'))
+        self.assertIn('  nMF_7F106F3A [label="EF_ADN\\n(0x6f 0x3a)", '
+                      'fillcolor=yellow];\n', dot)
+        self.assertIn('  nMF_7F105F3A [label="(0x5f 0x3a)", '
+                      'fillcolor=blue];\n', dot)
+        lines = dot.splitlines()
+        for edge in ('master -> nMF_2FE2', 'master -> nMF_7F10',
+                     'nMF_7F10 -> nMF_7F106F3A', 'nMF_7F10 -> nMF_7F105F3A',
+                     'nMF_7F105F3A -> nMF_7F105F3A4F30',
+                     'master -> n%s_' % AID, 'n%s_ -> n%s_6F07' % (AID, AID),
+                     'n%s_5F3A -> n%s_5F3A4F30' % (AID, AID)):
+            self.assertEqual(lines.count('  %s;' % edge), 1)
+        # one node per file, plus the master and the ADF
+        self.assertEqual(len([l for l in lines if '[label=' in l]), n + 2)
+        # grouped: the ADF files in a cluster, the master out of it
+        n, dot = self.graph(fs, group=True)
+        self.assertEqual(dot.count('subgraph cluster_%s {' % AID), 1)
+        cluster = dot[dot.index('subgraph'):]
+        cluster = cluster[:cluster.index('  }\n')]
+        self.assertIn('n%s_6F7E' % AID, cluster)
+        self.assertNotIn('master', cluster)
+        self.assertNotIn('nMF_', cluster)
+
+    def test_json(self):
+        n, tree = self.graph(files(), format='json')
+        tree = json.loads(tree)
+        self.assertEqual(n, len(files()))
+        self.assertEqual(tree['type'], 'MF')
+        names = lambda node: [(c['path'], c['type']) for c in node['children']]
+        self.assertEqual(names(tree), [('2FE2', 'EF'), ('7F10', 'DF'),
+                                       ('7F20', 'DF'), ('', 'ADF')])
+        DF = tree['children'][1]
+        self.assertEqual(names(DF), [('7F106F3A', 'EF'), ('7F105F3A', 'DF')])
+        self.assertEqual(names(DF['children'][1]), [('7F105F3A4F30', 'EF')])
+        ADF = tree['children'][3]
+        self.assertEqual(ADF['AID'], AID)
+        self.assertEqual(names(ADF), [('6F07', 'EF'), ('6F38', 'EF'),
+                                      ('6F7E', 'EF'), ('5F3A', 'DF')])
+        self.assertEqual(ADF['children'][3]['children'][0]['AID'], AID)
+
+    def test_image(self):
+        # streamed from a card image, as from the list of files
+        img = image_reader(write_image(os.path.join(self.dir, 'u.img')))
+        try:
+            self.assertEqual(self.graph(img, format='json'),
+                             self.graph(files(), format='json'))
+        finally:
+            img.close()
+
+    def test_format(self):
+        self.assertRaises(ValueError, graph_writer,
+                          os.path.join(self.dir, 'g'), format='svg')
+
+
+if __name__ == '__main__':
+    unittest.main()
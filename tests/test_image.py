@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# card images: writing, reading
+# and comparison
+#################################
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from card.utils import image_writer, image_reader, diff_images
+from card_images import files, write_image, EF_records, ATR, USIM_AID, \
+                        ICCID
+
+
+class image_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = write_image(os.path.join(self.dir, 'usim.img'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        img = image_reader(self.filename)
+        self.assertEqual(img.ATR, ATR)
+        self.assertEqual(img.AID, [USIM_AID])
+        self.assertEqual(img.header['ICCID'], ICCID)
+        self.assertEqual(img.header['version'], image_writer.version)
+        fs = files()
+        self.assertEqual(len(img), len(fs))
+        for (fil, ref) in zip(img, fs):
+            self.assertEqual(dict(fil), ref)
+        # direct access by path
+        fil = img.get([0x6F, 0x07], USIM_AID)
+        self.assertEqual(fil['Data'], fs[6]['Data'])
+        self.assertEqual(img.get([0x7F, 0x10, 0x6F, 0x3A])['Data'], 
+                         fs[2]['Data'])
+        self.assertIn([0x2F, 0xE2], img)
+        self.assertIn((USIM_AID, [0x6F, 0x38]), img)
+        self.assertNotIn([0x6F, 0x07], img)
+        img.close()
+
+    def test_index(self):
+        index = json.load(open(self.filename + '.idx'))
+        self.assertEqual(index['version'], image_writer.version)
+        ref = image_reader(self.filename).index
+        # missing index
+        os.remove(self.filename + '.idx')
+        self.assertEqual(image_reader(self.filename).index, ref)
+        # version 1 index: offsets only, rebuilt
+        json.dump(dict([(k, v[0]) for (k, v) in ref.items()]), 
+                  open(self.filename + '.idx', 'w'))
+        img = image_reader(self.filename)
+        self.assertEqual(img.index, ref)
+        self.assertEqual(img.get([0x6F, 0x07], USIM_AID)['Data'], 
+                         files()[6]['Data'])
+
+    def test_diff_same(self):
+        d = diff_images(self.filename, image_reader(self.filename))
+        self.assertEqual((d['added'], d['removed'], d['changed']), 
+                         ([], [], []))
+        self.assertEqual(d['unchanged'], len(files()))
+
+    def test_diff(self):
+        fs = files()
+        # IMSI changed, EF_LOCI removed, 1 ADN record added
+        fs[6]['Data'] = fs[6]['Data'][:-1] + [0x99]
+        del fs[8]
+        fs[2]['Data'][5] = fs[2]['Data'][0][:]
+        new = write_image(os.path.join(self.dir, 'new.img'), fs)
+        d = diff_images(self.filename, new)
+        self.assertEqual(d['added'], [])
+        self.assertEqual(d['removed'], [(USIM_AID, [0x6F, 0x7E])])
+        self.assertEqual(len(d['changed']), 2)
+        self.assertEqual(d['unchanged'], len(fs) - 2)
+        changed = dict([(tuple(c['path']), c) for c in d['changed']])
+        self.assertEqual(changed[(0x6F, 0x07)]['AID'], USIM_AID)
+        self.assertEqual(changed[(0x6F, 0x07)]['data'], [(8, [0x98], [0x99])])
+        self.assertEqual(changed[(0x7F, 0x10, 0x6F, 0x3A)]['data'], 
+                         [(6, 30 * [0xFF], fs[2]['Data'][0])])
+        self.assertEqual(changed[(0x7F, 0x10, 0x6F, 0x3A)]['fcp'], {})
+
+    def test_diff_list(self):
+        # files of an ADF without "AID", as in self.FS after explore_DF()
+        FS = [dict(fil) for fil in files() if fil.get('AID')]
+        for fil in FS:
+            del fil['AID']
+        d = diff_images(FS, self.filename, AID=USIM_AID)
+        self.assertEqual(d['removed'], [])
+        self.assertEqual(d['changed'], [])
+        self.assertEqual(d['unchanged'], len(FS))
+        self.assertEqual(len(d['added']), len(files()) - len(FS))
+        # without the AID, they are taken under the MF
+        d = diff_images(FS, self.filename)
+        self.assertEqual(len(d['removed']), len(FS))
+
+    def test_diff_structure(self):
+        # EF_IMSI turned into a record EF: whole content, as lists of bytes
+        fs = files()
+        fs[6] = EF_records([0x6F, 0x07], [fs[6]['Data']], 9, 1, USIM_AID)
+        new = write_image(os.path.join(self.dir, 'new.img'), fs)
+        d = diff_images(self.filename, new)
+        self.assertEqual(len(d['changed']), 1)
+        self.assertEqual(d['changed'][0]['data'],
+                         [(0, files()[6]['Data'], fs[6]['Data'])])
+
+    def test_diff_closed(self):
+        # image files opened from their name are closed
+        closed = []
+        close = image_reader.close
+        def close_log(img):
+            closed.append(img.filename)
+            close(img)
+        image_reader.close = close_log
+        try:
+            diff_images(self.filename, files())
+        finally:
+            image_reader.close = close
+        self.assertEqual(closed, [self.filename])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# importing the library without
+# pyscard
+#################################
+
+import os
+import sys
+import subprocess
+import unittest
+
+# import time allowed for card.utils and card.ICC, in a fresh interpreter,
+# the modules being compiled already: a small multiple of the import time
+# of the standard modules they use (pyscard was taking most of it)
+import_ratio = 2
+# best of
+import_runs = 3
+
+baseline = '''
+import sys, time
+t = time.time()
+import os, re, json, hashlib, collections
+sys.stdout.write('%f' % (time.time() - t))
+'''
+
+script = '''
+import sys, time
+sys.modules['smartcard'] = None
+t = time.time()
+import card.utils, card.ICC
+sys.stdout.write('%f' % (time.time() - t))
+# the FS tables are imported when first used
+assert 'card.FS' not in sys.modules
+'''
+
+
+class import_test(unittest.TestCase):
+
+    def import_time(self, root, script):
+        # best import time of the script, in fresh interpreters
+        return min([float(subprocess.check_output([sys.executable, '-c',
+                    script], cwd=root)) for i in range(import_runs)])
+
+    def test_without_pyscard(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # compile first, for the import time not to include it
+        subprocess.call([sys.executable, '-m', 'compileall', '-q',
+                         os.path.join(root, 'card')])
+        self.assertLess(self.import_time(root, script),
+                        import_ratio * self.import_time(root, baseline))
+
+    def test_hex_helpers(self):
+        # replacing the pyscard ones
+        from card.utils import toBytes, toHexString
+        self.assertEqual(toBytes('3F 00AB'), [0x3F, 0x00, 0xAB])
+        self.assertEqual(toHexString([0x3F, 0x00, 0xAB]), '3F 00 AB')
+
+
+if __name__ == '__main__':
+    unittest.main()
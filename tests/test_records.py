@@ -0,0 +1,131 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# reading of record EF: all 
+# records at once or one by one
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image, files, ADN
+
+
+class restricted_card(virtual_card):
+    """
+    virtual card answering READ RECORD with the status word `sw` for the
+    mode `mode` (P2 & 7, or any mode if None), from the record `first`
+    """
+
+    def __init__(self, image, sw, mode=0x05, first=1):
+        virtual_card.__init__(self, image)
+        self.sw, self.mode, self.first = sw, mode, first
+
+    def _read_record(self, st, CLA, P1, P2, data, Le):
+        if self.mode in (None, P2 & 0x07) and P1 >= self.first:
+            return [], self.sw[0], self.sw[1]
+        return virtual_card._read_record(self, st, CLA, P1, P2, data, Le)
+
+
+class records_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = write_image(os.path.join(self.dir, 'u.img'))
+        # EF_ADN: 5 records, followed by 15 empty ones
+        self.ADN = files()[2]['Data']
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ADN_file(self, card, bulk=True):
+        u = USIM(reader=card)
+        u.dbg = 0
+        u.bulk_records = bulk
+        u.select([0x3F, 0x00])
+        u.select([0x7F, 0x10])
+        n = card.apdus
+        return u, u.select([0x6F, 0x3A]), card.apdus - n
+
+    def test_bulk_single(self):
+        u1, fil1, n1 = self.ADN_file(virtual_card(self.image), True)
+        u2, fil2, n2 = self.ADN_file(virtual_card(self.image), False)
+        self.assertEqual(fil1['Data'], [ADN(i) for i in range(1, 6)])
+        self.assertEqual(fil1['Data'], fil2['Data'])
+        # SELECT, GET RESPONSE, then 3 READ RECORD (all records from P1), 
+        # or 20 READ RECORD
+        self.assertEqual((n1, n2), (5, 22))
+        self.assertTrue(u1.bulk_records)
+
+    def test_empty_records(self):
+        u, fil, n = self.ADN_file(virtual_card(self.image))
+        u.empty_records = True
+        fil = u.select([0x6F, 0x3A])
+        self.assertEqual(fil['Data'], self.ADN)
+
+    def test_range(self):
+        for bulk in (True, False):
+            u, fil, n = self.ADN_file(virtual_card(self.image), bulk)
+            self.assertEqual(u.read_records(fil, 4, 7), self.ADN[3:7])
+            self.assertEqual(u.read_records(fil, 19), self.ADN[18:])
+            self.assertEqual(u.read_records(fil, 20, 25), self.ADN[19:])
+
+    def test_bulk_unsupported(self):
+        # status words for an unsupported P2, and others used by cards
+        for sw in ((0x6A, 0x86), (0x6B, 0x00), (0x6D, 0x00), (0x6E, 0x00),
+                   (0x6A, 0x81), (0x67, 0x00), (0x69, 0x81), (0x69, 0x82)):
+            card = restricted_card(self.image, sw)
+            u, fil, n = self.ADN_file(card)
+            self.assertFalse(u.bulk_records)
+            self.assertEqual(fil['Data'], [ADN(i) for i in range(1, 6)])
+            # the next record EF
+            u.go_to_path([0x7F, 0x10, 0x5F, 0x3A])
+            self.assertEqual(u.select([0x4F, 0x30])['Data'], 
+                             [files()[4]['Data'][0]])
+
+    def test_security(self):
+        # security status not satisfied: bulk mode kept, no content
+        card = restricted_card(self.image, (0x69, 0x82), None)
+        u, fil, n = self.ADN_file(card)
+        self.assertTrue(u.bulk_records)
+        self.assertEqual(fil['Data'], [])
+        card.sw = (0x90, 0x00)
+        card.first = 0x100
+        self.assertEqual(u.select([0x6F, 0x3A])['Data'], 
+                         [ADN(i) for i in range(1, 6)])
+        self.assertTrue(u.bulk_records)
+        # error from the 4th record: the 3 first ones are returned
+        card = restricted_card(self.image, (0x69, 0x82), 0x04, 4)
+        u, fil, n = self.ADN_file(card, False)
+        self.assertEqual(fil['Data'], [ADN(i) for i in range(1, 4)])
+        self.assertIsNone(u.read_records(fil))
+        read = []
+        self.assertIsNone(u.read_records(fil, 2, read=read))
+        self.assertEqual(read, [ADN(2), ADN(3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# incremental dump of a card
+# dumped before
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.utils import image_reader
+from card.emul import virtual_card, vfile
+from card_images import write_image, files, USIM_AID
+
+# compact security attributes: READ with PIN, UPDATE with ADM or PIN
+READ_ONLY = [0x03, 0xFF, 0x90]
+WRITABLE = [0x03, 0x90, 0x90]
+
+
+def protected(fil, SA):
+    # adds the compact security attributes to the FCP of the file
+    raw = vfile.make_FCP(fil)[2:] + [0x8C, len(SA)] + SA
+    fil['Raw'] = [0x62, len(raw)] + raw
+    return fil
+
+
+class counting_card(virtual_card):
+    # virtual card recording the file id of the EF read with READ BINARY
+    def _read_binary(self, st, *args):
+        if st['EF'] is not None:
+            self.reads.add(st['EF'].fid)
+        return virtual_card._read_binary(self, st, *args)
+
+
+class redump_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        fs = files()
+        # EF_IMSI and EF_UST read-only, EF_LOCI updated by the card holder
+        protected(fs[6], READ_ONLY)
+        protected(fs[7], READ_ONLY)
+        protected(fs[8], WRITABLE)
+        self.vc = counting_card(write_image(os.path.join(self.dir, 'u.img'),
+                                            fs))
+        self.vc.reads = set()
+        self.previous = os.path.join(self.dir, 'prev.img')
+        self.usim().explore_fs(self.previous, known_only=True, image=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def usim(self):
+        u = USIM(reader=self.vc)
+        u.dbg = 0
+        return u
+
+    def redump(self):
+        self.vc.reads = set()
+        filename = os.path.join(self.dir, 'new.img')
+        delta = self.usim().explore_fs(filename, previous=self.previous,
+                                       image=True)
+        return delta, image_reader(filename)
+
+    def test_unchanged(self):
+        delta, img = self.redump()
+        prev = image_reader(self.previous)
+        self.assertEqual((delta['added'], delta['removed'], delta['changed']),
+                         ([], [], []))
+        self.assertEqual(delta['unchanged'], len(prev))
+        # EF_LOCI only read again, with EF_ICCID
+        self.assertEqual(self.vc.reads, set([(0x6F, 0x7E), (0x2F, 0xE2)]))
+        self.assertEqual(img.get([0x6F, 0x07], USIM_AID)['Data'],
+                         prev.get([0x6F, 0x07], USIM_AID)['Data'])
+        img.close()
+        prev.close()
+
+    def test_delta(self):
+        ADF = self.vc.ADF[tuple(USIM_AID)]
+        # location update, and EF_UST removed
+        ADF.children[(0x6F, 0x7E)].data[4:7] = [0x02, 0xF8, 0x01]
+        del ADF.children[(0x6F, 0x38)]
+        delta, img = self.redump()
+        self.assertEqual(delta['removed'], [(USIM_AID, [0x6F, 0x38])])
+        self.assertEqual(len(delta['changed']), 1)
+        changed = delta['changed'][0]
+        self.assertEqual((changed['AID'], changed['path']),
+                         (USIM_AID, [0x6F, 0x7E]))
+        self.assertEqual(changed['data'], [(4, [0x00, 0xF1, 0x10],
+                                            [0x02, 0xF8, 0x01])])
+        self.assertNotIn((USIM_AID, [0x6F, 0x38]), img)
+        img.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
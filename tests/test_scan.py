@@ -0,0 +1,141 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# brute force of file addresses
+# under a DF
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image
+
+# 8 MSB of the file addresses scanned, to keep the scans short
+HI = (0x4F, 0x7F)
+
+
+class counting_card(virtual_card):
+    # virtual card counting the commands sent, by instruction
+    def transmit(self, apdu):
+        self.INS = getattr(self, 'INS', {})
+        if len(apdu) > 1:
+            self.INS[apdu[1]] = self.INS.get(apdu[1], 0) + 1
+        return virtual_card.transmit(self, apdu)
+
+
+class scan_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = write_image(os.path.join(self.dir, 'u.img'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def usim(self):
+        vc = counting_card(self.image)
+        u = USIM(reader=vc)
+        u.dbg = 0
+        # DF_TELECOM and DF_GSM under the MF
+        u._MF_struct = {(): [[0x7F, 0x10], [0x7F, 0x20]]}
+        # commands sent from here on, EF_DIR being read at init
+        vc.INS = {}
+        return u, vc
+
+    def scan(self, **kwargs):
+        u, vc = self.usim()
+        n = vc.apdus
+        FS, child_DF = u.scan_DF([0x7F, 0x10], **kwargs)
+        return [f['Absolut Path'] for f in FS], child_DF, vc.apdus - n
+
+    def test_candidates(self):
+        u, vc = self.usim()
+        addrs = list(u.scan_candidates([0x7F, 0x10]))
+        # each address once
+        self.assertEqual(len(addrs), 0x10000)
+        self.assertEqual(len(set(map(tuple, addrs))), 0x10000)
+        # EF_ADN and DF_PHONEBOOK, known under DF_TELECOM, come first
+        first = addrs[:addrs.index([0x4F, 0x00])]
+        self.assertIn([0x6F, 0x3A], first)
+        self.assertIn([0x5F, 0x3A], first)
+        # then the usual ranges, then the others in numeric order
+        self.assertEqual(addrs[len(first):len(first)+2],
+                         [[0x4F, 0x00], [0x4F, 0x01]])
+        self.assertEqual(addrs[-1], [0xFF, 0xFF])
+        # ranges
+        addrs = list(u.scan_candidates([0x7F, 0x10], None, (0x6F, 0x6F),
+                                       (0x30, 0x3F)))
+        self.assertEqual(sorted(addrs), [[0x6F, i] for i in range(0x30, 0x40)])
+        self.assertEqual(addrs[0], [0x6F, 0x3A])
+
+    def test_ordered(self):
+        paths, child_DF, n = self.scan(hi_addr=HI)
+        self.assertIn([0x7F, 0x10, 0x5F, 0x3A], paths)
+        self.assertIn([0x7F, 0x10, 0x6F, 0x3A], paths)
+        self.assertIn([0x5F, 0x3A], child_DF)
+        # same files, in the order of the candidates
+        paths_o, child_DF_o, n_o = self.scan(hi_addr=HI, ordered=True)
+        self.assertEqual(paths_o, paths)
+        self.assertEqual(child_DF_o, child_DF)
+        self.assertEqual(n_o, n)
+        # early exit: same files, without the unusual ranges
+        paths_e, child_DF_e, n_e = self.scan(early_exit=True)
+        self.assertEqual(paths_e, paths)
+        self.assertEqual(child_DF_e, child_DF)
+        self.assertLess(n_e, 5 * 0x100 + 200)
+
+    def test_unexplored_MF(self):
+        # DF_GSM, from the FS catalogue, is not taken for a DF_TELECOM child
+        vc = counting_card(self.image)
+        u = USIM(reader=vc)
+        u.dbg = 0
+        FS, child_DF = u.scan_DF([0x7F, 0x10], hi_addr=HI)
+        self.assertIn([0x5F, 0x3A], child_DF)
+        self.assertNotIn([0x7F, 0x20], child_DF)
+        self.assertNotIn([0x7F, 0x10, 0x7F, 0x20],
+                         [f['Absolut Path'] for f in FS])
+
+    def test_without_content(self):
+        u, vc = self.usim()
+        full, child_DF = u.scan_DF([0x7F, 0x10], hi_addr=HI)
+        u, vc = self.usim()
+        FS, child_DF_m = u.scan_DF([0x7F, 0x10], hi_addr=HI,
+                                   with_content=False)
+        self.assertEqual(child_DF_m, child_DF)
+        self.assertEqual([f['Absolut Path'] for f in FS],
+                         [f['Absolut Path'] for f in full])
+        # no READ BINARY or READ RECORD
+        self.assertNotIn(0xB0, vc.INS)
+        self.assertNotIn(0xB2, vc.INS)
+        self.assertFalse([f for f in FS if 'Data' in f.keys()])
+        # then the content of the EF only
+        u.fetch_content(FS)
+        self.assertIn(0xB2, vc.INS)
+        self.assertEqual([f.get('Data') for f in FS],
+                         [f.get('Data') for f in full])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+
+#################################
+# sparse reading of large record
+# EF with SEARCH RECORD
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.USIM import USIM
+from card.emul import virtual_card
+from card_images import write_image, files, ADN
+
+
+class no_search_card(virtual_card):
+    # virtual card not supporting SEARCH RECORD
+    def _search_record(self, st, CLA, P1, P2, data, Le):
+        return [], 0x6D, 0x00
+
+
+class sparse_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        fs = files()
+        # EF_ADN: records 1 to 5, 12 and 20 used
+        self.ADN = fs[2]['Data']
+        self.ADN[11], self.ADN[19] = ADN(12), ADN(20)
+        self.image = write_image(os.path.join(self.dir, 'u.img'), fs)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def ADN_file(self, card, sparse=0, empty=False, bulk=True):
+        u = USIM(reader=card)
+        u.dbg = 0
+        u.sparse_records, u.empty_records, u.bulk_records = sparse, empty, bulk
+        u.go_to_path([0x7F, 0x10])
+        n = card.apdus
+        return u, u.select([0x6F, 0x3A]), card.apdus - n
+
+    def test_same_content(self):
+        for card in (virtual_card, no_search_card):
+            for empty in (False, True):
+                for bulk in (False, True):
+                    u, full, n = self.ADN_file(card(self.image), 0, empty, 
+                                               bulk)
+                    u, sparse, n = self.ADN_file(card(self.image), 10, empty,
+                                                 bulk)
+                    self.assertEqual(sparse['Data'], full['Data'])
+        self.assertEqual(full['Data'], self.ADN)
+
+    def test_commands(self):
+        u, full, n1 = self.ADN_file(virtual_card(self.image), 0, bulk=False)
+        u, sparse, n2 = self.ADN_file(virtual_card(self.image), 10, 
+                                      bulk=False)
+        # SELECT and GET RESPONSE, then 20 READ RECORD, or SEARCH RECORD,
+        # GET RESPONSE and 7 READ RECORD
+        self.assertEqual((n1, n2), (22, 11))
+
+    def test_pattern(self):
+        u, fil, n = self.ADN_file(virtual_card(self.image))
+        name = [ord(c) for c in 'contact 1']
+        self.assertEqual(u.read_records_sparse(fil, name), 
+                         [(1, ADN(1)), (12, ADN(12))])
+        self.assertEqual(u.read_records_sparse(fil, [ord('2')], 8),
+                         [(2, ADN(2)), (20, ADN(20))])
+        u, fil, n = self.ADN_file(no_search_card(self.image))
+        self.assertEqual(u.read_records_sparse(fil, name), 
+                         [(1, ADN(1)), (12, ADN(12))])
+        self.assertEqual(u.read_records_sparse(fil, [ord('2')], 8),
+                         [(2, ADN(2)), (20, ADN(20))])
+
+
+if __name__ == '__main__':
+    unittest.main()
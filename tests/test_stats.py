@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# statistics over the dumps of
+# several cards
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from card_images import write_image, files, EF_records, EF_transparent, \
+                        ADN, ICCID, USIM_AID
+
+ICCID2 = '8933016667000000002'
+ADN_PATH = [0x7F, 0x10, 0x6F, 0x3A]
+
+
+def other_files():
+    # 40 ADN records, no EF_LOCI, service 1 only in EF_UST, and an EF_SST
+    fs = []
+    for fil in files():
+        if fil['Absolut Path'] == ADN_PATH:
+            fil = EF_records(ADN_PATH, [ADN(i) for i in range(1, 6)], 30, 40)
+        elif fil['Absolut Path'] == [0x6F, 0x38]:
+            fil = EF_transparent([0x6F, 0x38], [0x01], 0x04, USIM_AID)
+        elif fil['Absolut Path'] == [0x6F, 0x7E]:
+            continue
+        fs.append(fil)
+    fs.append(EF_transparent([0x7F, 0x20, 0x6F, 0x38], [0x17, 0x03]))
+    return fs
+
+
+@unittest.skipIf(numpy is None, 'numpy not available')
+class stats_test(unittest.TestCase):
+
+    def setUp(self):
+        from card.stats import fleet_stats
+        self.dir = tempfile.mkdtemp()
+        self.st = fleet_stats([
+            write_image(os.path.join(self.dir, '1.img')),
+            write_image(os.path.join(self.dir, '2.img'), other_files(),
+                        ICCID=ICCID2)])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_presence(self):
+        st = self.st
+        self.assertEqual(st.cards, [ICCID, ICCID2])
+        ratio = st.presence_ratio()
+        self.assertEqual(ratio['MF/7F106F3A'], 1.0)
+        self.assertEqual(ratio['MF/7F206F38'], 0.5)
+        self.assertEqual(st.cards_with([0x6F, 0x7E], USIM_AID), [ICCID])
+        self.assertEqual(st.cards_with([0x6F, 0x7E], USIM_AID, False),
+                         [ICCID2])
+        self.assertEqual(st.cards_with([0x6F, 0x7E]), [])
+        self.assertEqual(st.presence().sum(), len(st.column('card')))
+
+    def test_sizes(self):
+        st = self.st
+        self.assertEqual(sorted(st.sizes(ADN_PATH).tolist()), [600, 1200])
+        self.assertEqual(sorted(st.sizes(ADN_PATH, column='records')
+                                  .tolist()), [20, 40])
+        counts, edges = st.size_distribution(ADN_PATH, bins=2)
+        self.assertEqual(counts.tolist(), [1, 1])
+        self.assertEqual(st.breakdown('structure', ADN_PATH),
+                         {'linear fixed': 2})
+        # no access conditions in the images
+        self.assertEqual(st.access_breakdown(), {'': len(st.column('card'))})
+
+    def test_services(self):
+        st = self.st
+        self.assertEqual(st.with_service(2), [ICCID])
+        self.assertEqual(st.with_service(1), [ICCID2])
+        self.assertEqual(st.with_service(100), [])
+        self.assertEqual(st.service_ratio()[:3].tolist(), [0.5, 0.5, 0.5])
+        # EF_SST: services 1 and 5 activated, 2 and 3 only allocated
+        self.assertEqual(st.with_service(5, 'SST'), [ICCID2])
+        self.assertEqual(st.with_service(2, 'SST'), [])
+        self.assertEqual(st.with_service(2, 'SST', False), [ICCID2])
+
+    def test_add(self):
+        st = self.st
+        n = len(st.column('card'))
+        st.add(files(), 'FS')
+        self.assertEqual(st.cards, [ICCID, ICCID2, 'FS'])
+        self.assertEqual(len(st.column('card')), n + len(files()))
+        self.assertEqual(st.presence_ratio()['MF/7F106F3A'], 1.0)
+        self.assertEqual(st.with_service(2), [ICCID, 'FS'])
+
+
+if __name__ == '__main__':
+    unittest.main()
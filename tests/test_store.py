@@ -0,0 +1,109 @@
+# -*- coding: UTF-8 -*-
+"""
+card: Library adapted to request (U)SIM cards and other types of telco cards.
+Copyright (C) 2010 Benoit Michau
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along
+with this program; if not, write to the Free Software Foundation, Inc.,
+51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+"""
+
+#################################
+# inventory of cards in SQLite
+#################################
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from card.SIM import SIM
+from card.USIM import USIM
+from card.utils import image_reader, diff_images
+from card.emul import virtual_card
+from card.store import card_store
+from card_images import write_image, files, ICCID, USIM_AID
+
+IMSI = '001010123456789'
+# services of EF_UST in card_images
+UST = [2, 3, 4, 5, 8, 9, 10, 12, 14, 15, 17, 19, 20, 21, 27, 28, 29, 32,
+       35, 36]
+
+
+class store_test(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.image = write_image(os.path.join(self.dir, 'u.img'))
+        self.db = card_store(os.path.join(self.dir, 'cards.db'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def test_image(self):
+        self.assertEqual(self.db.add_image(self.image), 1)
+        card = self.db.card(ICCID)
+        self.assertEqual((card['IMSI'], card['type'], card['AID']),
+                         (IMSI, 'USIM', [USIM_AID]))
+        self.assertEqual(card['services'], {'UST': UST})
+        self.assertEqual(self.db.find_IMSI(IMSI), [ICCID])
+        self.assertEqual(self.db.with_service(27), [ICCID])
+        self.assertEqual(self.db.with_service(1), [])
+        self.assertEqual(self.db.with_file([0x6F, 0x07], USIM_AID), [ICCID])
+        # files and hashes as in the image
+        d = diff_images(self.image, self.db.files(ICCID))
+        self.assertEqual(d['unchanged'], len(files()))
+        img = image_reader(self.image)
+        self.assertEqual(self.db.hashes(ICCID),
+                         dict([(k, tuple(v[1:])) \
+                               for (k, v) in img.index.items()]))
+        self.assertEqual(self.db.get_file(ICCID, [0x6F, 0x07], USIM_AID)
+                         ['Data'], img.get([0x6F, 0x07], USIM_AID)['Data'])
+        img.close()
+        # reopened, and added again
+        self.db.close()
+        self.db = card_store(self.db.filename)
+        self.assertEqual(len(self.db), 1)
+        self.assertEqual(self.db.add_images([self.image]), 1)
+        self.assertEqual(len(self.db), 1)
+        self.assertEqual(len(self.db.files(ICCID)), len(files()))
+
+    def test_card(self):
+        u = USIM(reader=virtual_card(self.image))
+        u.dbg = 0
+        self.db.add_card(u, FS=False)
+        card = self.db.card(ICCID)
+        self.assertEqual(card['IMSI'], IMSI)
+        self.assertEqual(card['services'], {'UST': UST})
+        self.assertEqual(self.db.files(ICCID), [])
+
+    def test_SIM_services(self):
+        # service 1 allocated and activated, 2 and 3 allocated only,
+        # 5 allocated and activated
+        SST = [0x17, 0x03]
+        self.db.add('8933000000000000001', service_table=SST)
+        self.assertEqual(self.db.card('8933000000000000001')['services'],
+                         {'SST': [1, 5]})
+        self.assertEqual(self.db.with_service(2, 'SST'), [])
+        self.assertEqual(self.db.with_service(2, 'SST', False),
+                         ['8933000000000000001'])
+        # from the strings of get_services()
+        self.db.add('8933000000000000002',
+                    services=SIM.get_services_from_sst(None, SST))
+        self.assertEqual(self.db.card('8933000000000000002')['services'],
+                         {'SST': [1, 5]})
+
+
+if __name__ == '__main__':
+    unittest.main()